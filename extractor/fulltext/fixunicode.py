@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import re
 import unicodedata
+from typing import Dict, Match, Pattern, Tuple
 
 """
 List of ligatures: https://en.wikipedia.org/wiki/Typographic_ligature
@@ -74,20 +75,74 @@ for row in ligature_table.split('\n'):
     )
 
 unicode_mapping.update({
-    # 'ẞ, ß': careful, some use this for \beta
-    r'(\B)\u00DF': r'\1ss',
-
     # Additions (manual normalization that we feel is important)
     # unicode space  u'\xa0'  (not \x{0c} = ^L keep!)
     '\xa0': ' ',
 
     # single + double quotes, dash, and asterisk
-    r'[\u2018\u2019]': r"'",
-    r'[\u201C\u201D]': r'"',
-    r'[\xad\u2014]': r'-',
-    r'\xb7': r'*'
+    '\u2018': "'",
+    '\u2019': "'",
+    '\u201C': '"',
+    '\u201D': '"',
+    '\xad': '-',
+    '\u2014': '-',
+    '\xb7': '*'
 })
 
+# Substitutions that depend on the surrounding text, and so cannot be handled
+# by a lookup on single codepoints. These are regular expressions, applied
+# after the substitutions in ``unicode_mapping``. Patterns may refer to their
+# own groups in the replacement (e.g. ``\1``), but must not overlap with one
+# another since they are applied in a single pass. Where possible, start each
+# pattern with a literal so that the regex engine can skip straight to it.
+contextual_mapping = {
+    # 'ẞ, ß': careful, some use this for \beta
+    # Equivalent to (\B)\u00DF, i.e. only when following a word character.
+    r'\u00DF(?<=\w\u00DF)': r'ss',
+}
+
+
+def _compile_contextual(mapping: Dict[str, str]) \
+        -> Tuple[Pattern, Dict[str, str]]:
+    """
+    Compile contextual rules into a single alternation.
+
+    Each rule is wrapped in a named group so that we can tell which one
+    matched; group references in the replacement templates are shifted to
+    account for the groups that precede them in the combined pattern.
+    """
+    patterns = []
+    templates = {}
+    offset = 0
+    for i, (search, replace) in enumerate(mapping.items()):
+        name = '_rule%i' % i
+        patterns.append('(?P<%s>%s)' % (name, search))
+        shift = offset + 1    # Skip the wrapping group itself.
+        templates[name] = re.sub(
+            r'\\(\d+)',
+            lambda m: r'\g<%i>' % (int(m.group(1)) + shift),
+            replace
+        )
+        offset += re.compile(search).groups + 1
+    return re.compile('|'.join(patterns)), templates
+
+
+# Built once at import time, so that each call to ``fix_unicode`` makes one
+# pass over the text for the single-codepoint substitutions and one for the
+# contextual rules. A character class with a lookup on each (rare) match is
+# considerably faster than ``str.translate`` on mostly-ASCII text.
+_single_pattern = re.compile('[%s]' % re.escape(''.join(unicode_mapping)))
+_contextual_pattern, _contextual_templates = \
+    _compile_contextual(contextual_mapping)
+
+
+def _single_replace(match: Match) -> str:
+    return unicode_mapping[match.group()]
+
+
+def _contextual_replace(match: Match) -> str:
+    return match.expand(_contextual_templates[match.lastgroup])
+
 
 def fix_unicode(txt: str) -> str:
     """
@@ -103,6 +158,6 @@ def fix_unicode(txt: str) -> str:
     -------
     output : unicode string
     """
-    for search, replace in unicode_mapping.items():
-        txt = re.subn(search, replace, txt)[0]
+    txt = _single_pattern.sub(_single_replace, txt)
+    txt = _contextual_pattern.sub(_contextual_replace, txt)
     return unicodedata.normalize('NFKC', txt)
@@ -2,11 +2,17 @@ import os
 import re
 import glob
 import shlex
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from subprocess import check_output, CalledProcessError, TimeoutExpired
+from subprocess import check_output, CalledProcessError, TimeoutExpired, \
+    Popen, PIPE
+from typing import List, Dict, Optional, Callable, NamedTuple, Tuple
 
 import logging
 import fixunicode
+import preanalysis
 
 log = logging.getLogger('fulltext')
 TIMELIMIT = 10*60
@@ -14,6 +20,19 @@ TIMELIMIT = 10*60
 PDF2TXT = 'pdf2txt.py'
 PDFTOTEXT = 'pdftotext'
 
+SEQUENTIAL = 'sequential'
+PARALLEL = 'parallel'
+PREDICTIVE = 'predictive'
+MODE = os.environ.get('FULLTEXT_MODE', SEQUENTIAL)
+
+MAX_WORD_LENGTH = 45
+
+# Extract documents longer than this many pages in concurrent chunks; 0 is off
+PAGES_PER_CHUNK = int(os.environ.get('FULLTEXT_PAGES_PER_CHUNK', '0'))
+PROCESSES = int(os.environ.get('FULLTEXT_PROCESSES', str(os.cpu_count())))
+CHUNK_TIMELIMIT = int(os.environ.get('FULLTEXT_CHUNK_TIMELIMIT', '120'))
+CHUNK_RETRIES = int(os.environ.get('FULLTEXT_CHUNK_RETRIES', '1'))
+
 RE_STAMP = r'(arXiv:.{20,60}\s\d{1,2}\s[A-Z][a-z]{2}\s\d{4})'
 RE_REPEATS = r'(\(cid:\d+\)|lllll|\.\.\.\.\.|\*\*\*\*\*)'
 
@@ -47,6 +66,147 @@ def average_word_length(txt):
 # ============================================================================
 #  functions for calling the text extraction services
 # ============================================================================
+def pdf2txt_command(pdffile: str, options: str='',
+                    pages: Optional[Tuple[int, int]]=None) -> List[str]:
+    """ Build the command to run pdf2txt on `pdffile`, writing to stdout """
+    if pages is not None:
+        first, last = pages
+        pagenos = ','.join(str(n) for n in range(first, last + 1))
+        options = '{} -p {}'.format(options, pagenos)
+    cmd = '{cmd} {options} {pdf}'.format(
+        cmd=PDF2TXT, options=options, pdf=pdffile
+    )
+    return shlex.split(cmd)
+
+
+def pdftotext_command(pdffile: str,
+                      pages: Optional[Tuple[int, int]]=None) -> List[str]:
+    """ Build the command to run pdftotext on `pdffile`, writing to stdout """
+    options = ''
+    if pages is not None:
+        options = '-f {} -l {}'.format(*pages)
+    cmd = '{cmd} {options} {pdf} -'.format(
+        cmd=PDFTOTEXT, options=options, pdf=pdffile
+    )
+    return shlex.split(cmd)
+
+
+def page_ranges(pdffile: str, size: int=PAGES_PER_CHUNK) \
+        -> List[Tuple[int, int]]:
+    """
+    Split a PDF into ranges of at most `size` pages
+
+    Parameters
+    ----------
+    pdffile : str
+        Path to PDF file
+
+    size : int
+        Number of pages in each range; if 0, the PDF is not split
+
+    Returns
+    -------
+    ranges : list of tuple
+        First and last page (inclusive, from 1) of each range, or an empty
+        list if the PDF should not be split
+    """
+    if size <= 0:
+        return []
+    pages = preanalysis.count_pages(pdffile)
+    if pages is None or pages <= size:
+        return []
+    return [(first, min(first + size - 1, pages))
+            for first in range(1, pages + 1, size)]
+
+
+def run_in_chunks(command: Callable, pdffile: str,
+                  ranges: List[Tuple[int, int]], timelimit: Optional[int]):
+    """
+    Run an extractor on ranges of pages concurrently, and join the results
+
+    Each chunk is retried up to `CHUNK_RETRIES` times, with a time limit of
+    `CHUNK_TIMELIMIT` (or none, if `timelimit` is None) for each attempt. If
+    a chunk still fails, the exception is raised as for the whole document.
+
+    Parameters
+    ----------
+    command : callable
+        Builds the command, given the PDF path and page range
+
+    pdffile : str
+        Path to PDF file
+
+    ranges : list of tuple
+        Page ranges, from :func:`page_ranges`
+
+    timelimit : int or None
+        Amount of time to wait for the whole document to complete
+
+    Returns
+    -------
+    output : str
+        Full plain text output
+    """
+    chunk_timelimit = CHUNK_TIMELIMIT if timelimit is not None else None
+    # Processes that are running, so that they can be killed if a chunk fails
+    running = set()
+    lock = threading.Lock()
+    cancelled = threading.Event()
+
+    def run_chunk(pages: Tuple[int, int]) -> str:
+        for attempt in range(CHUNK_RETRIES + 1):
+            with lock:
+                if cancelled.is_set():
+                    raise RuntimeError('Another chunk failed')
+                process = Popen(command(pdffile, pages), stdout=PIPE)
+                running.add(process)
+            try:
+                output, _ = process.communicate(timeout=chunk_timelimit)
+                error = None
+                if process.returncode != 0:
+                    error = CalledProcessError(process.returncode,
+                                               process.args, output)
+            except TimeoutExpired as e:
+                process.kill()
+                process.communicate()
+                error = e
+            finally:
+                with lock:
+                    running.discard(process)
+            if error is None:
+                return output.decode('utf-8')
+            log.warning('Pages {}-{} failed: {}'.format(*pages, error))
+            if attempt == CHUNK_RETRIES or cancelled.is_set():
+                raise error
+        raise RuntimeError('Unreachable')
+
+    log.info('Extracting {} in {} chunks'.format(pdffile, len(ranges)))
+    pool = ThreadPoolExecutor(max_workers=PROCESSES)
+    try:
+        return ''.join(pool.map(run_chunk, ranges))
+    except BaseException:
+        # Stop the other chunks; their threads then collect the processes.
+        with lock:
+            cancelled.set()
+            for process in running:
+                process.kill()
+        raise
+    finally:
+        pool.shutdown(wait=True)
+
+
+def _extract(command: Callable, pdffile: str,
+             timelimit: Optional[int]) -> str:
+    """ Run an extractor on the whole of `pdffile`, or in chunks """
+    ranges = page_ranges(pdffile, PAGES_PER_CHUNK)
+    if ranges:
+        return run_in_chunks(command, pdffile, ranges, timelimit)
+
+    # The text comes straight through a pipe, rather than via a file.
+    output: bytes = check_output(command(pdffile), timeout=timelimit)
+    return output.decode('utf-8')
+
+
 def run_pdf2txt(pdffile: str, timelimit: int=TIMELIMIT, options: str=''):
     """
     Run pdf2txt to extract full text
@@ -65,17 +225,10 @@ def run_pdf2txt(pdffile: str, timelimit: int=TIMELIMIT, options: str=''):
         Full plain text output
     """
     log.debug('Running {} on {}'.format(PDF2TXT, pdffile))
-    tmpfile = reextension(pdffile, 'pdf2txt')
-
-    cmd = '{cmd} {options} -o {output} {pdf}'.format(
-        cmd=PDF2TXT, options=options, output=tmpfile, pdf=pdffile
-    )
-    cmd = shlex.split(cmd)
-    output = check_output(cmd, timeout=timelimit)
-    log.info(output)
 
-    with open(tmpfile) as f:
-        return f.read()
+    def command(pdffile, pages=None):
+        return pdf2txt_command(pdffile, options=options, pages=pages)
+    return _extract(command, pdffile, timelimit)
 
 
 def run_pdftotext(pdffile: str, timelimit: int=TIMELIMIT) -> str:
@@ -96,17 +249,7 @@ def run_pdftotext(pdffile: str, timelimit: int=TIMELIMIT) -> str:
         Full plain text output
     """
     log.debug('Running {} on {}'.format(PDFTOTEXT, pdffile))
-    tmpfile = reextension(pdffile, 'pdftotxt')
-
-    cmd = '{cmd} {pdf} {output}'.format(
-        cmd=PDFTOTEXT, pdf=pdffile, output=tmpfile
-    )
-    cmd = shlex.split(cmd)
-    output = check_output(cmd, timeout=timelimit)
-    log.info(output)
-
-    with open(tmpfile) as f:
-        return f.read()
+    return _extract(pdftotext_command, pdffile, timelimit)
 
 
 def run_pdf2txt_A(pdffile: str, **kwargs) -> str:
@@ -130,10 +273,168 @@ def run_pdf2txt_A(pdffile: str, **kwargs) -> str:
     return run_pdf2txt(pdffile, options='-A', **kwargs)
 
 
+# ============================================================================
+#  strategies for running the extractors concurrently
+# ============================================================================
+class Strategy(NamedTuple):
+    """ A candidate extractor, to be run concurrently with the others """
+
+    name: str
+    """ Name of the strategy, used in logs and by `fallback_for` """
+
+    command: Callable[[str], List[str]]
+    """ Builds the command, given the PDF path """
+
+    fallback_for: Optional[str] = None
+    """ Only use this result if the named strategy fails outright """
+
+
+STRATEGIES = [
+    Strategy('pdf2txt', pdf2txt_command),
+    Strategy('pdftotext', pdftotext_command, fallback_for='pdf2txt'),
+    Strategy('pdf2txt_A', lambda pdf: pdf2txt_command(pdf, options='-A')),
+]
+"""
+Strategies in order of preference. This gives the same choice as
+:func:`fulltext_sequential`: pdf2txt if it is good, pdftotext only if pdf2txt
+fails outright, and otherwise pdf2txt with positional analysis (-A).
+"""
+
+
+def choose(strategies: List[Strategy], outcomes: Dict[str, Optional[bool]]):
+    """
+    Decide which strategy wins, given the outcomes so far.
+
+    Parameters
+    ----------
+    strategies : list of :class:`Strategy`
+        Candidates, in order of preference
+
+    outcomes : dict
+        For each finished strategy, True if its output is good, False if its
+        output is bad, or None if it failed to produce output at all
+
+    Returns
+    -------
+    winner : str or None
+        Name of the winning strategy, or None if we must wait for more
+        outcomes
+
+    needed : set
+        Names of the strategies that could still affect the decision
+
+    Raises
+    ------
+    RuntimeError
+        If every eligible strategy finished without a good result
+    """
+    needed = set()
+    for strategy in strategies:
+        if strategy.fallback_for is not None:
+            if strategy.fallback_for not in outcomes:
+                needed.add(strategy.name)     # Might yet be eligible.
+                continue
+            if outcomes[strategy.fallback_for] is not None:
+                continue                      # Not eligible.
+        if strategy.name not in outcomes:
+            needed.add(strategy.name)
+        elif outcomes[strategy.name]:
+            if not needed:
+                return strategy.name, {strategy.name}
+            # A preferred strategy is still pending, but nothing less
+            # preferred than this one can win.
+            needed.add(strategy.name)
+            return None, needed
+    if needed:
+        return None, needed
+    raise RuntimeError('No accurate text could be extracted')
+
+
+def fulltext_parallel(pdffile: str, timelimit: int=TIMELIMIT,
+                      strategies: List[Strategy]=STRATEGIES):
+    """
+    Run the extraction strategies concurrently, and keep the best result.
+
+    Each output is scored with :func:`average_word_length` as soon as it is
+    available, and the remaining strategies are cancelled as soon as the
+    decision (see :func:`choose`) no longer depends on them. This takes at
+    most `timelimit` in total, rather than for each strategy in turn.
+
+    Parameters
+    ----------
+    pdffile : str
+        Path to PDF file from which to extract text
+
+    timelimit : int
+        Time in seconds to allow each of the extraction routines to run
+
+    strategies : list of :class:`Strategy`
+        Candidates, in order of preference
+
+    Returns
+    -------
+    fulltext : str
+        The full plain text of the PDF
+    """
+    finished: queue.Queue = queue.Queue()
+    processes = {}
+    for strategy in strategies:
+        log.debug('Running {} on {}'.format(strategy.name, pdffile))
+        try:
+            processes[strategy.name] = Popen(
+                strategy.command(pdffile), stdout=PIPE
+            )
+        except OSError as e:    # E.g. the extractor is not installed.
+            log.error('Could not run {}: {}'.format(strategy.name, e))
+            finished.put((strategy.name, None, b''))
+
+    def wait(name: str, process: Popen) -> None:
+        try:
+            output, _ = process.communicate(timeout=timelimit)
+        except TimeoutExpired:
+            process.kill()
+            output, _ = process.communicate()
+        finished.put((name, process.returncode, output))
+
+    for name, process in processes.items():
+        threading.Thread(target=wait, args=(name, process), daemon=True) \
+            .start()
+
+    outcomes: Dict[str, Optional[bool]] = {}
+    outputs: Dict[str, str] = {}
+    try:
+        winner = None
+        while winner is None:
+            name, returncode, output = finished.get()
+            outcomes[name] = None
+            if returncode == 0:
+                outputs[name] = fixunicode.fix_unicode(output.decode('utf-8'))
+                wordlength = average_word_length(outputs[name])
+                outcomes[name] = wordlength <= MAX_WORD_LENGTH
+            log.info('{} finished with {}'.format(name, outcomes[name]))
+            try:
+                winner, needed = choose(strategies, outcomes)
+            except RuntimeError as e:
+                raise RuntimeError(
+                    'No accurate text could be extracted from "{}"'.format(
+                        pdffile
+                    )
+                ) from e
+            for other, process in processes.items():
+                if other not in needed and process.poll() is None:
+                    log.debug('Cancelling {}'.format(other))
+                    process.kill()
+    finally:
+        for process in processes.values():
+            if process.poll() is None:
+                process.kill()
+    return outputs[winner]
+
+
 # ============================================================================
 #  main function which extracts text
 # ============================================================================
-def fulltext(pdffile: str, timelimit: int=TIMELIMIT):
+def fulltext(pdffile: str, timelimit: int=TIMELIMIT, mode: str=MODE):
     """
     Given a pdf file, extract the unicode text and run through very basic
     unicode normalization routines. Determine the best extracted text and
@@ -147,6 +448,14 @@ def fulltext(pdffile: str, timelimit: int=TIMELIMIT):
     timelimit : int
         Time in seconds to allow the extraction routines to run
 
+    mode : str
+        Either `SEQUENTIAL` (the default), to run the extraction routines one
+        after another, as needed; `PARALLEL`, to run them concurrently (see
+        :func:`fulltext_parallel`); or `PREDICTIVE`, to start with the one
+        that a pre-analysis of the PDF favours (see
+        :func:`fulltext_predictive`). This can also be set with the
+        `FULLTEXT_MODE` environment variable.
+
     Returns
     -------
     fulltext : str
@@ -155,26 +464,121 @@ def fulltext(pdffile: str, timelimit: int=TIMELIMIT):
     if not os.path.isfile(pdffile):
         raise FileNotFoundError(pdffile)
 
+    if mode == PARALLEL:
+        return fulltext_parallel(pdffile, timelimit=timelimit)
+    if mode == PREDICTIVE:
+        return fulltext_predictive(pdffile, timelimit=timelimit)
+    return fulltext_sequential(pdffile, timelimit=timelimit)
+
+
+def fulltext_predictive(pdffile: str, timelimit: int=TIMELIMIT):
+    """
+    Start with the extraction routine that a pre-analysis of the PDF favours.
+
+    If :func:`preanalysis.select` picks something other than pdf2txt, that is
+    run first; this saves a full pass on PDFs that would otherwise fail the
+    word length check with pdf2txt. If its output is not good, we carry on
+    as in :func:`fulltext_sequential`, without repeating it. Each decision is
+    recorded with :func:`preanalysis.record`.
+
+    Parameters
+    ----------
+    pdffile : str
+        Path to PDF file from which to extract text
+
+    timelimit : int
+        Time in seconds to allow each of the extraction routines to run
+
+    Returns
+    -------
+    fulltext : str
+        The full plain text of the PDF
+    """
+    analysis = preanalysis.analyze(pdffile)
+    rule = preanalysis.select(analysis)
+
+    if rule.strategy == 'pdf2txt_A':
+        try:
+            output = _positional_pass(pdffile, timelimit)
+        except (RuntimeError, TimeoutExpired, CalledProcessError):
+            preanalysis.record(pdffile, analysis, rule, False)
+        else:
+            preanalysis.record(pdffile, analysis, rule, True)
+            return output
+        output, _ = _first_pass(pdffile, timelimit)
+        if not _is_good(output):
+            raise RuntimeError(
+                'No accurate text could be extracted from "{}"'.format(pdffile)
+            )
+        return output
+
+    if rule.strategy == 'pdftotext':
+        try:
+            output = fixunicode.fix_unicode(
+                run_pdftotext(pdffile, timelimit=timelimit)
+            )
+            passed = _is_good(output)
+        except (TimeoutExpired, CalledProcessError):
+            passed = False
+        preanalysis.record(pdffile, analysis, rule, passed)
+        if passed:
+            return output
+        return fulltext_sequential(pdffile, timelimit=timelimit)
+
+    output, used = _first_pass(pdffile, timelimit)
+    good = _is_good(output)
+    preanalysis.record(pdffile, analysis, rule, good and used == 'pdf2txt')
+    if good:
+        return output
+    return _positional_pass(pdffile, timelimit)
+
+
+def fulltext_sequential(pdffile: str, timelimit: int=TIMELIMIT):
+    """
+    Run the extraction routines one after another, until one is good.
+
+    Parameters
+    ----------
+    pdffile : str
+        Path to PDF file from which to extract text
+
+    timelimit : int
+        Time in seconds to allow each of the extraction routines to run
+
+    Returns
+    -------
+    fulltext : str
+        The full plain text of the PDF
+    """
+    output, _ = _first_pass(pdffile, timelimit)
+    if _is_good(output):
+        return output
+    return _positional_pass(pdffile, timelimit)
+
+
+def _is_good(output: str) -> bool:
+    return average_word_length(output) <= MAX_WORD_LENGTH
+
+
+def _first_pass(pdffile: str, timelimit: int) -> Tuple[str, str]:
+    """ Run pdf2txt, or pdftotext if that fails; give the output and name """
     try:
         output = run_pdf2txt(pdffile, timelimit=timelimit)
+        used = 'pdf2txt'
     except (TimeoutExpired, CalledProcessError) as e:
         output = run_pdftotext(pdffile, timelimit=None)
+        used = 'pdftotext'
+    return fixunicode.fix_unicode(output), used
 
-    output = fixunicode.fix_unicode(output)
-    wordlength = average_word_length(output)
-
-    if wordlength <= 45:
-        return output
 
+def _positional_pass(pdffile: str, timelimit: int) -> str:
+    """ Run pdf2txt -A, which is our last resort """
     output = run_pdf2txt_A(pdffile, timelimit=timelimit)
     output = fixunicode.fix_unicode(output)
-    wordlength = average_word_length(output)
-
-    if wordlength > 45:
+    if not _is_good(output):
         raise RuntimeError(
             'No accurate text could be extracted from "{}"'.format(pdffile)
         )
-
     return output
 
 
@@ -0,0 +1,64 @@
+"""
+Run the extractor as a long-lived server.
+
+This avoids paying the container start-up and import costs for every PDF.
+The server listens on ``EXTRACTOR_PORT`` for a line protocol: each request is
+a single line, and gets a single line of JSON in response.
+
+- ``PING`` is a health check, and gets ``{"ok": true, ...}``.
+- Any other line is the path of a PDF to convert. The response is either
+  ``{"ok": true, "content": <plain text>, ...}`` or
+  ``{"ok": false, "error": <message>, ...}``. Nothing is written to disk.
+
+Every response also includes ``jobs`` (the number of PDFs handled so far) and
+``maxrss`` (peak resident memory of the server, in kilobytes), so that the
+client can decide when to recycle the server.
+"""
+
+import os
+import json
+import logging
+import resource
+import socketserver
+
+from fulltext import fulltext
+
+log = logging.getLogger('fulltext')
+
+PORT = int(os.environ.get('EXTRACTOR_PORT', '9876'))
+PING = 'PING'
+
+
+class ExtractionHandler(socketserver.StreamRequestHandler):
+    """Handles requests from a single client, one line at a time."""
+
+    jobs = 0
+
+    def respond(self, line: str) -> dict:
+        if line == PING:
+            return {'ok': True}
+        ExtractionHandler.jobs += 1
+        try:
+            return {'ok': True, 'content': fulltext(line)}
+        except Exception as e:
+            log.error('Conversion failed for %s: %s', line, e)
+            return {'ok': False, 'error': str(e)}
+
+    def handle(self) -> None:
+        for raw in self.rfile:
+            line = raw.decode('utf-8').strip()
+            if not line:
+                continue
+            response = self.respond(line)
+            response['jobs'] = ExtractionHandler.jobs
+            response['maxrss'] = \
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+if __name__ == '__main__':
+    socketserver.TCPServer.allow_reuse_address = True
+    with socketserver.TCPServer(('', PORT), ExtractionHandler) as server:
+        log.info('Listening on port %i', PORT)
+        server.serve_forever()
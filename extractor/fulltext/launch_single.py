@@ -2,10 +2,14 @@ import os
 import sys
 # sys.path.append(".")
 import logging
-from fulltext import convert
+from fulltext import convert, fulltext
 
 log = logging.getLogger('fulltext')
 
+# With FULLTEXT_OUTPUT=stdout, write the text itself to stdout, rather than
+# writing it alongside the PDF and giving its path.
+TO_STDOUT = os.environ.get('FULLTEXT_OUTPUT') == 'stdout'
+
 
 if __name__ == '__main__':
     if len(sys.argv) <= 1:
@@ -14,7 +18,13 @@ if __name__ == '__main__':
     try:
         log.info('Path: %s\n' % path)
         log.info('Path exists: %s\n' % str(os.path.exists(path)))
-        textpath = convert(path)
+        if TO_STDOUT:
+            content = fulltext(path)
+        else:
+            textpath = convert(path)
     except Exception as e:
         sys.exit(str(e))
-    sys.stdout.write(textpath)
+    if TO_STDOUT:
+        sys.stdout.buffer.write(content.encode('utf-8'))
+    else:
+        sys.stdout.write(textpath)
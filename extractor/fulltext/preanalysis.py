@@ -0,0 +1,183 @@
+"""
+Cheap pre-analysis of a PDF, used to predict which extractor to run first.
+
+:func:`analyze` gathers a few properties of the PDF with the poppler tools,
+which take a fraction of the time of a full extraction. :func:`select` then
+applies :data:`RULES` to pick the extractor that is most likely to pass the
+:func:`fulltext.average_word_length` check on the first try. Each decision,
+and whether it paid off, can be recorded with :func:`record` so that the
+rules can be tuned.
+"""
+
+import os
+import re
+import json
+import logging
+from subprocess import check_output, CalledProcessError, TimeoutExpired
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+log = logging.getLogger('fulltext')
+
+PDFINFO = 'pdfinfo'
+PDFFONTS = 'pdffonts'
+PDFTOTEXT = 'pdftotext'
+
+TIMELIMIT = 30
+DECISIONS = os.environ.get('FULLTEXT_DECISIONS')
+
+
+class Analysis(NamedTuple):
+    """ Properties of a PDF; any of these may be None if unavailable """
+
+    pages: Optional[int] = None
+    """ Number of pages """
+
+    producer: Optional[str] = None
+    """ The Producer string from the document info """
+
+    font_types: Optional[List[str]] = None
+    """ Types of the fonts used on the first page, e.g. 'Type 1' """
+
+    has_text: Optional[bool] = None
+    """ Whether the first page has a text layer (uses any fonts) """
+
+    first_page_chars: Optional[int] = None
+    """ Amount of text on the first page, a proxy for its content size """
+
+
+class Rule(NamedTuple):
+    """ Picks `strategy` for PDFs that match `applies` """
+
+    name: str
+    """ Name of the rule, used when recording decisions """
+
+    applies: Callable[[Analysis], bool]
+    """ Whether the rule applies to an :class:`Analysis` """
+
+    strategy: str
+    """ Name of a strategy in :data:`fulltext.STRATEGIES` """
+
+
+def _only_type3(analysis: Analysis) -> bool:
+    types = analysis.font_types
+    return bool(types) and all(t.startswith('Type 3') for t in types)
+
+
+RULES = [
+    # Without a text layer (e.g. scanned pages), every extractor gives next to
+    # nothing, so use the quickest.
+    Rule('no-text-layer', lambda a: a.has_text is False, 'pdftotext'),
+    # Bitmap (Type 3) fonts carry no spacing information, so pdf2txt tends to
+    # run words together without positional analysis.
+    Rule('type3-fonts', _only_type3, 'pdf2txt_A'),
+]
+""" Rules in order of precedence; the first that applies wins """
+
+DEFAULT = Rule('default', lambda a: True, 'pdf2txt')
+
+
+def _run(cmd: List[str]) -> Optional[str]:
+    try:
+        output: bytes = check_output(cmd, timeout=TIMELIMIT)
+    except (OSError, CalledProcessError, TimeoutExpired) as e:
+        log.info('Pre-analysis step {} failed: {}'.format(cmd[0], e))
+        return None
+    return output.decode('utf-8', errors='replace')
+
+
+def parse_pdfinfo(output: str) -> Tuple[Optional[int], Optional[str]]:
+    """ Get the page count and producer from the output of pdfinfo """
+    pages = re.search(r'^Pages:\s+(\d+)', output, re.M)
+    producer = re.search(r'^Producer:\s+(.*)$', output, re.M)
+    return (int(pages.group(1)) if pages else None,
+            producer.group(1).strip() if producer else None)
+
+
+def parse_pdffonts(output: str) -> List[str]:
+    """ Get the font types from the table output by pdffonts """
+    lines = output.splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith('---'):
+            # Columns are delimited by the runs of dashes under the header.
+            columns = [m.span() for m in re.finditer(r'-+', line)]
+            start, end = columns[1]
+            return [row[start:end].strip() for row in lines[i + 1:]
+                    if row.strip()]
+    return []
+
+
+def count_pages(pdffile: str) -> Optional[int]:
+    """ Get the number of pages in a PDF, if pdfinfo can tell us """
+    info = _run([PDFINFO, pdffile])
+    return parse_pdfinfo(info)[0] if info is not None else None
+
+
+def analyze(pdffile: str) -> Analysis:
+    """
+    Gather the properties of a PDF that are used by :data:`RULES`.
+
+    Parameters
+    ----------
+    pdffile : str
+        Path to PDF file
+
+    Returns
+    -------
+    analysis : :class:`Analysis`
+    """
+    pages, producer = None, None
+    info = _run([PDFINFO, pdffile])
+    if info is not None:
+        pages, producer = parse_pdfinfo(info)
+
+    font_types = None
+    fonts = _run([PDFFONTS, '-f', '1', '-l', '1', pdffile])
+    if fonts is not None:
+        font_types = parse_pdffonts(fonts)
+
+    first_page_chars = None
+    text = _run([PDFTOTEXT, '-f', '1', '-l', '1', pdffile, '-'])
+    if text is not None:
+        first_page_chars = len(text.strip())
+
+    return Analysis(
+        pages=pages,
+        producer=producer,
+        font_types=font_types,
+        has_text=bool(font_types) if font_types is not None else None,
+        first_page_chars=first_page_chars
+    )
+
+
+def select(analysis: Analysis, rules: List[Rule]=RULES) -> Rule:
+    """ Get the first rule that applies to `analysis` """
+    for rule in rules:
+        if rule.applies(analysis):
+            return rule
+    return DEFAULT
+
+
+def record(pdffile: str, analysis: Analysis, rule: Rule, passed: bool,
+           path: Optional[str]=DECISIONS) -> None:
+    """
+    Record a decision, and whether its extractor passed on the first try.
+
+    Decisions are always logged. If `path` is set (with the environment
+    variable `FULLTEXT_DECISIONS`) they are also appended to that file as
+    JSON lines, for tuning :data:`RULES`.
+    """
+    decision = {
+        'pdf': os.path.basename(pdffile),
+        'analysis': analysis._asdict(),
+        'rule': rule.name,
+        'strategy': rule.strategy,
+        'passed': passed
+    }
+    log.info('Pre-analysis decision: {}'.format(json.dumps(decision)))
+    if path is None:
+        return
+    try:
+        with open(path, 'a') as f:
+            f.write(json.dumps(decision) + '\n')
+    except OSError as e:
+        log.error('Could not record decision in {}: {}'.format(path, e))
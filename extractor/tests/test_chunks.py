@@ -0,0 +1,132 @@
+"""Tests for extracting large PDFs in concurrent page ranges."""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from subprocess import CalledProcessError, Popen
+from unittest import TestCase, mock
+
+# The extractor scripts import each other as top-level modules.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'fulltext'))
+
+from fulltext import fulltext   # noqa: E402
+
+
+def fake(workdir, failures=0):
+    """Make a command that extracts a page range, failing at first."""
+    def command(pdffile, pages=None):
+        prefix = '{}-{}.failed'.format(*pages)
+        script = (
+            'import os, sys\n'
+            f'if sum(1 for f in os.listdir({workdir!r})\n'
+            f'       if f.startswith({prefix!r})) < {failures}:\n'
+            f'    open(os.path.join({workdir!r}, {prefix!r} + str(os.getpid())),'
+            ' "w").close()\n'
+            '    sys.exit(1)\n'
+            f'sys.stdout.write("pages {pages[0]}-{pages[1]}\\f")\n'
+        )
+        return [sys.executable, '-c', script]
+    return command
+
+
+class TestPageRanges(TestCase):
+    """A PDF is split into ranges of pages."""
+
+    @mock.patch.object(fulltext.preanalysis, 'count_pages', return_value=25)
+    def test_split(self, mock_count_pages):
+        """The last range is shorter."""
+        self.assertEqual(fulltext.page_ranges('foo.pdf', 10),
+                         [(1, 10), (11, 20), (21, 25)])
+
+    @mock.patch.object(fulltext.preanalysis, 'count_pages', return_value=8)
+    def test_short(self, mock_count_pages):
+        """Short PDFs are not split."""
+        self.assertEqual(fulltext.page_ranges('foo.pdf', 10), [])
+
+    @mock.patch.object(fulltext.preanalysis, 'count_pages', return_value=None)
+    def test_unknown_length(self, mock_count_pages):
+        """PDFs are not split if we cannot count their pages."""
+        self.assertEqual(fulltext.page_ranges('foo.pdf', 10), [])
+
+    def test_disabled(self):
+        """Nothing is split by default."""
+        self.assertEqual(fulltext.page_ranges('foo.pdf', 0), [])
+
+    def test_commands(self):
+        """The extractors are told which pages to extract."""
+        self.assertIn('-p 3,4,5', ' '.join(
+            fulltext.pdf2txt_command('a.pdf', '-A', pages=(3, 5))
+        ))
+        self.assertIn('-f 3 -l 5', ' '.join(
+            fulltext.pdftotext_command('a.pdf', pages=(3, 5))
+        ))
+
+
+class TestRunInChunks(TestCase):
+    """Page ranges are extracted concurrently."""
+
+    def setUp(self):
+        """Make a PDF to extract."""
+        self.workdir = tempfile.mkdtemp()
+        self.pdffile = os.path.join(self.workdir, 'foo.pdf')
+        self.ranges = [(1, 10), (11, 20), (21, 25)]
+
+    def tearDown(self):
+        """Remove the working directory."""
+        shutil.rmtree(self.workdir)
+
+    def test_results_are_joined_in_order(self):
+        """The output of each chunk is concatenated, in page order."""
+        output = fulltext.run_in_chunks(fake(self.workdir), self.pdffile,
+                                        self.ranges, 60)
+        self.assertEqual(output, 'pages 1-10\fpages 11-20\fpages 21-25\f')
+        self.assertEqual(os.listdir(self.workdir), [])
+
+    def test_chunks_are_retried(self):
+        """A chunk that fails is tried again."""
+        with mock.patch.object(fulltext, 'CHUNK_RETRIES', 1):
+            output = fulltext.run_in_chunks(fake(self.workdir, failures=1),
+                                            self.pdffile, self.ranges, 60)
+        self.assertEqual(output, 'pages 1-10\fpages 11-20\fpages 21-25\f')
+
+    def test_chunk_fails(self):
+        """A chunk that keeps failing fails the whole extraction."""
+        with mock.patch.object(fulltext, 'CHUNK_RETRIES', 1):
+            with self.assertRaises(CalledProcessError):
+                fulltext.run_in_chunks(fake(self.workdir, failures=2),
+                                       self.pdffile, self.ranges, 60)
+
+    def test_other_chunks_are_stopped(self):
+        """When a chunk fails, the others are killed and collected."""
+        def command(pdffile, pages=None):
+            if pages == (1, 10):
+                return [sys.executable, '-c', 'import sys; sys.exit(1)']
+            return [sys.executable, '-c', 'import time; time.sleep(60)']
+
+        processes = []
+
+        def popen(*args, **kwargs):
+            processes.append(Popen(*args, **kwargs))
+            return processes[-1]
+
+        started = time.time()
+        with mock.patch.object(fulltext, 'CHUNK_RETRIES', 0):
+            with mock.patch.object(fulltext, 'Popen', popen):
+                with self.assertRaises(CalledProcessError):
+                    fulltext.run_in_chunks(command, self.pdffile,
+                                           self.ranges, 60)
+        self.assertLess(time.time() - started, 30)
+        self.assertTrue(all(process.returncode is not None
+                            for process in processes))
+
+    @mock.patch.object(fulltext.preanalysis, 'count_pages', return_value=25)
+    @mock.patch.object(fulltext, 'PAGES_PER_CHUNK', 10)
+    def test_run_pdftotext(self, mock_count_pages):
+        """The extractors use page ranges when configured."""
+        with mock.patch.object(fulltext, 'pdftotext_command',
+                               fake(self.workdir)):
+            output = fulltext.run_pdftotext(self.pdffile)
+        self.assertEqual(output, 'pages 1-10\fpages 11-20\fpages 21-25\f')
@@ -20,7 +20,7 @@ class TestExtractorE2E(TestCase):
         runpath, _ = os.path.split(basepath)
         build_result = subprocess.run(
             "docker build %s -f %s/Dockerfile "
-            "-t arxiv/fulltext-extractor:0.3" % (runpath, runpath),
+            "-t arxiv/fulltext-extractor:0.4" % (runpath, runpath),
             stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True
         )
         assert build_result.returncode == 0
@@ -34,7 +34,7 @@ class TestExtractorE2E(TestCase):
 
         extract_result = subprocess.run(
             "docker run -it -v %s:/pdfs "
-            "arxiv/fulltext-extractor:0.3 /pdfs/%s" % (pdf_path, pdf_filename),
+            "arxiv/fulltext-extractor:0.4 /pdfs/%s" % (pdf_path, pdf_filename),
             stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True
         )
         self.assertEqual(
@@ -0,0 +1,48 @@
+"""Tests for :mod:`fulltext.fixunicode`."""
+
+import re
+import unicodedata
+from unittest import TestCase
+
+from fulltext import fixunicode
+
+
+def fix_unicode_sequentially(txt: str) -> str:
+    """Apply each substitution in turn, as ``fix_unicode`` originally did."""
+    for search, replace in fixunicode.unicode_mapping.items():
+        if search == '\xa0':   # The original eszett rule came before this.
+            txt = re.subn(r'(\B)\u00DF', r'\1ss', txt)[0]
+        txt = re.subn(re.escape(search), replace, txt)[0]
+    return unicodedata.normalize('NFKC', txt)
+
+
+class TestFixUnicode(TestCase):
+    """The single-pass engine must agree with sequential substitution."""
+
+    def test_ligatures(self):
+        """Text contains typographical ligatures."""
+        self.assertEqual(fixunicode.fix_unicode('ﬁnal eﬃcient'),
+                         'final efficient')
+
+    def test_eszett(self):
+        """Eszett is expanded only when it follows a word character."""
+        self.assertEqual(fixunicode.fix_unicode('Straße ß'),
+                         'Strasse ß')
+
+    def test_punctuation(self):
+        """Quotes, dashes, spaces and middle dots are normalized."""
+        self.assertEqual(
+            fixunicode.fix_unicode('‘a’\xa0“b”—c\xb7'),
+            '\'a\' "b"-c*'
+        )
+
+    def test_matches_sequential_substitution(self):
+        """Every rule, in every context, gives the same result."""
+        keys = list(fixunicode.unicode_mapping) + ['ß', 'ﬆß']
+        for key in keys:
+            for txt in [key, f'a{key}', f'{key}b', f' {key} ', f'ß{key}']:
+                self.assertEqual(fixunicode.fix_unicode(txt),
+                                 fix_unicode_sequentially(txt))
+        txt = ' '.join(keys) + 'xß\xa0ß'
+        self.assertEqual(fixunicode.fix_unicode(txt),
+                         fix_unicode_sequentially(txt))
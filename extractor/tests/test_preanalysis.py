@@ -0,0 +1,142 @@
+"""Tests for predicting the extractor from a pre-analysis of the PDF."""
+
+import os
+import sys
+import json
+import tempfile
+from unittest import TestCase, mock
+
+# The extractor scripts import each other as top-level modules.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'fulltext'))
+
+import preanalysis   # noqa: E402
+from fulltext import fulltext   # noqa: E402
+
+PDFINFO = """Title:          A paper
+Producer:       dvips + GPL Ghostscript 9.05
+Tagged:         no
+Pages:          12
+Encrypted:      no
+"""
+
+PDFFONTS = """name                                 type              encoding         emb sub uni object ID
+------------------------------------ ----------------- ---------------- --- --- --- ---------
+[none]                               Type 3            Custom           yes no  no       8  0
+[none]                               Type 3            Custom           yes no  no      12  0
+"""
+
+GOOD = 'Some perfectly ordinary words. ' * 100
+BAD = 'Wordsthatareallruntogetherwithoutanyspacesbetweenthemwhatsoever' * 100
+
+
+class TestAnalyze(TestCase):
+    """Properties are parsed from the output of the poppler tools."""
+
+    def test_parse_pdfinfo(self):
+        """Get the page count and producer."""
+        self.assertEqual(preanalysis.parse_pdfinfo(PDFINFO),
+                         (12, 'dvips + GPL Ghostscript 9.05'))
+
+    def test_parse_pdffonts(self):
+        """Get the font types."""
+        self.assertEqual(preanalysis.parse_pdffonts(PDFFONTS),
+                         ['Type 3', 'Type 3'])
+
+    @mock.patch.object(preanalysis, '_run')
+    def test_analyze(self, mock_run):
+        """Combine the output of the tools."""
+        mock_run.side_effect = [PDFINFO, PDFFONTS, 'Some text\n']
+        analysis = preanalysis.analyze('foo.pdf')
+        self.assertEqual(analysis.pages, 12)
+        self.assertTrue(analysis.has_text)
+        self.assertEqual(analysis.first_page_chars, 9)
+
+    @mock.patch.object(preanalysis, '_run', return_value=None)
+    def test_tools_are_unavailable(self, mock_run):
+        """Nothing is known about the PDF."""
+        self.assertEqual(preanalysis.analyze('foo.pdf'),
+                         preanalysis.Analysis())
+        self.assertEqual(
+            preanalysis.select(preanalysis.Analysis()).strategy, 'pdf2txt'
+        )
+
+
+class TestSelect(TestCase):
+    """The rules table picks an extractor."""
+
+    def test_type3_fonts(self):
+        """PDFs with only bitmap fonts need positional analysis."""
+        analysis = preanalysis.Analysis(font_types=['Type 3'], has_text=True)
+        self.assertEqual(preanalysis.select(analysis).strategy, 'pdf2txt_A')
+
+    def test_no_text_layer(self):
+        """PDFs without any fonts get the quickest extractor."""
+        analysis = preanalysis.Analysis(font_types=[], has_text=False)
+        self.assertEqual(preanalysis.select(analysis).strategy, 'pdftotext')
+
+    def test_ordinary(self):
+        """Other PDFs get pdf2txt, as before."""
+        analysis = preanalysis.Analysis(font_types=['Type 1', 'Type 3'],
+                                        has_text=True)
+        self.assertEqual(preanalysis.select(analysis).name, 'default')
+
+    def test_record(self):
+        """Decisions are appended to a file."""
+        _, path = tempfile.mkstemp()
+        analysis = preanalysis.Analysis(pages=3)
+        for passed in [True, False]:
+            preanalysis.record('/pdfs/foo.pdf', analysis,
+                               preanalysis.DEFAULT, passed, path=path)
+        with open(path) as f:
+            decisions = [json.loads(line) for line in f]
+        self.assertEqual([d['passed'] for d in decisions], [True, False])
+        self.assertEqual(decisions[0]['pdf'], 'foo.pdf')
+        self.assertEqual(decisions[0]['analysis']['pages'], 3)
+
+
+@mock.patch.object(fulltext.preanalysis, 'record')
+@mock.patch.object(fulltext.preanalysis, 'analyze')
+class TestPredictive(TestCase):
+    """The predicted extractor is run first."""
+
+    def setUp(self):
+        """Make a PDF to extract."""
+        _, self.pdffile = tempfile.mkstemp(suffix='.pdf')
+
+    def analysis(self, font_types):
+        """Make an analysis with these font types."""
+        return preanalysis.Analysis(font_types=font_types,
+                                    has_text=bool(font_types))
+
+    @mock.patch.object(fulltext, 'run_pdf2txt')
+    @mock.patch.object(fulltext, 'run_pdf2txt_A', return_value=GOOD)
+    def test_skips_doomed_pass(self, mock_A, mock_pdf2txt, mock_analyze,
+                               mock_record):
+        """pdf2txt is not run if -A is predicted, and succeeds."""
+        mock_analyze.return_value = self.analysis(['Type 3'])
+        self.assertEqual(fulltext.fulltext(self.pdffile, mode='predictive'),
+                         GOOD)
+        self.assertEqual(mock_pdf2txt.call_count, 0)
+        self.assertTrue(mock_record.call_args[0][3])
+
+    @mock.patch.object(fulltext, 'run_pdf2txt', return_value=GOOD)
+    @mock.patch.object(fulltext, 'run_pdf2txt_A', return_value=BAD)
+    def test_prediction_is_wrong(self, mock_A, mock_pdf2txt, mock_analyze,
+                                 mock_record):
+        """The other extractors are tried, without repeating -A."""
+        mock_analyze.return_value = self.analysis(['Type 3'])
+        self.assertEqual(fulltext.fulltext(self.pdffile, mode='predictive'),
+                         GOOD)
+        self.assertEqual(mock_A.call_count, 1)
+        self.assertFalse(mock_record.call_args[0][3])
+
+    @mock.patch.object(fulltext, 'run_pdf2txt', return_value=BAD)
+    @mock.patch.object(fulltext, 'run_pdf2txt_A', return_value=GOOD)
+    def test_default(self, mock_A, mock_pdf2txt, mock_analyze, mock_record):
+        """Otherwise, the extractors are run in the usual order."""
+        mock_analyze.return_value = self.analysis(['Type 1'])
+        self.assertEqual(fulltext.fulltext(self.pdffile, mode='predictive'),
+                         GOOD)
+        self.assertEqual(mock_pdf2txt.call_count, 1)
+        self.assertFalse(mock_record.call_args[0][3])
@@ -0,0 +1,143 @@
+"""Tests for running extraction strategies concurrently."""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from unittest import TestCase
+
+# The extractor scripts import each other as top-level modules.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'fulltext'))
+
+from fulltext import fulltext   # noqa: E402
+
+GOOD = 'Some perfectly ordinary words. ' * 100
+BAD = 'Wordsthatareallruntogetherwithoutanyspacesbetweenthemwhatsoever' * 100
+
+
+def fake(text=GOOD, delay=0., returncode=0):
+    """Make a command that pretends to be an extractor."""
+    def command(pdffile):
+        script = (
+            f'import sys, time; time.sleep({delay}); '
+            f'sys.stdout.write({text!r}); sys.exit({returncode})'
+        )
+        return [sys.executable, '-c', script]
+    return command
+
+
+def strategies(pdf2txt, pdftotext, pdf2txt_A):
+    """Make strategies with the same preferences as the real ones."""
+    return [
+        fulltext.Strategy('pdf2txt', pdf2txt),
+        fulltext.Strategy('pdftotext', pdftotext, fallback_for='pdf2txt'),
+        fulltext.Strategy('pdf2txt_A', pdf2txt_A),
+    ]
+
+
+class TestChoose(TestCase):
+    """The choice of strategy matches the sequential behaviour."""
+
+    def test_nothing_finished(self):
+        """We must wait for all of the strategies."""
+        winner, needed = fulltext.choose(fulltext.STRATEGIES, {})
+        self.assertIsNone(winner)
+        self.assertEqual(needed, {'pdf2txt', 'pdftotext', 'pdf2txt_A'})
+
+    def test_preferred_is_good(self):
+        """The preferred strategy wins as soon as it is good."""
+        winner, _ = fulltext.choose(fulltext.STRATEGIES, {'pdf2txt': True})
+        self.assertEqual(winner, 'pdf2txt')
+
+    def test_preferred_is_bad(self):
+        """The fallback is not eligible if pdf2txt produced output."""
+        winner, needed = fulltext.choose(fulltext.STRATEGIES,
+                                         {'pdf2txt': False})
+        self.assertIsNone(winner)
+        self.assertEqual(needed, {'pdf2txt_A'})
+
+    def test_preferred_fails(self):
+        """The fallback wins if pdf2txt fails outright."""
+        winner, _ = fulltext.choose(fulltext.STRATEGIES,
+                                    {'pdf2txt': None, 'pdftotext': True})
+        self.assertEqual(winner, 'pdftotext')
+
+    def test_less_preferred_is_good(self):
+        """A good result must wait for more preferred strategies."""
+        winner, needed = fulltext.choose(fulltext.STRATEGIES,
+                                         {'pdf2txt_A': True})
+        self.assertIsNone(winner)
+        self.assertIn('pdf2txt', needed)
+
+    def test_all_bad(self):
+        """There is no good result."""
+        with self.assertRaises(RuntimeError):
+            fulltext.choose(fulltext.STRATEGIES, {'pdf2txt': None,
+                                                  'pdftotext': False,
+                                                  'pdf2txt_A': False})
+
+
+class TestParallel(TestCase):
+    """Run fake extractors concurrently."""
+
+    def setUp(self):
+        """Make a PDF to extract."""
+        self.workdir = tempfile.mkdtemp()
+        self.pdffile = os.path.join(self.workdir, 'foo.pdf')
+        with open(self.pdffile, 'wb') as f:
+            f.write(b'%PDF-1.4')
+
+    def tearDown(self):
+        """Remove the working directory."""
+        shutil.rmtree(self.workdir)
+
+    def test_preferred_wins_and_others_are_cancelled(self):
+        """pdf2txt is good, so the slow strategies are cancelled."""
+        start = time.monotonic()
+        content = fulltext.fulltext_parallel(
+            self.pdffile,
+            strategies=strategies(fake(GOOD), fake(delay=30),
+                                  fake(delay=30))
+        )
+        self.assertEqual(content, GOOD)
+        self.assertLess(time.monotonic() - start, 15)
+
+    def test_preferred_is_bad(self):
+        """pdf2txt runs words together, so pdf2txt -A is used."""
+        content = fulltext.fulltext_parallel(
+            self.pdffile,
+            strategies=strategies(fake(BAD), fake('pdftotext ' * 100),
+                                  fake(GOOD, delay=0.5))
+        )
+        self.assertEqual(content, GOOD)
+        self.assertEqual(os.listdir(self.workdir), ['foo.pdf'])
+
+    def test_preferred_fails(self):
+        """pdf2txt fails, so pdftotext is used."""
+        content = fulltext.fulltext_parallel(
+            self.pdffile,
+            strategies=strategies(fake(returncode=1),
+                                  fake('pdftotext ' * 100, delay=0.5),
+                                  fake(GOOD))
+        )
+        self.assertEqual(content, 'pdftotext ' * 100)
+
+    def test_preferred_times_out(self):
+        """pdf2txt takes too long, so pdftotext is used."""
+        content = fulltext.fulltext_parallel(
+            self.pdffile,
+            timelimit=1,
+            strategies=strategies(fake(delay=30), fake('pdftotext ' * 100),
+                                  fake(GOOD))
+        )
+        self.assertEqual(content, 'pdftotext ' * 100)
+
+    def test_nothing_is_good(self):
+        """No strategy produces good text."""
+        with self.assertRaises(RuntimeError):
+            fulltext.fulltext_parallel(
+                self.pdffile,
+                strategies=strategies(fake(BAD), fake(GOOD), fake(BAD))
+            )
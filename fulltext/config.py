@@ -109,6 +109,10 @@ session is modified. Non permanent sessions are not affected by this.
 USE_X_SENDFILE = bool(int(environ.get('USE_X_SENDFILE', '0')))
 """
 enable/disable x-sendfile
+
+If enabled, plain text content is sent by the web server in front of the
+application, which must support the ``X-Sendfile`` header and be able to read
+:const:`STORAGE_VOLUME`. Otherwise it is sent with ``wsgi.file_wrapper``.
 """
 
 LOGGER_NAME = environ.get('LOGGER_NAME', 'fulltext')
@@ -250,10 +254,29 @@ AWS_REGION = environ.get('AWS_REGION', 'us-east-1')
 
 # --- EXTRACTOR CONFIGURATION ---
 
+EXTRACTOR_BACKEND = environ.get('EXTRACTOR_BACKEND', 'docker')
+"""
+Backend used to extract plain text from PDFs.
+
+``docker`` runs the :const:`.EXTRACTOR_IMAGE` in a new container on the
+:const:`.DOCKER_HOST` for each PDF. ``pool`` keeps warm extractor containers
+running on the :const:`.DOCKER_HOST` in server mode, and reuses them across
+PDFs (see :const:`.EXTRACTOR_POOL_SIZE`). ``local`` runs the extractor scripts at
+:const:`.EXTRACTOR_SCRIPTS` in a pool of subprocesses; this requires that the
+worker image also provides ``pdf2txt.py`` (pdfminer) and ``pdftotext``
+(poppler-utils).
+"""
+
+EXTRACTOR_SCRIPTS = environ.get('EXTRACTOR_SCRIPTS', '/opt/arxiv/extractor')
+"""Location of the extractor scripts, used by the ``local`` backend."""
+
+EXTRACTOR_PROCESSES = int(environ.get('EXTRACTOR_PROCESSES', '1'))
+"""Number of subprocesses per worker process for the ``local`` backend."""
+
 EXTRACTOR_IMAGE = environ.get('EXTRACTOR_IMAGE', 'arxiv/fulltext-extractor')
 """Name of the image used to extract plain text from PDFs."""
 
-EXTRACTOR_VERSION = '0.3'
+EXTRACTOR_VERSION = '0.4'
 """
 The extractor version, used to sign extracted fulltext.
 
@@ -261,6 +284,57 @@ This should only be incremented when the extraction process itself changes,
 not when the API of this web application changes.
 """
 
+EXTRACTOR_MODE = environ.get('EXTRACTOR_MODE', 'sequential')
+"""
+How the extractor runs its extraction routines (pdf2txt, pdftotext, etc).
+
+``sequential`` runs them one after another, only as needed. ``parallel`` runs
+them concurrently, and cancels the rest once the best result is known; this
+bounds the time spent on pathological PDFs, at the cost of more CPU per PDF.
+``predictive`` runs a quick pre-analysis of the PDF, and starts with the
+routine that is most likely to succeed.
+"""
+
+EXTRACTOR_DECISIONS = environ.get('EXTRACTOR_DECISIONS')
+"""
+Path (in the extractor) of a file in which to record ``predictive`` decisions.
+
+Decisions are appended as JSON lines, e.g. to ``/pdfs/decisions.jsonl`` in
+the working volume, for tuning the pre-analysis rules. This is passed to the
+``docker`` and ``pool`` backends; the ``local`` backend uses the
+``FULLTEXT_DECISIONS`` variable from the worker's own environment.
+"""
+
+EXTRACTOR_PAGES_PER_CHUNK = int(environ.get('EXTRACTOR_PAGES_PER_CHUNK', '0'))
+"""
+Extract PDFs longer than this many pages in concurrent page ranges.
+
+This uses all of the cores available to the extractor on large documents, and
+retries (and times out) each range separately. ``0`` disables it. This is
+passed to the ``docker`` and ``pool`` backends; the ``local`` backend uses the
+``FULLTEXT_PAGES_PER_CHUNK`` variable from the worker's own environment.
+"""
+
+EXTRACTOR_POOL_SIZE = int(environ.get('EXTRACTOR_POOL_SIZE', '1'))
+"""Number of warm extractor containers per worker process (``pool``)."""
+
+EXTRACTOR_POOL_MAX_JOBS = int(environ.get('EXTRACTOR_POOL_MAX_JOBS', '100'))
+"""Number of PDFs after which a warm extractor container is recycled."""
+
+EXTRACTOR_POOL_MAX_RSS = int(environ.get('EXTRACTOR_POOL_MAX_RSS', '512'))
+"""Memory (in MB) above which a warm extractor container is recycled."""
+
+EXTRACTOR_POOL_TIMEOUT = int(environ.get('EXTRACTOR_POOL_TIMEOUT', '1800'))
+"""Seconds to wait for a warm extractor container to extract a PDF."""
+
+EXTRACTOR_IMAGE_TTL = int(environ.get('EXTRACTOR_IMAGE_TTL', '3600'))
+"""
+Seconds for which a worker reuses the extractor image ID that it resolved.
+
+After this time, or if the image goes away, the worker checks the Docker host
+for the image again (and pulls it if it is missing).
+"""
+
 DOCKER_HOST = environ.get('DOCKER_HOST', 'tcp://localhost:2375')
 """
 Docker host that will run the :const:`.EXTRACTOR_IMAGE`.
@@ -272,12 +346,96 @@ use the local socket, e.g. ``unix:///var/run/docker.sock``.
 WORKDIR = environ.get('WORKDIR', '/pdfs')
 """Volume in the worker container where PDFs are stored."""
 
+PDF_CHUNK_SIZE = int(environ.get('PDF_CHUNK_SIZE', str(1024 * 1024)))
+"""
+Size (in bytes) of the chunks in which PDFs are downloaded to :const:`WORKDIR`.
+
+PDFs are streamed to disk one chunk at a time, so this bounds the memory used
+for each download.
+"""
+
+PDF_NOT_READY_ATTEMPTS = int(environ.get('PDF_NOT_READY_ATTEMPTS', '8'))
+"""
+Number of attempts to retrieve a PDF that has not been generated yet.
+
+Between attempts the extraction task is rescheduled, rather than waiting in
+the worker. The delay starts at :const:`PDF_NOT_READY_BACKOFF` seconds, and
+doubles with each attempt up to :const:`PDF_NOT_READY_BACKOFF_MAX` seconds.
+"""
+
+PDF_NOT_READY_BACKOFF = float(environ.get('PDF_NOT_READY_BACKOFF', '5'))
+"""Delay (in seconds) before the second attempt to retrieve a PDF."""
+
+PDF_NOT_READY_BACKOFF_MAX = \
+    float(environ.get('PDF_NOT_READY_BACKOFF_MAX', '600'))
+"""Maximum delay (in seconds) between attempts to retrieve a PDF."""
+
+PDF_CACHE_VOLUME = environ.get('PDF_CACHE_VOLUME')
+"""
+Volume in the worker container where canonical PDFs are cached.
+
+If set, PDFs are kept here after they are downloaded, and are revalidated with
+their ETag when the same paper is extracted again (e.g. after a change of
+:const:`EXTRACTOR_VERSION`), rather than downloaded again. If not set, PDFs
+are not cached.
+"""
+
+PDF_CACHE_SIZE = int(environ.get('PDF_CACHE_SIZE', str(10 * 1024 ** 3)))
+"""Maximum size (in bytes) of :const:`PDF_CACHE_VOLUME`."""
+
 MOUNTDIR = environ.get('MOUNTDIR', '/pdfs')
 """Volume in the docker host to be mounted at /pdfs in extractor."""
 
 STORAGE_VOLUME = environ.get('STORAGE_VOLUME', tempfile.mkdtemp())
 """Volume in API/worker containers where extraction results are stored."""
 
+STORAGE_COMPRESSION = environ.get('STORAGE_COMPRESSION', '')
+"""
+Compression of stored content: ``gzip`` or ``zstd`` for all formats, or for
+each format (e.g. ``plain:gzip,psv:zstd``). Empty for no compression.
+
+gzip content is sent as it is to clients that accept it. zstd requires the
+:mod:`zstandard` package.
+"""
+
+STORAGE_INDEX = environ.get('STORAGE_INDEX')
+"""
+Path to a SQLite database that indexes the latest extraction of each e-print,
+so that it can usually be found without listing its directory on
+:const:`STORAGE_VOLUME`. It must be on a local disk, not on the storage volume
+(SQLite cannot be shared over a network filesystem), so each container has its
+own; an entry is checked against the modification time of the paper directory,
+so extractions stored by other containers are still found. Rebuild it with
+``python -m fulltext.services.store``.
+"""
+
+STORAGE_META_CACHE_SIZE = int(environ.get('STORAGE_META_CACHE_SIZE', '10000'))
+"""
+Number of parsed metadata records to keep in memory, in each process. A cached
+record is reused while the size and modification time of its file are
+unchanged. Set to ``0`` to disable the cache.
+"""
+
+STORAGE_BACKEND = environ.get('STORAGE_BACKEND', 'files')
+"""
+How extractions are kept on :const:`STORAGE_VOLUME`: ``files`` for a file per
+format, or ``pack`` to append them to large segment files (in ``.pack``) with a
+SQLite index of their offsets. ``pack`` avoids the per-file overhead of the
+filesystem, but the volume must not be shared by more than one host, and must
+not be a network filesystem (this is checked at startup). Copy an existing
+volume with ``python -m fulltext.services.store migrate``.
+"""
+
+STORAGE_PACK_SEGMENT_SIZE = int(environ.get('STORAGE_PACK_SEGMENT_SIZE',
+                                            str(1024 ** 3)))
+"""Size (in bytes) at which a pack segment is sealed, and a new one started."""
+
+STORAGE_PACK_COMPACT_RATIO = float(environ.get('STORAGE_PACK_COMPACT_RATIO',
+                                               '0.5'))
+"""
+A sealed segment is compacted once less than this fraction of it is live data.
+"""
+
 
 # --- KINESIS CONFIGURATION ---
 KINESIS_ENDPOINT = environ.get('KINESIS_ENDPOINT')
@@ -418,6 +576,29 @@ VAULT_REQUESTS = [
 
 JWT_SECRET = environ.get('JWT_SECRET')
 
+BATCH_MAX_SIZE = int(environ.get('BATCH_MAX_SIZE', '1000'))
+"""Maximum number of identifiers in a request to ``/arxiv/batch``."""
+
+BATCH_CONCURRENCY = int(environ.get('BATCH_CONCURRENCY', '8'))
+"""Number of concurrent checks for PDFs in a request to ``/arxiv/batch``."""
+
+CONTENT_MAX_AGE = int(environ.get('CONTENT_MAX_AGE', '60'))
+"""
+Time (in seconds) for which clients may cache the latest extraction.
+
+Without a version in the URL, the content is replaced when an e-print is
+re-extracted, so clients should revalidate it (with its ETag) fairly often.
+"""
+
+CONTENT_MAX_AGE_VERSIONED = int(environ.get('CONTENT_MAX_AGE_VERSIONED',
+                                            '31536000'))
+"""
+Time (in seconds) for which clients may cache a version of an extraction.
+
+The content at ``/version/<version>/format/<fmt>`` never changes once the
+extraction has succeeded, so it is served as ``immutable``.
+"""
+
 # --- UPSTREAM INTEGRATIONS ---
 
 # Integration with the preview service.
@@ -455,6 +636,15 @@ if PREVIEW_PROTO == 'https' and not PREVIEW_VERIFY:
 PREVIEW_AWAIT = bool(int(environ.get('CANONICAL_AWAIT', '1')))
 """Enable/disable status check for preview service during start-up."""
 
+PREVIEW_POOL_SIZE = int(environ.get('PREVIEW_POOL_SIZE', '10'))
+"""Maximum number of persistent connections to the preview service."""
+
+PREVIEW_KEEPALIVE = bool(int(environ.get('PREVIEW_KEEPALIVE', '1')))
+"""Enable/disable TCP keep-alive on connections to the preview service."""
+
+PREVIEW_HEAD_TTL = float(environ.get('PREVIEW_HEAD_TTL', '30'))
+"""Seconds for which the owner of a preview is cached."""
+
 
 # Integration with the canonical service.
 #
@@ -493,4 +683,13 @@ if PREVIEW_PROTO == 'https' and not CANONICAL_VERIFY:
                   ' this should not be disabled in production.')
 
 CANONICAL_AWAIT = bool(int(environ.get('CANONICAL_AWAIT', '1')))
-"""Enable/disable status check for canonical service during start-up."""
\ No newline at end of file
+"""Enable/disable status check for canonical service during start-up."""
+
+CANONICAL_POOL_SIZE = int(environ.get('CANONICAL_POOL_SIZE', '10'))
+"""Maximum number of persistent connections to the canonical service."""
+
+CANONICAL_KEEPALIVE = bool(int(environ.get('CANONICAL_KEEPALIVE', '1')))
+"""Enable/disable TCP keep-alive on connections to the canonical service."""
+
+CANONICAL_HEAD_TTL = float(environ.get('CANONICAL_HEAD_TTL', '30'))
+"""Seconds for which the existence of a canonical PDF is cached."""
\ No newline at end of file
@@ -1,14 +1,22 @@
 """API controllers."""
 
-from typing import Optional, Tuple, Dict, Any, Callable
+import json
+import codecs
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Optional, Tuple, Dict, Any, Callable, Container, \
+    Iterable, Iterator, Union
 from http import HTTPStatus as status
 
 from flask import url_for
 from celery import current_app
 from werkzeug.exceptions import NotFound, InternalServerError, BadRequest, \
     NotAcceptable
+from werkzeug.http import http_date, quote_etag
 
 from arxiv.base import logging
+from arxiv.base.globals import get_application_config
+from arxiv.identifier import OLD_STYLE, STANDARD
 
 from .services import store, legacy, preview
 from . import extract
@@ -23,6 +31,9 @@ TASK_FAILED = {'status': Extraction.Status.FAILED.value}
 TASK_COMPLETE = {'status': Extraction.Status.SUCCEEDED.value}
 
 Response = Tuple[Dict[str, Any], int, Dict[str, Any]]
+StreamingResponse = Tuple[Iterator[bytes], int, Dict[str, Any]]
+FileResponse = Tuple[Union[str, IO[bytes], Dict[str, Any]], int,
+                     Dict[str, Any]]
 Authorizer = Callable[[str, Optional[str]], bool]
 
 
@@ -38,11 +49,101 @@ def service_status() -> Response:
     raise InternalServerError(stat)    # type: ignore
 
 
+def connection_stats() -> Response:
+    """
+    Handle a request for metrics about connections to upstream services.
+
+    These are for the process that handles the request, and include the use of
+    its cache of extraction metadata.
+    """
+    stats = {
+        'canonical': legacy.CanonicalPDF.current_session().stats(),
+        'preview': preview.PreviewService.current_session().stats(),
+        'storage': store.Storage.current_session().stats()
+    }
+    return stats, status.OK, {}
+
+
+def _locate(identifier: str, id_type: str, version: Optional[str],
+            content_fmt: str, authorizer: Optional[Authorizer]) \
+        -> Tuple[Extraction, Optional[str]]:
+    """Get the metadata of an extraction, and the path to its content."""
+    if id_type not in SupportedBuckets:
+        raise NotFound('Unrecognized identifier')
+    if content_fmt not in SupportedFormats:
+        raise NotFound('Unsupported format')
+
+    storage = store.Storage.current_session()
+    try:
+        product = storage.retrieve(identifier, version, content_fmt, id_type,
+                                   meta_only=True)
+    except IOError as e:
+        raise InternalServerError('Could not connect to backend') from e
+    except store.DoesNotExist:
+        # If there is only metadata, we should still get a response from
+        # the store. So if we hit DoesNotExist there really is nothing to see
+        # here folks, move along.
+        raise NotFound('No such extraction')
+
+    # Make sure that the client is authorized to work with this resource before
+    # doing anything else.
+    if authorizer and not authorizer(identifier, product.owner):
+        raise NotFound('No such extraction')
+
+    try:
+        path: Optional[str] = storage.content_path(
+            identifier, product.version, content_fmt, id_type
+        )
+    except store.DoesNotExist:
+        path = None
+    return product, path
+
+
+def _cache_headers(product: Extraction, stat: Any, media_type: str,
+                   versioned: bool, encoding: Optional[str] = None) \
+        -> Dict[str, Any]:
+    """
+    Get validators and caching directives for the content of an extraction.
+
+    These come from a ``stat()`` of the content (see
+    :meth:`.Storage.content_stat`), so that conditional
+    requests can be answered without reading it. The ETag is strong: it
+    changes with the extractor version and with the modification time and
+    size of the file, and differs for each representation of the content.
+
+    Content that is requested by version never changes once the extraction
+    has succeeded, so it can be cached for as long as clients like. Without a
+    version, the content can be replaced by a newer extraction.
+    """
+    etag = f'{product.version}-{stat.st_mtime_ns:x}-{stat.st_size:x}'
+    if media_type != 'text/plain':
+        etag = f'{etag}-{media_type.rsplit("/", 1)[-1]}'
+    if encoding is not None:
+        etag = f'{etag}-{encoding}'
+
+    config = get_application_config()
+    if versioned and product.status is Extraction.Status.SUCCEEDED:
+        max_age = int(config.get('CONTENT_MAX_AGE_VERSIONED', 31536000))
+        directives = f'max-age={max_age}, immutable'
+    else:
+        directives = f'max-age={int(config.get("CONTENT_MAX_AGE", 60))}'
+    visibility = 'private' \
+        if product.bucket == SupportedBuckets.SUBMISSION else 'public'
+    return {
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': f'{visibility}, {directives}',
+        'Vary': 'Accept, Accept-Encoding'
+    }
+
+
 def retrieve(identifier: str,                                # arch: controller
              id_type: str = SupportedBuckets.ARXIV,
              version: Optional[str] = None,
              content_fmt: str = SupportedFormats.PLAIN,
-             authorizer: Optional[Authorizer] = None) -> Response:
+             authorizer: Optional[Authorizer] = None,
+             is_modified: Optional[Callable[[Dict[str, Any]], bool]] = None,
+             stream: bool = False) -> Union[Response, StreamingResponse]:
     """
     Handle request for full-text content for an arXiv e-print.
 
@@ -56,39 +157,262 @@ def retrieve(identifier: str,                                # arch: controller
         If provided, the desired extraction version.
     content_fmt : str
         The desired content format (default: `plain`).
+    is_modified : callable
+        If provided, called with the validators of the content (``ETag`` and
+        ``Last-Modified`` headers) before it is loaded. If it returns
+        ``False``, the client already has the content and it is not loaded.
+    stream : bool
+        If ``True`` and there is content, the response data is the JSON
+        document as an iterator of ``bytes``, into which the content is read
+        in chunks (see :meth:`.Storage.retrieve_chunks`), rather than a
+        ``dict`` with the content loaded into memory.
 
     Returns
     -------
     tuple
 
     """
-    if id_type not in SupportedBuckets:
-        raise NotFound('Unrecognized identifier')
-    if content_fmt not in SupportedFormats:
-        raise NotFound('Unsupported format')
+    product, path = _locate(identifier, id_type, version, content_fmt,
+                            authorizer)
+    if path is None:
+        if product.status is Extraction.Status.IN_PROGRESS:
+            target = url_for('fulltext.task_status', identifier=identifier,
+                             id_type=id_type)
+            return TASK_IN_PROGRESS, status.SEE_OTHER, {'Location': target}
+        return product.to_dict(), status.OK, {}
 
     storage = store.Storage.current_session()
     try:
-        product = storage.retrieve(identifier, version, content_fmt, id_type)
+        headers = _cache_headers(product, storage.content_stat(path),
+                                 'application/json',
+                                 versioned=version is not None)
+    except FileNotFoundError:   # Replaced by a new extraction in the meantime.
+        raise NotFound('No content for this extraction')
+    if is_modified is not None and not is_modified(headers):
+        return {}, status.NOT_MODIFIED, headers
+
+    try:
+        if stream:
+            product, chunks = storage.retrieve_chunks(
+                identifier, product.version, content_fmt, id_type
+            )
+            return _json(product.to_dict(), chunks), status.OK, headers
+        product = storage.retrieve(identifier, product.version, content_fmt,
+                                   id_type)
     except IOError as e:
         raise InternalServerError('Could not connect to backend') from e
     except store.DoesNotExist:
-        # If there is only metadata, we should still get a response from
-        # the store. So if we hit DoesNotExist there really is nothing to see
-        # here folks, move along.
         raise NotFound('No such extraction')
+    return product.to_dict(), status.OK, headers
 
-    # Make sure that the client is authorized to work with this resource before
-    # doing anything else.
-    if authorizer and not authorizer(identifier, product.owner):
-        raise NotFound('No such extraction')
 
-    if product.content is None \
-            and product.status is Extraction.Status.IN_PROGRESS:
-        target = url_for('fulltext.task_status', identifier=identifier,
-                         id_type=id_type)
-        return TASK_IN_PROGRESS, status.SEE_OTHER, {'Location': target}
-    return product.to_dict(), status.OK, {}
+def _json(record: Dict[str, Any], chunks: Optional[Iterable[bytes]]) \
+        -> Iterator[bytes]:
+    """
+    Stream a JSON document, with the ``content`` read from ``chunks``.
+
+    The content is decoded and escaped a chunk at a time, so that it is never
+    held in memory as a whole. It is the last member of the document.
+    """
+    record = {key: value for key, value in record.items() if key != 'content'}
+    if chunks is None:
+        yield json.dumps(dict(record, content=None)).encode('utf-8')
+        return
+    head = json.dumps(record)[:-1]     # Without the closing brace.
+    yield f'{head}, "content": "'.encode('utf-8')
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        # Strip the quotes from the escaped string.
+        yield json.dumps(decoder.decode(chunk))[1:-1].encode('utf-8')
+    yield json.dumps(decoder.decode(b'', final=True))[1:-1].encode('utf-8')
+    yield b'"}'
+
+
+def retrieve_file(identifier: str,
+                  id_type: str = SupportedBuckets.ARXIV,
+                  version: Optional[str] = None,
+                  content_fmt: str = SupportedFormats.PLAIN,
+                  authorizer: Optional[Authorizer] = None,
+                  accept_encodings: Container[str] = ()) -> FileResponse:
+    """
+    Handle request for the full-text content of an e-print, as a file.
+
+    As :func:`retrieve`, but rather than loading the content this gets the
+    path to the file that contains it, so that it can be sent as-is. If the
+    storage backend does not keep content in files (see
+    :attr:`.Storage.serves_files`), the content is opened instead.
+
+    Parameters
+    ----------
+    accept_encodings : container
+        Content codings (e.g. ``gzip``) that the client accepts. If the
+        content is stored compressed with one of these, it is sent as it is,
+        with a ``Content-Encoding``; otherwise it is decompressed.
+
+    Returns
+    -------
+    tuple
+        If the content exists, the response data is the path to its file (or
+        the decompressed file, if the client does not accept its encoding),
+        and the headers include its validators and caching directives.
+
+    """
+    product, path = _locate(identifier, id_type, version, content_fmt,
+                            authorizer)
+    storage = store.Storage.current_session()
+    if path is not None:
+        encoding = storage.content_encoding(path)
+        if encoding is not None and encoding not in accept_encodings:
+            encoding = None
+        try:
+            headers = _cache_headers(product, storage.content_stat(path),
+                                     'text/plain',
+                                     versioned=version is not None,
+                                     encoding=encoding)
+        except FileNotFoundError:
+            path = None
+    if path is None:
+        if product.status is Extraction.Status.IN_PROGRESS:
+            target = url_for('fulltext.task_status', identifier=identifier,
+                             id_type=id_type)
+            return TASK_IN_PROGRESS, status.SEE_OTHER, {'Location': target}
+        raise NotFound('No content for this extraction')
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+    elif storage.content_encoding(path) is not None:
+        return storage.open_content(path), status.OK, headers
+    if not storage.serves_files:
+        return storage.open_content(path, decode=False), status.OK, headers
+    return path, status.OK, headers
+
+
+def retrieve_many(identifiers: Any = None, prefix: Optional[str] = None,
+                  version: Optional[str] = None,
+                  content_fmt: str = SupportedFormats.PLAIN,
+                  archive: bool = False) -> StreamingResponse:
+    """
+    Handle a request for the full-text content of many announced e-prints.
+
+    The content is streamed, one e-print at a time, so that the memory used
+    does not depend on the number of e-prints.
+
+    Parameters
+    ----------
+    identifiers : list
+        arXiv identifiers of the e-prints.
+    prefix : str
+        Instead of ``identifiers``, a month (e.g. ``1901``), or an archive and
+        month (e.g. ``hep-th/9901``); all of the e-prints from that month with
+        extractions are included.
+    version : str or None
+        If provided, the desired extraction version.
+    content_fmt : str
+        The desired content format (default: `plain`).
+    archive : bool
+        If ``True``, the content is a tar archive with a file for each
+        extraction. Otherwise it is newline-delimited JSON, with an
+        :class:`.Extraction` (or an ``error``) on each line.
+
+    Returns
+    -------
+    tuple
+        The response data is an iterator of ``bytes``.
+
+    """
+    if content_fmt not in SupportedFormats:
+        raise NotFound('Unsupported format')
+    storage = store.Storage.current_session()
+    if prefix is not None:
+        try:
+            identifiers = storage.list_identifiers(prefix)
+        except ValueError as e:
+            raise BadRequest(str(e)) from e
+        except IOError as e:
+            raise InternalServerError('Could not connect to backend') from e
+    else:
+        max_size = int(get_application_config().get('BATCH_MAX_SIZE', 1000))
+        if not isinstance(identifiers, list) or not identifiers \
+                or not all(isinstance(i, str) for i in identifiers):
+            raise BadRequest('Expected a list of identifiers, or a prefix')
+        if len(identifiers) > max_size:
+            raise BadRequest(f'No more than {max_size} identifiers at once')
+        # Anything else could be a path to another bucket on the volume.
+        invalid = [identifier for identifier in identifiers
+                   if not STANDARD.fullmatch(identifier)
+                   and not OLD_STYLE.fullmatch(identifier)]
+        if invalid:
+            raise BadRequest(f'Not arXiv identifiers: {", ".join(invalid)}')
+
+    def _extractions() -> Iterator[Tuple[str, Optional[Extraction],
+                                         Optional[Iterator[bytes]]]]:
+        for identifier in identifiers:
+            try:
+                yield (identifier, *storage.retrieve_chunks(identifier,
+                                                            version,
+                                                            content_fmt))
+            except store.DoesNotExist:
+                yield identifier, None, None
+
+    if archive:
+        data = _tar(storage, _extractions(), content_fmt)
+        return data, status.OK, {'Content-Type': 'application/x-tar'}
+    data = _ndjson(_extractions())
+    return data, status.OK, {'Content-Type': 'application/x-ndjson'}
+
+
+def _ndjson(extractions: Iterable[Tuple[str, Optional[Extraction],
+                                        Optional[Iterator[bytes]]]]) \
+        -> Iterator[bytes]:
+    for identifier, extraction, chunks in extractions:
+        if extraction is None:
+            record = {'identifier': identifier, 'error': 'No such extraction'}
+            yield json.dumps(record).encode('utf-8') + b'\n'
+            continue
+        yield from _json(extraction.to_dict(), chunks)
+        yield b'\n'
+
+
+def _tar(storage: store.Storage,
+         extractions: Iterable[Tuple[str, Optional[Extraction],
+                                     Optional[Iterator[bytes]]]],
+         content_fmt: str) -> Iterator[bytes]:
+    """
+    Stream a tar archive with a file for each extraction with content.
+
+    The size of each file must be known before its content, so the content of
+    extractions that are stored compressed is decompressed into memory (as
+    ``bytes``); otherwise it is streamed as it is read.
+    """
+    written = 0
+    for identifier, extraction, chunks in extractions:
+        if extraction is None or chunks is None:
+            continue
+        info = tarfile.TarInfo(f'{identifier}.{content_fmt}')
+        path = storage.content_path(identifier, extraction.version,
+                                    content_fmt, extraction.bucket)
+        if storage.content_encoding(path) is None:
+            info.size = storage.content_stat(path).st_size
+        else:
+            content = b''.join(chunks)
+            info.size = len(content)
+            chunks = iter([content])
+        if extraction.ended is not None:
+            info.mtime = int(extraction.ended.timestamp())
+        header = info.tobuf(tarfile.PAX_FORMAT)
+        yield header
+        size = 0
+        for chunk in chunks:
+            # The file may be replaced while we read it, but the size in the
+            # header cannot change.
+            chunk = chunk[:info.size - size]
+            size += len(chunk)
+            yield chunk
+        padding = -info.size % tarfile.BLOCKSIZE
+        yield tarfile.NUL * (info.size - size + padding)
+        written += len(header) + info.size + padding
+    # The end-of-archive marker, and padding to a whole record.
+    end = 2 * tarfile.BLOCKSIZE
+    yield tarfile.NUL * (end + -(written + end) % tarfile.RECORDSIZE)
 
 
 def start_extraction(id_type: str, identifier: str, token: str,
@@ -170,6 +494,108 @@ def start_extraction(id_type: str, identifier: str, token: str,
     return ACCEPTED, status.ACCEPTED, {'Location': target}
 
 
+def start_extractions(identifiers: Any, token: str,
+                      force: bool = False) -> Response:
+    """
+    Handle a request to start extractions for many announced e-prints.
+
+    This does the same checks as :func:`start_extraction` for each identifier,
+    but checks whether the PDFs exist and reads the existing extractions
+    concurrently, and publishes the new tasks together.
+
+    Parameters
+    ----------
+    identifiers : list
+        arXiv identifiers of the e-prints to extract.
+    token : str
+    force : bool
+        If ``True``, start new extractions even if they already exist.
+
+    Returns
+    -------
+    tuple
+        The response data has a ``results`` object with the outcome for each
+        identifier: its ``status`` code, a ``reason``, and (for extractions
+        that are in progress or complete) the ``location`` of their status.
+
+    """
+    config = get_application_config()
+    max_size = int(config.get('BATCH_MAX_SIZE', 1000))
+    if not isinstance(identifiers, list) or not identifiers \
+            or not all(isinstance(i, str) for i in identifiers):
+        raise BadRequest('identifiers must be a list of arXiv identifiers')
+    if len(identifiers) > max_size:
+        raise BadRequest(f'No more than {max_size} identifiers per batch')
+
+    bucket = SupportedBuckets.ARXIV
+    canonical = legacy.CanonicalPDF.current_session()
+    storage = store.Storage.current_session()
+    results: Dict[str, Dict[str, Any]] = {}
+
+    def _exists(identifier: str) -> Optional[bool]:
+        try:
+            return canonical.exists(identifier)
+        except Exception as e:
+            logger.error('Could not check whether %s exists: %s',
+                         identifier, e)
+            return None
+
+    # Drop duplicates and invalid identifiers, keeping the order.
+    candidates = []
+    for identifier in dict.fromkeys(identifiers):
+        if STANDARD.fullmatch(identifier) or OLD_STYLE.fullmatch(identifier):
+            candidates.append(identifier)
+        else:
+            results[identifier] = {'status': status.BAD_REQUEST,
+                                   'reason': 'invalid identifier'}
+
+    workers = int(config.get('BATCH_CONCURRENCY', 8))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        exists = dict(zip(candidates, pool.map(_exists, candidates)))
+    for identifier, found in exists.items():
+        if found is None:
+            results[identifier] = {'status': status.BAD_GATEWAY,
+                                   'reason': 'could not check document'}
+        elif not found:
+            results[identifier] = {'status': status.NOT_FOUND,
+                                   'reason': 'no such document'}
+    candidates = [i for i in candidates if i not in results]
+
+    if not force:
+        try:
+            products = storage.retrieve_many(candidates, bucket=bucket,
+                                             workers=workers)
+        except IOError as e:
+            raise InternalServerError('Could not connect to backend') from e
+        for identifier, product in products.items():
+            if product is not None:
+                data, code, headers = _redirect(product, None)
+                results[identifier] = {'status': code,
+                                       'location': headers['Location'],
+                                       **data}
+        candidates = [i for i in candidates if i not in results]
+
+    if not candidates:
+        return {'results': results}, status.OK, {}
+    try:
+        extract.create_tasks(candidates, bucket, None, token)
+    except extract.TaskCreationFailed as e:
+        logger.error('Could not start extractions: %s', e)
+        created = e.created
+    else:
+        created = candidates
+    for identifier in created:
+        target = url_for('fulltext.task_status', identifier=identifier,
+                         id_type=bucket)
+        results[identifier] = {'status': status.ACCEPTED,
+                               'location': target, **ACCEPTED}
+    for identifier in candidates:
+        if identifier not in results:
+            results[identifier] = {'status': status.INTERNAL_SERVER_ERROR,
+                                   'reason': 'could not start extraction'}
+    return {'results': results}, status.OK, {}
+
+
 def get_task_status(identifier: str, id_type: str = SupportedBuckets.ARXIV,
                     version: Optional[str] = None,
                     authorizer: Optional[Authorizer] = None) -> Response:
@@ -39,6 +39,10 @@ class Extraction(NamedTuple):    # arch: domain
     """Status of the extraction task."""
     content: Optional[str] = None
     """Extraction content."""
+    attempts: int = 0
+    """The number of times that retrieval of the PDF has been attempted."""
+    waited: float = 0.
+    """Seconds spent waiting for the PDF to become available."""
 
     def to_dict(self) -> dict:
         """Generate a dict representation of this placeholder."""
@@ -52,7 +56,9 @@ class Extraction(NamedTuple):    # arch: domain
             'exception': self.exception,
             'status': self.status.value,
             'content': self.content,
-            'bucket': self.bucket
+            'bucket': self.bucket,
+            'attempts': self.attempts,
+            'waited': self.waited
         }
 
     def copy(self, **kwargs: Any) -> 'Extraction':
@@ -1,13 +1,16 @@
 """Provides asynchronous task for fulltext extraction."""
 
 import os
+import hashlib
 import tempfile
-from typing import Tuple, Optional, Dict, Any, IO
+from base64 import b64encode
+from typing import Tuple, Optional, Dict, Any, IO, List, NoReturn
 from datetime import datetime
 from pytz import UTC
 import shutil
 
-from celery import Celery
+from celery import Celery, current_task
+from celery.exceptions import Retry
 from celery.result import AsyncResult
 from celery.signals import after_task_publish
 from flask import Flask, current_app
@@ -30,6 +33,13 @@ class NoSuchTask(RuntimeError):
 class TaskCreationFailed(RuntimeError):
     """An extraction task could not be created."""
 
+    def __init__(self, *args: Any, created: Optional[List[str]] = None) \
+            -> None:
+        """Set the identifiers for which tasks were created anyway."""
+        super(TaskCreationFailed, self).__init__(*args)
+        self.created = created or []
+        """Identifiers whose tasks were published before the failure."""
+
 
 def get_version() -> str:
     """Get the current version of the extractor."""
@@ -83,33 +93,72 @@ def create_task(identifier: str, id_type: str, owner: Optional[str] = None,
 
     """
     logger.debug('Create extraction task with %s, %s', identifier, id_type)
+    return create_tasks([identifier], id_type, owner, token)[0]
+
+
+def create_tasks(identifiers: List[str], id_type: str,
+                 owner: Optional[str] = None,
+                 token: Optional[str] = None) -> List[str]:
+    """
+    Create extraction tasks for many papers at once.
+
+    The tasks are all published over a single connection to the broker,
+    rather than acquiring a connection for each task.
+
+    Parameters
+    ----------
+    identifiers : list
+        Unique identifiers for the papers being extracted.
+    id_type : str
+        Either 'arxiv' or 'submission'.
+
+    Returns
+    -------
+    list
+        The identifiers for the created extraction tasks, in the same order.
+
+    Raises
+    ------
+    :class:`TaskCreationFailed`
+        If a task could not be created. Its ``created`` attribute has the
+        identifiers of the papers whose tasks were published before then.
+
+    """
+    if not identifiers:
+        return []
     version = get_version()
     storage = store.Storage.current_session()
+    task_ids: List[str] = []
     try:
-        _task_id = task_id(identifier, id_type, version)
-        # Create this ahead of time so that the API is immediately consistent,
-        # even if it takes a little while for the extraction task to start
-        # in the worker.
-        storage.store(Extraction(
-            identifier=identifier,
-            version=version,
-            started=datetime.now(UTC),
-            bucket=id_type,
-            owner=owner,
-            task_id=_task_id,
-            status=Extraction.Status.IN_PROGRESS,
-        ))
-        # Dispatch the extraction task.
         celery_app = get_or_create_worker_app(current_app)
-        celery_app.send_task('extract',
-                             (identifier, id_type, version),
-                             {'token': token},
-                             task_id=_task_id)
-        logger.info('extract: started processing as %s', _task_id)
+        with celery_app.producer_or_acquire() as producer:
+            for identifier in identifiers:
+                _task_id = task_id(identifier, id_type, version)
+                # Create this ahead of time so that the API is immediately
+                # consistent, even if it takes a little while for the
+                # extraction task to start in the worker.
+                storage.store(Extraction(
+                    identifier=identifier,
+                    version=version,
+                    started=datetime.now(UTC),
+                    bucket=id_type,
+                    owner=owner,
+                    task_id=_task_id,
+                    status=Extraction.Status.IN_PROGRESS,
+                ))
+                # Dispatch the extraction task.
+                celery_app.send_task('extract',
+                                     (identifier, id_type, version),
+                                     {'token': token},
+                                     task_id=_task_id,
+                                     producer=producer)
+                logger.info('extract: started processing as %s', _task_id)
+                task_ids.append(_task_id)
     except Exception as e:
         logger.debug(e)
-        raise TaskCreationFailed('Failed to create task: %s', e) from e
-    return _task_id
+        raise TaskCreationFailed('Failed to create task: %s', e,
+                                 created=identifiers[:len(task_ids)]) from e
+    return task_ids
 
 
 def get_task(identifier: str, id_type: str, version: str) -> Extraction:
@@ -157,23 +206,131 @@ def get_task(identifier: str, id_type: str, version: str) -> Extraction:
     )
 
 
+def _retrieve_canonical_pdf(canonical: legacy.CanonicalPDF, identifier: str,
+                            chunk_size: int) -> IO[bytes]:
+    """
+    Get a stream of a canonical PDF, from the local cache if possible.
+
+    A cached PDF is revalidated with its ETag, so it is only downloaded again
+    if it has changed. If no cache is configured (``PDF_CACHE_VOLUME``), the
+    PDF is always downloaded.
+    """
+    cache = legacy.PDFCache.current_session()
+    if cache is None:
+        return canonical.retrieve(identifier, chunk_size=chunk_size)
+    cached = cache.get(identifier)
+    try:
+        pdf_content = canonical.retrieve(identifier, chunk_size=chunk_size,
+                                         etag=cached.etag if cached else None)
+    except legacy.NotModified:
+        assert cached is not None
+        logger.info('Using cached PDF for %s (%s)', identifier, cached.etag)
+        return cache.open(cached)
+    etag: Optional[str] = getattr(pdf_content, 'etag', None)
+    if etag is None:    # Cannot be revalidated, so not worth caching.
+        return pdf_content
+    return cache.put(identifier, etag, pdf_content)
+
+
 def _retrieve_pdf(identifier: str, id_type: str, token: Optional[str]) \
-        -> IO[bytes]:
+        -> Tuple[IO[bytes], Optional[str]]:
+    """Get a stream of the PDF content, and its checksum if known."""
     canonical = legacy.CanonicalPDF.current_session()
     previews = preview.PreviewService.current_session()
+    chunk_size = int(get_application_config().get('PDF_CHUNK_SIZE', 1 << 20))
     pdf_content: IO[bytes]
+    checksum: Optional[str] = None
     if id_type == SupportedBuckets.ARXIV:
-        pdf_content = canonical.retrieve(identifier)
+        pdf_content = _retrieve_canonical_pdf(canonical, identifier,
+                                              chunk_size)
     elif id_type == SupportedBuckets.SUBMISSION:
-        pdf_content, _ = previews.get(identifier, token)
+        pdf_content, checksum = previews.get(identifier, token,
+                                             chunk_size=chunk_size)
     else:
         RuntimeError(f'Unsupported identifier: {identifier} ({id_type})')
-    return pdf_content
+    return pdf_content, checksum
+
 
+def _copy_to_file(content: IO[bytes], fd: int, chunk_size: int) \
+        -> Tuple[int, str]:
+    """
+    Stream ``content`` to the file at ``fd``, one chunk at a time.
+
+    Each chunk is read into the same buffer, rather than allocating a new
+    ``bytes`` for every read.
+
+    If the length of the (decoded) content is known in advance, the space for
+    it is allocated up front so that the file is laid out contiguously. The
+    length is not known if the response had a ``Content-Encoding``, so then
+    neither the allocation nor the length check is done.
+
+    Returns
+    -------
+    int
+        Number of bytes written.
+    str
+        URL-safe base64-encoded MD5 hash of the content.
 
-def _store_pdf_in_workdir(identifier: str, id_type: str, content: IO[bytes]) \
-        -> str:
-    workdir: str = get_application_config()['WORKDIR']
+    """
+    expected: Optional[int] = getattr(content, 'content_length', None)
+    if expected and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, expected)
+        except OSError as e:    # E.g. not supported by the filesystem.
+            logger.debug('Could not allocate %i bytes: %s', expected, e)
+    md5 = hashlib.md5()
+    size = 0
+    buffer = bytearray(chunk_size)     # Reused for every chunk.
+    view = memoryview(buffer)
+    with open(fd, 'wb', buffering=0, closefd=False) as f:
+        while True:
+            read = content.readinto(buffer)
+            if not read:
+                break
+            written = 0
+            while written < read:
+                written += f.write(view[written:read])
+            md5.update(view[:read])
+            size += read
+    if expected is not None and size != expected:
+        raise IOError(f'Expected {expected} bytes of PDF, got {size}')
+    elapsed: Optional[float] = getattr(content, 'elapsed', None)
+    if elapsed is not None:
+        logger.debug('Spent %.3f seconds waiting for %i bytes of PDF',
+                     elapsed, size)
+    return size, b64encode(md5.digest(), altchars=b'-_').decode('ascii')
+
+
+def _store_pdf_in_workdir(identifier: str, id_type: str, content: IO[bytes],
+                          checksum: Optional[str] = None) -> str:
+    """
+    Stream a PDF into the working volume, without holding it in memory.
+
+    Parameters
+    ----------
+    identifier : str
+    id_type : str
+    content : io.BytesIO
+        Streaming content of the PDF, read in chunks of ``PDF_CHUNK_SIZE``.
+    checksum : str
+        If provided, the URL-safe base64-encoded MD5 hash that the content
+        must match.
+
+    Returns
+    -------
+    str
+        Path to the PDF in the working volume.
+
+    Raises
+    ------
+    IOError
+        If the content is not of the declared length, or does not match
+        ``checksum``.
+
+    """
+    config = get_application_config()
+    workdir: str = config['WORKDIR']
+    chunk_size = int(config.get('PDF_CHUNK_SIZE', 1 << 20))
     prefix = f'{id_type}-{identifier}'
 
     # The prefix might have a forward slash in it, so we want to make sure that
@@ -184,13 +341,60 @@ def _store_pdf_in_workdir(identifier: str, id_type: str, content: IO[bytes]) \
     _, prefix = os.path.join(workdir, prefix).split(containing, 1)
     prefix = prefix[1:] if prefix.startswith('/') else prefix
 
-    _, pdf_path = tempfile.mkstemp(dir=containing, prefix=prefix, suffix='.pdf')
-    with open(pdf_path, 'wb') as f:
-        f.write(content.read())
+    fd, pdf_path = tempfile.mkstemp(dir=containing, prefix=prefix,
+                                    suffix='.pdf')
+    try:
+        size, actual = _copy_to_file(content, fd, chunk_size)
+        if checksum is not None and actual != checksum.strip('"'):
+            raise IOError(f'PDF checksum {actual} does not match {checksum}')
+    except Exception:
+        os.remove(pdf_path)
+        raise
+    finally:
+        os.close(fd)
+    logger.info('Stored %i bytes of PDF for %s (%s)', size, identifier, actual)
     os.chmod(pdf_path, 0o644)
     return pdf_path
 
 
+def _backoff(attempts: int) -> float:
+    """Get the delay (in seconds) before the next attempt to get a PDF."""
+    config = get_application_config()
+    base = float(config.get('PDF_NOT_READY_BACKOFF', 5))
+    limit = float(config.get('PDF_NOT_READY_BACKOFF_MAX', 600))
+    return min(base * 2 ** (attempts - 1), limit)
+
+
+def _reschedule(storage: store.Storage, extraction: Extraction,
+                exc: legacy.NotReady) -> NoReturn:
+    """
+    Try again to retrieve a PDF that is not ready, after a backoff.
+
+    Rather than waiting in the worker, the extraction task is retried with a
+    countdown, which frees the worker to do other work in the meantime.
+
+    Raises
+    ------
+    :class:`celery.exceptions.Retry`
+        If the task has been rescheduled.
+    IOError
+        If we have run out of attempts (or are not running in a task, and so
+        cannot be rescheduled).
+
+    """
+    max_attempts = int(get_application_config()
+                       .get('PDF_NOT_READY_ATTEMPTS', 8))
+    if not current_task or extraction.attempts >= max_attempts:
+        raise IOError(f'PDF not ready after {extraction.attempts} attempts '
+                      f'({extraction.waited:.0f} seconds)') from exc
+    countdown = _backoff(extraction.attempts)
+    storage.store(extraction.copy(waited=extraction.waited + countdown))
+    logger.info('PDF for %s is not ready; trying again in %.0f seconds '
+                '(attempt %i of %i)', extraction.identifier, countdown,
+                extraction.attempts + 1, max_attempts)
+    raise current_task.retry(exc=exc, countdown=countdown, max_retries=None)
+
+
 def extract(identifier: str, id_type: str, version: str,
             owner: Optional[str] = None,
             token: Optional[str] = None) -> Dict[str, str]:
@@ -202,13 +406,23 @@ def extract(identifier: str, id_type: str, version: str,
     # This assumes we have a metadata record on disk already.
     extraction = storage.retrieve(identifier, version, bucket=id_type,
                                   meta_only=True)
+    extraction = extraction.copy(attempts=extraction.attempts + 1)
 
     pdf_path: Optional[str] = None
     try:
-        pdf_content = _retrieve_pdf(identifier, id_type, token)
-        pdf_path = _store_pdf_in_workdir(identifier, id_type, pdf_content)
+        try:
+            pdf_content, checksum = _retrieve_pdf(identifier, id_type, token)
+        except legacy.NotReady as e:
+            _reschedule(storage, extraction, e)
+        try:
+            pdf_path = _store_pdf_in_workdir(identifier, id_type, pdf_content,
+                                             checksum)
+        finally:
+            pdf_content.close()     # Release the connection.
         content = extractor.do_extraction(pdf_path)
 
+    except Retry:
+        raise
     except Exception as e:
         logger.error('Failed to process %s: %s', identifier, e)
         storage.store(extraction.copy(status=Extraction.Status.FAILED,
@@ -227,6 +441,7 @@ def extract(identifier: str, id_type: str, version: str,
     storage.store(extraction, 'psv')
     result = extraction.to_dict()
     result.pop('content')
+    result['image'] = extractor.do_extraction.image_digest
     return result
 
 
@@ -50,6 +50,7 @@ def create_web_app(for_worker: bool = False) -> Flask:
     app.register_blueprint(routes.blueprint)
     store.Storage.current_session().init_app(app)
     legacy.CanonicalPDF.init_app(app)
+    legacy.PDFCache.init_app(app)
     preview.PreviewService.init_app(app)
 
     middleware = [auth.middleware.AuthMiddleware]
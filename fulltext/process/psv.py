@@ -10,7 +10,17 @@ This should be replaced by a new fulltext mechanism which provides an
 alternative text extraction method available more broadly than just in docsim.
 """
 import re
-from typing import List, Tuple
+import shutil
+import tempfile
+from itertools import islice
+from typing import List, Pattern, Tuple, Iterable, Iterator, Optional, \
+    Callable, IO
+
+CHUNK_SIZE = 65536
+"""Number of characters to read from a stream at a time."""
+
+BATCH_SIZE = 1024
+"""Number of lines to clean up at a time with :func:`_tidy_lines`."""
 
 
 def normalize_text_psv(txt: str) -> str:
@@ -29,8 +39,64 @@ def normalize_text_psv(txt: str) -> str:
     psv : string
         Normalized text, extracting newlines
     """
-    psv, ref = process_text(txt)
-    return psv.replace('\n', ' ')
+    def chunks() -> Iterator[str]:
+        for start in range(0, len(txt), CHUNK_SIZE):
+            yield txt[start:start + CHUNK_SIZE]
+    return ' '.join(_iter_psv(chunks))
+
+
+def iter_psv(stream: IO[str], max_refs_fraction: float = 0.5) \
+        -> Iterator[str]:
+    """
+    Generate PSV sentences from a text stream, ignoring the references.
+
+    This is the streaming equivalent of :func:`normalize_text_psv`: joining
+    the sentences with spaces gives the same result. Only a chunk of the
+    stream and the current line or sentence are held in memory at a time.
+
+    Finding the references takes a first pass over the stream, so the stream
+    is read twice. A stream that is not seekable is first copied to a
+    temporary file.
+
+    Parameters
+    ----------
+    stream : file-like
+        Text stream, typically the plain text extracted from a PDF.
+    max_refs_fraction : float
+        See :func:`split_on_references`.
+
+    Returns
+    -------
+    iterator
+        Cleaned sentences, in order.
+    """
+    spool: Optional[IO[str]] = None
+    if stream.seekable():
+        start = stream.tell()
+    else:
+        spool = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+        stream, start = spool, 0
+
+    def chunks() -> Iterator[str]:
+        stream.seek(start)
+        return iter(lambda: stream.read(CHUNK_SIZE), '')
+
+    try:
+        yield from _iter_psv(chunks, max_refs_fraction)
+    finally:
+        if spool is not None:
+            spool.close()
+
+
+def _iter_psv(chunks: Callable[[], Iterable[str]],
+              max_refs_fraction: float = 0.5) -> Iterator[str]:
+    """Generate PSV sentences from text that can be read more than once."""
+    ref_start = _find_references(_iter_lines(chunks()), max_refs_fraction)
+    lines: Iterable[str] = _iter_lines(chunks())
+    if ref_start is not None:
+        lines = islice(lines, ref_start)
+    return _iter_tidy_txt_from_pdf(lines)
 
 
 def process_text(txt: str) -> Tuple[str, str]:
@@ -53,7 +119,7 @@ def process_text(txt: str) -> Tuple[str, str]:
     txt = _recover_accents(txt)
 
     # rest of code expects \n terminated lines (^J, ^K, ^L, ^M)
-    lines = [l+'\n' for l in re.split(r'[\x0a-\x0d]+', txt)]
+    lines = [l+'\n' for l in _RE_EOL.split(txt)]
 
     psv, ref = split_on_references(lines)
     psv_composed = '\n'.join(tidy_txt_from_pdf(psv))
@@ -61,6 +127,41 @@ def process_text(txt: str) -> Tuple[str, str]:
     return psv_composed, ref_composed
 
 
+_RE_EOL = re.compile(r'[\x0a-\x0d]+')
+
+# Characters after which we cannot safely cut the raw text: line breaks, and
+# anything that :func:`_recover_accents` might remove together with what
+# follows it (note that ``|`` is part of its character classes).
+_UNSAFE_CUT = '\x0a\x0b\x0c\x0d\xa8\xb4\xb8\xb0\x5e\x60\x7e|'
+
+
+def _iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    r"""
+    Split raw text into ``\n``-terminated lines, recovering accents.
+
+    Gives the same lines as :func:`process_text`, but holds only the current
+    chunk and line in memory. Each chunk is cut after its last character that
+    is neither a line break nor something that :func:`_recover_accents` might
+    join with the next character, so that no substitution or line break spans
+    a cut; the remainder is carried over to the next chunk.
+    """
+    raw = ''        # Text that is not yet safe to process.
+    partial = ''    # Start of a line that continues in the next chunk.
+    for chunk in chunks:
+        raw += chunk
+        cut = len(raw)
+        while cut > 0 and raw[cut - 1] in _UNSAFE_CUT:
+            cut -= 1
+        if cut == 0:
+            continue
+        *lines, partial = _RE_EOL.split(partial + _recover_accents(raw[:cut]))
+        raw = raw[cut:]
+        for line in lines:
+            yield line + '\n'
+    for line in _RE_EOL.split(partial + _recover_accents(raw)):
+        yield line + '\n'
+
+
 def tidy_txt_from_pdf(lines: List[str]) -> List[str]:
     """
     Clean up a text extracted from a PDF.
@@ -78,55 +179,153 @@ def tidy_txt_from_pdf(lines: List[str]) -> List[str]:
     lines : list of strings
         Cleaned group of strings
     """
-    lines = _remove_Keyword(lines)
-    lines = _remove_WhiteSpace(lines)
-    lines = _remove_BadEOL(lines)
+    return list(_iter_tidy_txt_from_pdf(lines))
+
+
+def _iter_tidy_txt_from_pdf(lines: Iterable[str]) -> Iterator[str]:
+    """Generate the cleaned sentences for :func:`tidy_txt_from_pdf`."""
+    lines = _iter_remove_Keyword(lines)
+    lines = _iter_remove_WhiteSpace(lines)
+    lines = _iter_remove_BadEOL(lines)
 
     # Remove the following per sentence
-    for i in range(len(lines)):
-        lines[i] = expandWords(lines[i])
-        lines[i] = _remove_Symbols(lines[i])
-        lines[i] = _remove_Numbers(lines[i])
-        lines[i] = _remove_Abbrev(lines[i])
-        lines[i] = _remove_SingleAlphabet(lines[i])
-        lines[i] = _remove_ExtraSpaces(lines[i])
+    lines = _iter_tidy_lines(lines)
+
+    lines = _iter_remove_WhiteSpace(lines)
+    lines = _iter_remove_BadEOL(lines)
+
+    lines = _iter_split_sentence(lines)
+    return _iter_clean_sentence(lines)
+
+
+# Whitespace other than a newline. The batched rules below use this in place of
+# ``\s``, so that no rule can match across the boundary between two lines.
+_WS = r'[^\S\n]'
+
+_LINE_RULES: List[Tuple[Pattern, str]] = [
+    # expandWords
+    (re.compile(rf'Fig[s]?[\.]?{_WS}', re.IGNORECASE), 'Figure '),
+    (re.compile(rf'Eq[s]?[\.]?{_WS}', re.IGNORECASE), 'Equation '),
+    (re.compile(rf'Sect[s]?[\.]?{_WS}', re.IGNORECASE), 'Section '),
+    (re.compile(rf'Ref[s]?[\.]?{_WS}', re.IGNORECASE), 'Reference '),
+    (re.compile(r'Prof\.', re.IGNORECASE), 'Prof'),
+    (re.compile(r'Dr\.', re.IGNORECASE), 'Dr'),
+    # _remove_Symbols
+    (re.compile(r'[^\.\w \n]'), ' '),
+    (re.compile(r'\_'), ' '),
+    # _remove_Numbers
+    (re.compile(r'\d+[\.]?\d+/'), ' '),
+    (re.compile(r'\d'), ' '),
+    # _remove_Abbrev
+    (re.compile(rf'{_WS}\w\.\w\.\w\.{_WS}'), ' '),
+    (re.compile(rf'{_WS}\w\.\w\.{_WS}'), ' '),
+    (re.compile(rf'{_WS}\w\.{_WS}'), ' '),
+    # _remove_SingleAlphabet
+    (re.compile(rf'{_WS}[a-zA-Z]{_WS}'), ' '),
+    (re.compile(rf'{_WS}[a-zA-Z]{_WS}'), ' '),
+    (re.compile(rf'{_WS}[a-zA-Z]\.'), '.'),
+    # _remove_ExtraSpaces
+    # Runs of whitespace become a single space; a lone space is left alone.
+    (re.compile(rf'{_WS}{{2,}}|[^\S\n ]'), ' '),
+    (re.compile(rf'^{_WS}+', re.MULTILINE), ''),
+]
+"""
+Per-line cleanup rules, applied in order by :func:`_tidy_lines`.
 
-    lines = _remove_WhiteSpace(lines)
-    lines = _remove_BadEOL(lines)
+These are equivalent to applying :func:`expandWords`,
+:func:`_remove_Symbols`, :func:`_remove_Numbers`, :func:`_remove_Abbrev`,
+:func:`_remove_SingleAlphabet` and :func:`_remove_ExtraSpaces` to each line in
+turn, for lines that do not contain newlines.
+"""
 
-    lines = _split_sentence(lines)
-    lines = _clean_sentence(lines)
 
-    return lines
+def _tidy_lines(lines: List[str]) -> List[str]:
+    """
+    Apply the per-line cleanup rules to all of the lines at once.
+
+    The lines are joined into a single buffer, so that each rule is a single
+    pass over the document rather than one call per line. None of the rules
+    match (or produce) a newline, so the buffer splits back into the same
+    number of lines. Lines must not contain newlines themselves; this is taken
+    care of by :func:`_remove_WhiteSpace`.
+    """
+    if not lines:
+        return []
+    buffer = '\n'.join(lines)
+    for pattern, replacement in _LINE_RULES:
+        buffer = pattern.sub(replacement, buffer)
+    return buffer.split('\n')
+
+
+def _iter_tidy_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Apply :func:`_tidy_lines` to batches of :const:`BATCH_SIZE` lines."""
+    lines = iter(lines)
+    while True:
+        batch = list(islice(lines, BATCH_SIZE))
+        if not batch:
+            return
+        yield from _tidy_lines(batch)
+
+
+def _tidy_line(line: str) -> str:
+    """Apply the per-line cleanup functions to a single line."""
+    line = expandWords(line)
+    line = _remove_Symbols(line)
+    line = _remove_Numbers(line)
+    line = _remove_Abbrev(line)
+    line = _remove_SingleAlphabet(line)
+    line = _remove_ExtraSpaces(line)
+    return line
 
 
 def _remove_WhiteSpace(lines: List[str]) -> List[str]:
     """Change white spaces, including eols, to spaces."""
-    out = []
+    return list(_iter_remove_WhiteSpace(lines))
+
+
+def _iter_remove_WhiteSpace(lines: Iterable[str]) -> Iterator[str]:
     for line in lines:
-        out.append(re.subn(r'[\n\r\f\t]', ' ', line)[0])
-    return out
+        yield line.replace('\n', ' ').replace('\r', ' ').replace('\f', ' ') \
+            .replace('\t', ' ')
+
+
+_RE_HYPHEN_EOL = re.compile(r'- $')
+_RE_LOWER_START = re.compile(r'^[a-z]')
+_RE_PERIOD_EOL = re.compile(r'\. $')
 
 
 def _remove_BadEOL(lines: List[str]) -> List[str]:
     """Remove eols in the middle of sentence."""
-    out = ['']
+    return list(_iter_remove_BadEOL(lines))
+
+
+def _iter_remove_BadEOL(lines: Iterable[str]) -> Iterator[str]:
+    current = ''
     prevline = ''
 
     for line in lines:
-        line = re.sub(r'- $', '', line)
+        line = _RE_HYPHEN_EOL.sub('', line)
 
-        if re.match(r'^[a-z]', line) and not re.match(r'\. $', prevline):
-            out.append(out.pop() + line)
+        if _RE_LOWER_START.match(line) \
+                and not _RE_PERIOD_EOL.match(prevline):
+            current += line
         else:
-            out.append(line)
+            yield current
+            current = line
         prevline = line
-    return out
+    yield current
+
+
+_RE_DIGITS = re.compile(r'^\d+$')
+_RE_AFFILIATION = re.compile(r'university|institute', flags=re.IGNORECASE)
 
 
 def _remove_Keyword(lines: List[str]) -> List[str]:
     """Remove sentences with the following keywords."""
-    out = []
+    return list(_iter_remove_Keyword(lines))
+
+
+def _iter_remove_Keyword(lines: Iterable[str]) -> Iterator[str]:
     prevline = ''
     saveline = ''
 
@@ -140,12 +339,10 @@ def _remove_Keyword(lines: List[str]) -> List[str]:
             continue
         if 'was prepared with the aas' in line:
             continue
-        if (re.match(r'^\d+$', prevline) and
-                re.match(r'university|institute', line, flags=re.IGNORECASE)):
+        if _RE_DIGITS.match(prevline) and _RE_AFFILIATION.match(line):
             continue
 
-        out.append(line)
-    return out
+        yield line
 
 
 def expandWords(line: str) -> str:
@@ -208,36 +405,45 @@ def _remove_ExtraSpaces(line: str) -> str:
     return line
 
 
+_RE_SENTENCE_END = re.compile(r'\.\s')
+
+
 def _split_sentence(lines: List[str]) -> List[str]:
     """Split sentences using the ". " as the delimiter."""
-    out: List[str] = []
+    return list(_iter_split_sentence(lines))
+
+
+def _iter_split_sentence(lines: Iterable[str]) -> Iterator[str]:
     for line in lines:
-        out.extend(re.split(r'\.\s', line))
-    return out
+        yield from _RE_SENTENCE_END.split(line)
+
+
+_RE_WORD = re.compile(r'\w')
+_RE_NON_WORD = re.compile(r'\W')
 
 
 def _clean_sentence(lines: List[str]) -> List[str]:
     """Remove non-alphabet from the sentences. Convert to lower-case."""
-    out: List[str] = []
+    return list(_iter_clean_sentence(lines))
+
+
+def _iter_clean_sentence(lines: Iterable[str]) -> Iterator[str]:
     for line in lines:
         # continue if the line does not have any words
-        if not re.match(r'\w', line):
+        if not _RE_WORD.match(line):
             continue
 
-        # replace all non-alphabet to space
-        line = re.subn(r'\W', ' ', line)[0]
-        line = _remove_ExtraSpaces(line)
-
-        # remove all space in the beginning and end of the sentence
-        line = re.sub(r'^\s+', '', line)
-        line = re.sub(r'\s+$', '', line)
+        # replace all non-alphabet to space, then collapse extra spaces and
+        # remove all space in the beginning and end of the sentence. Since
+        # every whitespace character is also a non-word character, only plain
+        # spaces are left for ``split()`` to deal with.
+        line = ' '.join(_RE_NON_WORD.sub(' ', line).split())
 
         # Remove "sentences" that has less than or equal to 3 characters
         if len(line) <= 3:
             continue
 
-        out.append(line.lower())
-    return out
+        yield line.lower()
 
 
 def split_on_references(lines: List[str], max_refs_fraction: float = 0.5) \
@@ -248,18 +454,31 @@ def split_on_references(lines: List[str], max_refs_fraction: float = 0.5) \
     Does this by looking for the last occurrence of the word "Reference" or
     "Bibliography".
     """
-    regex_refsection = re.compile(
-        r'^[^a-zA-Z]*(Reference[s]?|Bibliography)[\W]*$', flags=re.IGNORECASE
-    )
+    ref_start = _find_references(lines, max_refs_fraction)
+    if ref_start is None:
+        return list(lines), []
+    return lines[:ref_start], lines[ref_start:]
+
+
+_RE_REFSECTION = re.compile(
+    r'^[^a-zA-Z]*(Reference[s]?|Bibliography)[\W]*$', flags=re.IGNORECASE
+)
+
+
+def _find_references(lines: Iterable[str], max_refs_fraction: float = 0.5) \
+        -> Optional[int]:
+    """
+    Find the index of the first line of the references, if any.
 
-    psv: List[str] = []
-    ref: List[str] = []
+    This only needs a single pass over ``lines``, so that they can be
+    streamed. See :func:`split_on_references`.
+    """
     line_num = 0
     last_refs = 0
 
     for line in lines:
         line_num += 1
-        if regex_refsection.match(line):
+        if _RE_REFSECTION.match(line):
             last_refs = line_num
 
     if line_num:
@@ -272,14 +491,9 @@ def split_on_references(lines: List[str], max_refs_fraction: float = 0.5) \
             )
             last_refs = line_num + 1
 
-    line_num = 0
-
-    for line_num, line in enumerate(lines):
-        if last_refs > 0 and line_num >= last_refs-1:
-            ref.append(line)
-        else:
-            psv.append(line)
-    return psv, ref
+    if last_refs > 0 and last_refs - 1 < line_num:
+        return last_refs - 1
+    return None
 
 
 def _recover_accents(txt: str) -> str:
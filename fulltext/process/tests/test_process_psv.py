@@ -1,8 +1,18 @@
 """Tests for :mod:`fulltext.process.psv`."""
 
-from unittest import TestCase
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase, mock, skipIf
 from .. import psv
 
+PDFS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                    '..', '..', '..', 'extractor', 'tests', 'pdfs')
+PDFTOTEXT = shutil.which('pdftotext')
+PDF2TXT = shutil.which('pdf2txt.py')
+
 PAULI = """
 **Pauli Virtanen** is SciPy's Benevolent Dictator For Life (BDFL).  He says:
 
@@ -163,3 +173,125 @@ class TestConvertToPSVUnits(TestCase):
         for _ in range(5):
             result = psv._remove_WhiteSpace(result)
             self.assertEqual(expected, result)
+
+
+class NonSeekableStream(io.StringIO):
+    """A text stream that cannot be rewound, e.g. a pipe."""
+
+    def seekable(self):
+        """Indicate that this is a non-seekable stream."""
+        return False
+
+
+class TestStreamingPSV(TestCase):
+    """We have raw plain text extracted from a PDF, as a stream."""
+
+    TEXT = (
+        "Introduction\r\n\r\nWe show that the na\xa8\nive approach fails"
+        " (see Fig. 2).\nIt is cru-\ncial that the fa\xe7ade is ~\n"
+        "intact; see the U.S.A. office.\x0c\nResults\nMost results are"
+        " fine.\nReferences\n[1] A. Author, Some paper, 2001.\n"
+    )
+
+    def expected(self, txt):
+        """Generate the PSV for ``txt`` with the list-based pipeline."""
+        psv_lines, _ = psv.process_text(txt)
+        return psv_lines.replace('\n', ' ')
+
+    def test_iter_psv(self):
+        """Sentences are generated from a text stream."""
+        sentences = list(psv.iter_psv(io.StringIO(PAULI)))
+        self.assertEqual(' '.join(sentences), self.expected(PAULI))
+        self.assertEqual(sentences[1], 'he says')
+
+    def test_small_chunks(self):
+        """Chunk boundaries do not affect the result."""
+        expected = self.expected(self.TEXT)
+        for chunk_size in range(1, 8):
+            with mock.patch.object(psv, 'CHUNK_SIZE', chunk_size):
+                stream = io.StringIO(self.TEXT)
+                self.assertEqual(' '.join(psv.iter_psv(stream)), expected)
+                self.assertEqual(psv.normalize_text_psv(self.TEXT), expected)
+
+    def test_references_are_excluded(self):
+        """The reference section is not included."""
+        result = ' '.join(psv.iter_psv(io.StringIO(self.TEXT)))
+        self.assertIn('most results are fine', result)
+        self.assertNotIn('some paper', result)
+
+    def test_non_seekable_stream(self):
+        """The stream can only be read once."""
+        with mock.patch.object(psv, 'CHUNK_SIZE', 5):
+            stream = NonSeekableStream(self.TEXT)
+            self.assertEqual(' '.join(psv.iter_psv(stream)),
+                             self.expected(self.TEXT))
+
+    def test_empty_stream(self):
+        """There is no text at all."""
+        self.assertEqual(list(psv.iter_psv(io.StringIO(''))), [])
+
+
+def tidy_lines_one_by_one(lines):
+    """Apply the per-line cleanup functions individually, as a reference."""
+    return [psv._tidy_line(line) for line in lines]
+
+
+class TestBatchedTidy(TestCase):
+    """The batched cleanup rules must agree with the per-line functions."""
+
+    def test_tidy_lines(self):
+        """Lines with abbreviations, numbers, symbols and odd whitespace."""
+        lines = [
+            "See Fig. 2 and Eqs. 3-4 in Sect. 5 (Refs. 6, 7).",
+            "Prof. Dr. A. B. Smith of the U.S.A. and the U.K. a b c",
+            "  \x0b\x1c leading and\xa0\u2003 trailing whitespace \x1f ",
+            "",
+            "x",
+            " y.",
+            "snake_case 1.5/2 10/20 é ü 42nd",
+        ]
+        self.assertEqual(psv._tidy_lines(lines),
+                         tidy_lines_one_by_one(lines))
+
+    def test_no_lines(self):
+        """There is nothing to tidy."""
+        self.assertEqual(psv._tidy_lines([]), [])
+
+    def test_to_psv(self):
+        """The batched pipeline produces the same PSV as the reference."""
+        expected = psv.normalize_text_psv(PAULI)
+        with mock.patch.object(psv, '_tidy_lines', tidy_lines_one_by_one):
+            self.assertEqual(psv.normalize_text_psv(PAULI), expected)
+
+
+@skipIf(PDFTOTEXT is None and PDF2TXT is None, 'No text extractor available')
+class TestBatchedTidyConformance(TestCase):
+    """The batched pipeline gives byte-identical PSV for our sample PDFs."""
+
+    def extract(self, filename):
+        """Extract raw text from one of the sample PDFs."""
+        pdf_path = os.path.join(PDFS, filename)
+        _, txt_path = tempfile.mkstemp(suffix='.txt')
+        try:
+            if PDFTOTEXT is not None:
+                cmd = [PDFTOTEXT, pdf_path, txt_path]
+            else:
+                cmd = [PDF2TXT, '-o', txt_path, pdf_path]
+            subprocess.run(cmd, check=True, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE)
+            with open(txt_path, encoding='utf-8') as f:
+                return f.read()
+        finally:
+            os.remove(txt_path)
+
+    def test_sample_pdfs(self):
+        """Compare against per-line cleanup for each sample PDF."""
+        for filename in sorted(os.listdir(PDFS)):
+            with self.subTest(pdf=filename):
+                txt = self.extract(filename)
+                result = psv.normalize_text_psv(txt)
+                with mock.patch.object(psv, '_tidy_lines',
+                                       tidy_lines_one_by_one):
+                    expected = psv.normalize_text_psv(txt)
+                self.assertEqual(result.encode('utf-8'),
+                                 expected.encode('utf-8'))
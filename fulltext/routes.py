@@ -1,8 +1,10 @@
 """Provides the blueprint for the fulltext API."""
 
 from typing import Optional, Callable, Any, List
-from flask import request, Blueprint, Response, make_response
+from flask import request, Blueprint, Response, make_response, \
+    stream_with_context, send_file
 from werkzeug.exceptions import NotAcceptable, BadRequest, NotFound
+from werkzeug.http import is_resource_modified, parse_date, unquote_etag
 from flask.json import jsonify
 from arxiv import status
 from arxiv.users.domain import Session, Scope
@@ -62,6 +64,13 @@ def ok() -> Response:
     return response
 
 
+@blueprint.route('/status/connections')
+def connections() -> Response:
+    """Provide metrics about the reuse of upstream connections."""
+    data, code, headers = controllers.connection_stats()
+    response: Response = make_response(jsonify(data), code, headers)
+    return response
+
 
 @blueprint.route(ARXIV_PREFIX, methods=['POST'])
 @blueprint.route(SUBMISSION_PREFIX, methods=['POST'])
@@ -84,6 +93,51 @@ def start_extraction(id_type: str, identifier: str) -> Response:
     return response
 
 
+@blueprint.route('/arxiv/batch', methods=['POST'])
+@scoped(scopes.CREATE_FULLTEXT)
+def start_extractions() -> Response:
+    """Handle requests for fulltext extraction of many e-prints."""
+    payload: Optional[dict] = request.get_json()
+    if payload is None:
+        raise BadRequest('Expected a JSON payload')
+    force: bool = payload.get('force', False)
+    token = request.environ['token']
+    data, code, headers = \
+        controllers.start_extractions(payload.get('identifiers'), token,
+                                      force=force)
+    response: Response = make_response(jsonify(data), code, headers)
+    return response
+
+
+@blueprint.route('/arxiv/bulk', methods=['GET', 'POST'])
+@scoped(scopes.READ_FULLTEXT)
+def retrieve_many() -> Response:
+    """
+    Stream the full-text content of many arXiv papers.
+
+    Takes either a list of ``identifiers`` or a ``prefix`` (a month, or an
+    archive and month), and optionally a ``version`` and ``format``; in the
+    JSON payload of a POST, or the query of a GET (with ``id`` for each
+    identifier).
+    """
+    if request.method == 'POST':
+        params: dict = request.get_json() or {}
+        identifiers = params.get('identifiers')
+    else:
+        params = request.args
+        identifiers = request.args.getlist('id') or None
+    archive = best_match(['application/x-ndjson', 'application/x-tar'],
+                         'application/x-ndjson') == 'application/x-tar'
+    data, code, headers = controllers.retrieve_many(
+        identifiers,
+        prefix=params.get('prefix'),
+        version=params.get('version'),
+        content_fmt=params.get('format', SupportedFormats.PLAIN),
+        archive=archive
+    )
+    return Response(stream_with_context(data), status=code, headers=headers)
+
+
 @blueprint.route(ARXIV_PREFIX + '/version/<version>/format/<content_fmt>')
 @blueprint.route(ARXIV_PREFIX + '/version/<version>')
 @blueprint.route(ARXIV_PREFIX + '/format/<content_fmt>')
@@ -106,18 +160,64 @@ def retrieve(id_type: str, identifier: str, version: Optional[str] = None,
     if id_type == SupportedBuckets.SUBMISSION:
         authorizer = make_authorizer(scopes.READ_COMPILE)
 
-    data, code, headers = controllers.retrieve(identifier, id_type, version,
-                                               content_fmt=content_fmt,
-                                               authorizer=authorizer)
     if content_type == 'text/plain':
-        response_data = Response(data['content'], content_type='text/plain')
-    elif content_type == 'application/json':
-        if 'content' in data:
-            data['content'] = data['content']
-        response_data = jsonify(data)
-    else:
+        # Send the file as it is, without decoding and re-encoding it. This
+        # handles conditional and range requests, and uses X-Sendfile if
+        # USE_X_SENDFILE is set.
+        accept_encodings = {value for value, quality
+                            in request.accept_encodings if quality > 0}
+        found, code, headers = controllers.retrieve_file(
+            identifier, id_type, version, content_fmt=content_fmt,
+            authorizer=authorizer, accept_encodings=accept_encodings
+        )
+        if code != status.HTTP_200_OK:  # E.g. the extraction is in progress.
+            redirect: Response = make_response(jsonify(found), code, headers)
+            return redirect
+        # The ETag is checked and set here, rather than by send_file, as its
+        # argument for that differs between versions of Flask.
+        etag, _ = unquote_etag(headers['ETag'])
+        last_modified = parse_date(headers['Last-Modified'])
+        if not is_resource_modified(request.environ, etag=etag,
+                                    last_modified=last_modified):
+            if not isinstance(found, str):
+                found.close()
+            unchanged: Response = make_response(
+                '', status.HTTP_304_NOT_MODIFIED, headers
+            )
+            return unchanged
+        file_response: Response = send_file(
+            found, mimetype='text/plain', conditional=True, add_etags=False,
+            last_modified=last_modified
+        )
+        file_response.set_etag(etag)
+        file_response.headers.pop('Expires', None)  # From cache_timeout.
+        for header in ['Cache-Control', 'Vary', 'Content-Encoding']:
+            if header in headers:
+                file_response.headers[header] = headers[header]
+        return file_response
+
+    if content_type != 'application/json':
         raise NotAcceptable('unsupported content type')
-    response: Response = make_response(response_data, code, headers)
+
+    def is_modified(validators: dict) -> bool:
+        """Check whether the client's copy of the content is out of date."""
+        etag, _ = unquote_etag(validators['ETag'])
+        return is_resource_modified(request.environ, etag=etag,
+                                    last_modified=validators['Last-Modified'])
+
+    # The content is streamed in to the JSON document, rather than loaded.
+    data, code, headers = controllers.retrieve(identifier, id_type, version,
+                                               content_fmt=content_fmt,
+                                               authorizer=authorizer,
+                                               is_modified=is_modified,
+                                               stream=True)
+    if code == status.HTTP_304_NOT_MODIFIED:
+        not_modified: Response = make_response('', code, headers)
+        return not_modified
+    if not isinstance(data, dict):
+        return Response(stream_with_context(data), status=code,
+                        headers=headers, mimetype='application/json')
+    response: Response = make_response(jsonify(data), code, headers)
     return response
 
 
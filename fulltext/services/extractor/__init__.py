@@ -1,3 +1,4 @@
-"""Integration with Docker to perform plain text extraction."""
+"""Integrations that perform plain text extraction."""
 
-from .extractor import Extractor, do_extraction, NoContentError
\ No newline at end of file
+from .extractor import Extractor, LocalExtractor, do_extraction, \
+    NoContentError
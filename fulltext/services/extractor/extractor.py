@@ -1,14 +1,40 @@
-"""Integration with Docker to perform plain text extraction."""
+"""
+Integrations that perform plain text extraction.
+
+There are three extraction backends, selected with the ``EXTRACTOR_BACKEND``
+config parameter:
+
+- ``docker`` (default): :class:`Extractor` runs the extractor image in a new
+  container for each PDF, via the Docker API (e.g. a dind sidecar).
+- ``pool``: :class:`PooledExtractor` keeps a pool of warm extractor
+  containers running in server mode, and hands them PDFs to extract.
+- ``local``: :class:`LocalExtractor` calls the extractor scripts directly, in
+  a pool of subprocesses inside the worker container. This requires the
+  scripts (see ``EXTRACTOR_SCRIPTS``) and their dependencies (``pdf2txt.py``,
+  ``pdftotext``) to be installed in the worker image.
+
+All three are used through :data:`do_extraction`.
+"""
 
 import os
+import re
+import sys
+import json
+import time
+import atexit
 import shutil
+import socket
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Tuple, Optional, Any
+from typing import Tuple, Optional, Any, Dict, Type, List
+from urllib.parse import urlparse
 
 import docker
 from docker import DockerClient
-from docker.errors import ContainerError, APIError
+from docker.errors import ContainerError, APIError, ImageNotFound
 from requests.exceptions import ConnectionError
+from typing_extensions import Protocol
 
 from flask import current_app
 
@@ -16,20 +42,67 @@ from arxiv.base import logging
 
 logger = logging.getLogger(__name__)
 
+SERVER_PORT = 9876
+"""Port on which the extractor listens, when run in server mode."""
+
+PING = 'PING'
+"""Health check request for an extractor in server mode."""
+
+STARTUP_TIMEOUT = 30
+"""Seconds to wait for a new extractor container to start its server."""
+
+LEGACY_OUTPUT = re.compile(r'/pdfs/\S+\.txt')
+"""
+Output of an extractor image older than 0.4.
+
+Those images ignore ``FULLTEXT_OUTPUT``, and write the text to a file on the
+volume, giving only its path.
+"""
+
 
 class NoContentError(RuntimeError):
     """No content was extracted from the PDF."""
 
 
+class IExtractor(Protocol):
+    """An extraction backend."""
+
+    def is_available(self, **kwargs: Any) -> bool:
+        """Check whether the backend is able to perform extractions."""
+        ...
+
+    def __call__(self, filename: str, cleanup: bool = False,
+                 image: Optional[str] = None) -> str:
+        """Extract plain text from the PDF at ``filename``."""
+        ...
+
+    @property
+    def image_digest(self) -> Optional[str]:
+        """Get the ID of the extractor image used in this process, if any."""
+        ...
+
+
 class Extractor:
     """
     Integrates with Docker to perform plain text extraction.
 
-    This class groups together related methods for the sake of clarity. It is
-    completely stateless, and should stay that way unless an explicit decision
-    is made otherwise.
+    The only state is the ID (digest) of the extractor image, which is pinned
+    the first time that the image is used in each worker process. It is only
+    checked again with the Docker API once ``EXTRACTOR_IMAGE_TTL`` seconds have
+    passed, or if the image has gone away. This avoids a round-trip to the
+    registry for every extraction; the image is pulled when the worker starts
+    (see :func:`fulltext.worker.pull_image`), or here if it is missing.
     """
 
+    def __init__(self) -> None:
+        """Initialize with no pinned image."""
+        self._pinned: Optional[Tuple[str, str, float]] = None
+
+    @property
+    def image_digest(self) -> Optional[str]:
+        """Get the ID of the pinned extractor image, if any."""
+        return self._pinned[1] if self._pinned is not None else None
+
     def is_available(self, **kwargs: Any) -> bool:
         """Make sure that we can connect to the Docker API."""
         try:
@@ -50,16 +123,65 @@ class Extractor:
         image_tag = current_app.config['EXTRACTOR_VERSION']
         return f'{image_name}:{image_tag}', image_name, image_tag
 
-    def _pull_image(self, client: Optional[DockerClient] = None) -> None:
-        """Tell the Docker API to pull our extraction image."""
-        if client is None:
-            client = self._new_client()
-        _, name, tag = self.image
-        client.images.pull(name, tag)
+    @property
+    def environment(self) -> Dict[str, str]:
+        """Get the environment for the extractor container."""
+        mode = current_app.config.get('EXTRACTOR_MODE', 'sequential')
+        # The extracted text is written to stdout, rather than to the volume.
+        environment = {'FULLTEXT_MODE': mode, 'FULLTEXT_OUTPUT': 'stdout'}
+        decisions = current_app.config.get('EXTRACTOR_DECISIONS')
+        if decisions:
+            environment['FULLTEXT_DECISIONS'] = decisions
+        chunk = current_app.config.get('EXTRACTOR_PAGES_PER_CHUNK', 0)
+        if chunk:
+            environment['FULLTEXT_PAGES_PER_CHUNK'] = str(chunk)
+        return environment
 
-    def _cleanup(self, outpath: str) -> None:
-        os.remove(outpath.replace('.txt', '.pdf2txt'))
-        os.remove(outpath)    # Cleanup.
+    def _resolve_image(self, client: DockerClient, image: str) -> str:
+        """
+        Get the ID of ``image``, pulling it only if it is not on the host.
+
+        The result is pinned, and reused until ``EXTRACTOR_IMAGE_TTL`` expires.
+        """
+        ttl = float(current_app.config.get('EXTRACTOR_IMAGE_TTL', 3600))
+        now = time.monotonic()
+        if self._pinned is not None:
+            pinned_image, digest, pinned_at = self._pinned
+            if pinned_image == image and now - pinned_at < ttl:
+                return digest
+        try:
+            found = client.images.get(image)
+        except ImageNotFound:
+            logger.info('Extractor image %s not found; pulling', image)
+            client.images.pull(image)
+            found = client.images.get(image)
+        digest = str(found.id)
+        logger.debug('Pinned extractor image %s at %s', image, digest)
+        self._pinned = (image, digest, now)
+        return digest
+
+    def _run(self, client: DockerClient, image: str, name: str,
+             mountdir: str) -> bytes:
+        """Run the extractor image on ``/pdfs/{name}``, and get its stdout."""
+        digest = self._resolve_image(client, image)
+        volumes = {mountdir: {'bind': '/pdfs', 'mode': 'rw'}}
+        output: bytes = client.containers.run(
+            digest, f'/pdfs/{name}', volumes=volumes,
+            environment=self.environment, remove=True
+        )
+        return output
+
+    def _execute(self, image: str, name: str, mountdir: str) -> str:
+        """Run the extractor image, pulling it only if necessary."""
+        client = self._new_client()
+        try:
+            output = self._run(client, image, name, mountdir)
+        except ImageNotFound:
+            # The pinned image was removed from the host; check again.
+            logger.info('Extractor image %s went away', image)
+            self._pinned = None
+            output = self._run(client, image, name, mountdir)
+        return output.decode('utf-8')
 
     def __call__(self, filename: str, cleanup: bool = False,
                  image: Optional[str] = None) -> str:
@@ -73,7 +195,7 @@ class Extractor:
         Returns
         -------
         str
-            Raw XML response from FullText.
+            Extracted plain text content.
 
         """
         logger.info('Attempting text extraction for %s', filename)
@@ -96,37 +218,350 @@ class Extractor:
         if image is None:
             image, _, _ = self.image
 
-        client = self._new_client()
-
         # Get the name of the file so that we know how to refer to it within
         # the container running the extractor.
         # _, name = os.path.split(filename)
         name = filename.split(workdir, 1)[1].strip('/')
-        stub, _ = os.path.splitext(name)
 
-        try:    # Pull and run the extractor image.
-            self._pull_image(client)
-            volumes = {mountdir: {'bind': '/pdfs', 'mode': 'rw'}}
-            client.containers.run(image, f'/pdfs/{name}', volumes=volumes)
+        # The extracted plain text comes back through the container's stdout
+        # (or the server connection), so nothing is written to the volume.
+        try:
+            content = self._execute(image, name, mountdir)
         except (ContainerError, APIError) as e:
             raise RuntimeError('Fulltext failed: %s' % filename) from e
+        if LEGACY_OUTPUT.fullmatch(content.strip()):
+            # Do not store the path as if it were the text, nor leave the
+            # text file (written alongside the PDF) on the volume.
+            textpath = os.path.splitext(filename)[0] + '.txt'
+            if os.path.exists(textpath):
+                os.remove(textpath)
+            raise RuntimeError(f'Extractor {image} is too old: it wrote the '
+                               f'text of {filename} to a file')
+
+        duration = (datetime.now() - start_time).total_seconds() * 1000
+        logger.info('Finished extraction for %s in %s ms', filename, duration)
+
+        if not content:
+            raise NoContentError(f'No content extracted from {filename}')
+        return content
+
+
+class WarmContainer:
+    """
+    An extractor container running ``launch_server.py``.
+
+    Requests are sent over a single, persistent connection; see
+    ``extractor/fulltext/launch_server.py`` for the protocol.
+    """
+
+    def __init__(self, container: Any, host: str, port: int,
+                 timeout: float) -> None:
+        """Connect to the server in ``container``."""
+        self.container = container
+        self.jobs = 0
+        self.maxrss = 0
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._file = self._sock.makefile('rwb')
+
+    def request(self, line: str) -> Dict[str, Any]:
+        """Send a single request, and wait for the response."""
+        self._file.write(line.encode('utf-8') + b'\n')
+        self._file.flush()
+        raw = self._file.readline()
+        if not raw:
+            raise OSError('Extractor server closed the connection')
+        response: Dict[str, Any] = json.loads(raw)
+        self.jobs = response.get('jobs', self.jobs)
+        self.maxrss = response.get('maxrss', self.maxrss)
+        return response
+
+    def is_healthy(self) -> bool:
+        """Check that the server is still responding."""
+        try:
+            return bool(self.request(PING)['ok'])
+        except (OSError, ValueError, KeyError) as e:
+            logger.info('Extractor container is not healthy: %s', e)
+            return False
+
+    def disconnect(self) -> None:
+        """Close the connection to the server."""
+        try:
+            self._file.close()
+            self._sock.close()
+        except OSError:
+            pass
+
+    def stop(self) -> None:
+        """Disconnect, and stop the container."""
+        self.disconnect()
+        try:
+            self.container.stop(timeout=5)
+        except APIError as e:
+            logger.error('Could not stop extractor container: %s', e)
+
+
+class PooledExtractor(Extractor):
+    """
+    Performs plain text extraction in a pool of warm extractor containers.
+
+    Rather than starting a new container for each PDF, this keeps up to
+    ``EXTRACTOR_POOL_SIZE`` extractor containers running in server mode, and
+    hands them the paths of PDFs to extract. Containers are health-checked
+    before each job, and are recycled after ``EXTRACTOR_POOL_MAX_JOBS`` jobs
+    or once they use more than ``EXTRACTOR_POOL_MAX_RSS`` megabytes.
+    """
+
+    def __init__(self) -> None:
+        """Initialize with an empty pool; containers are started on demand."""
+        super(PooledExtractor, self).__init__()
+        self._idle: List[WarmContainer] = []
+        self._pid: Optional[int] = None
+
+    def _start(self, image: str, mountdir: str) -> WarmContainer:
+        """Start a new extractor container in server mode."""
+        client = self._new_client()
+        digest = self._resolve_image(client, image)
+        volumes = {mountdir: {'bind': '/pdfs', 'mode': 'rw'}}
+        container = client.containers.run(
+            digest,
+            entrypoint=['python', '/scripts/launch_server.py'],
+            volumes=volumes,
+            environment=self.environment,
+            ports={f'{SERVER_PORT}/tcp': None},
+            detach=True,
+            auto_remove=True
+        )
+        # The server port is published on a random port of the Docker host.
+        host = urlparse(current_app.config['DOCKER_HOST']).hostname
+        timeout = float(current_app.config.get('EXTRACTOR_POOL_TIMEOUT', 1800))
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            warm: Optional[WarmContainer] = None
+            try:
+                container.reload()
+                port = container.ports[f'{SERVER_PORT}/tcp'][0]['HostPort']
+                warm = WarmContainer(container, host or 'localhost',
+                                     int(port), timeout)
+            except (OSError, KeyError, IndexError, TypeError) as e:
+                logger.debug('Extractor server not ready: %s', e)
+            if warm is not None:
+                if warm.is_healthy():
+                    logger.info('Started extractor container %s',
+                                container.id)
+                    return warm
+                warm.disconnect()
+            if time.monotonic() > deadline:
+                container.stop(timeout=5)
+                raise RuntimeError('Extractor server did not start')
+            time.sleep(0.5)
+
+    def _claim(self) -> None:
+        """Make sure that the pool belongs to the current process."""
+        if self._pid != os.getpid():
+            # Containers (and connections) inherited from a parent process
+            # belong to that process, so start afresh.
+            self._idle = []
+            self._pid = os.getpid()
+            atexit.register(self.close)
 
-        # Grab the extracted plain text content from a .txt file in the working
-        # volume.
-        outpath = os.path.join(workdir, '{}.txt'.format(stub))
-        if not os.path.exists(outpath):
-            raise NoContentError('%s not found, expected output' % outpath)
-        with open(outpath, 'rb') as f:
-            content = f.read().decode('utf-8')
+    def _checkout(self, image: str, mountdir: str) -> WarmContainer:
+        """Get a healthy container from the pool, or start a new one."""
+        self._claim()
+        while self._idle:
+            warm = self._idle.pop()
+            if warm.is_healthy():
+                return warm
+            warm.stop()
+        return self._start(image, mountdir)
 
-        # Cleanup any left-over files.
-        self._cleanup(outpath)
-        duration = (start_time - datetime.now()).microseconds
-        logger.info(f'Finished extraction for %s in %s ms', filename, duration)
+    def _checkin(self, warm: WarmContainer) -> None:
+        """Return a container to the pool, or recycle it."""
+        max_jobs = int(current_app.config.get('EXTRACTOR_POOL_MAX_JOBS', 100))
+        max_rss = int(current_app.config.get('EXTRACTOR_POOL_MAX_RSS', 512))
+        size = int(current_app.config.get('EXTRACTOR_POOL_SIZE', 1))
+        if warm.jobs >= max_jobs or warm.maxrss > max_rss * 1024 \
+                or len(self._idle) >= size:
+            logger.debug('Recycling extractor container after %i jobs',
+                         warm.jobs)
+            warm.stop()
+        else:
+            self._idle.append(warm)
+
+    def warm(self) -> None:
+        """Start containers until the pool is full."""
+        image, _, _ = self.image
+        mountdir = current_app.config['MOUNTDIR']
+        size = int(current_app.config.get('EXTRACTOR_POOL_SIZE', 1))
+        self._claim()
+        while len(self._idle) < size:
+            self._idle.append(self._start(image, mountdir))
+
+    def close(self) -> None:
+        """Stop all of the containers in the pool."""
+        while self._idle:
+            self._idle.pop().stop()
+
+    def _execute(self, image: str, name: str, mountdir: str) -> str:
+        """Hand the PDF to a warm extractor container."""
+        warm = self._checkout(image, mountdir)
+        try:
+            response = warm.request(f'/pdfs/{name}')
+        except (OSError, ValueError) as e:
+            warm.stop()
+            raise RuntimeError(f'Fulltext failed: {name}') from e
+        self._checkin(warm)
+        if not response['ok']:
+            raise RuntimeError(f'Fulltext failed: {name}: {response["error"]}')
+        content: str = response['content']
+        return content
+
+
+_scripts: Dict[str, Any] = {}
+"""Extractor modules loaded in this (sub)process, by location."""
+
+
+def _run_fulltext(scripts: str, filename: str, mode: str) -> str:
+    """
+    Run the extractor scripts on a PDF, in a subprocess of the worker.
+
+    The extractor's main module is also called ``fulltext``, so we load it
+    under a different name to avoid a clash with this package. Its own
+    imports are relative to ``scripts``.
+    """
+    module = _scripts.get(scripts)
+    if module is None:
+        if scripts not in sys.path:
+            sys.path.insert(0, scripts)
+        spec = importlib.util.spec_from_file_location(
+            'fulltext_extractor', os.path.join(scripts, 'fulltext.py')
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)   # type: ignore
+        _scripts[scripts] = module
+    content: str = module.fulltext(filename, mode=mode)    # type: ignore
+    return content
+
+
+class LocalExtractor:
+    """
+    Performs plain text extraction in a pool of local subprocesses.
+
+    This avoids the container start-up for each PDF, and the need for a
+    Docker host. The pool is created on first use in each worker process, and
+    its subprocesses are reused across extractions so that the extractor
+    scripts are only imported once.
+    """
+
+    def __init__(self) -> None:
+        """Initialize with no pool; it is created on first use."""
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def image_digest(self) -> Optional[str]:
+        """Get the digest of the image; ``None``, as no image is used."""
+        return None
+
+    @property
+    def scripts(self) -> str:
+        """Get the path to the extractor scripts."""
+        scripts: str = current_app.config['EXTRACTOR_SCRIPTS']
+        return scripts
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # A pool inherited from a parent process (e.g. when Celery forks its
+        # workers) is not usable, so make sure that it belongs to us.
+        if self._pool is None or self._pid != os.getpid():
+            processes = int(current_app.config.get('EXTRACTOR_PROCESSES', 1))
+            self._pool = ProcessPoolExecutor(max_workers=processes)
+            self._pid = os.getpid()
+        return self._pool
+
+    def is_available(self, **kwargs: Any) -> bool:
+        """Make sure that the extractor scripts and tools are installed."""
+        if not os.path.exists(os.path.join(self.scripts, 'fulltext.py')):
+            logger.error('Extractor scripts not found in %s', self.scripts)
+            return False
+        for tool in ['pdf2txt.py', 'pdftotext']:
+            if shutil.which(tool) is None:
+                logger.error('Extractor tool %s is not installed', tool)
+                return False
+        return True
+
+    def __call__(self, filename: str, cleanup: bool = False,
+                 image: Optional[str] = None) -> str:
+        """
+        Extract fulltext from the PDF at ``filename``.
+
+        Parameters
+        ----------
+        filename : str
+        cleanup : bool
+            Not used; no intermediate files are written.
+        image : str
+            Not used; this backend does not use an extractor image.
+
+        Returns
+        -------
+        str
+            Extracted plain text content.
+
+        """
+        logger.info('Attempting local text extraction for %s', filename)
+        start_time = datetime.now()
+        try:
+            mode = current_app.config.get('EXTRACTOR_MODE', 'sequential')
+            future = self._get_pool().submit(_run_fulltext, self.scripts,
+                                             filename, mode)
+            content = future.result()
+        except Exception as e:
+            raise RuntimeError('Fulltext failed: %s' % filename) from e
+        duration = (datetime.now() - start_time).total_seconds() * 1000
+        logger.info('Finished extraction for %s in %s ms', filename, duration)
 
         if not content:
             raise NoContentError(f'No content extracted from {filename}')
         return content
 
 
-do_extraction = Extractor()
+BACKENDS: Dict[str, Type[IExtractor]] = {
+    'docker': Extractor,
+    'pool': PooledExtractor,
+    'local': LocalExtractor
+}
+"""Extraction backends, by name (see ``EXTRACTOR_BACKEND``)."""
+
+
+class ConfiguredExtractor:
+    """Delegates to the extraction backend selected in the application config."""
+
+    def __init__(self) -> None:
+        """Initialize with no backends; these are created on first use."""
+        self._backends: Dict[str, IExtractor] = {}
+
+    @property
+    def backend(self) -> IExtractor:
+        """Get the configured extraction backend."""
+        name = current_app.config.get('EXTRACTOR_BACKEND', 'docker')
+        if name not in BACKENDS:
+            raise RuntimeError(f'No such extractor backend: {name}')
+        if name not in self._backends:
+            self._backends[name] = BACKENDS[name]()
+        return self._backends[name]
+
+    def is_available(self, **kwargs: Any) -> bool:
+        """Check whether the configured backend is available."""
+        return self.backend.is_available(**kwargs)
+
+    def __call__(self, filename: str, cleanup: bool = False,
+                 image: Optional[str] = None) -> str:
+        """Extract fulltext using the configured backend."""
+        return self.backend(filename, cleanup=cleanup, image=image)
+
+    @property
+    def image_digest(self) -> Optional[str]:
+        """Get the ID of the image used by the configured backend, if any."""
+        return self.backend.image_digest
+
+
+do_extraction = ConfiguredExtractor()
@@ -1,10 +1,13 @@
 """Tests for :mod:`.services.extractor`."""
 
 import os
+import json
 import tempfile
+import threading
+import socketserver
 from unittest import TestCase, mock
 
-from docker.errors import ContainerError, APIError
+from docker.errors import ContainerError, APIError, ImageNotFound
 from flask import Flask
 
 from . import extractor
@@ -25,20 +28,22 @@ class TestExtract(TestCase):
             'DOCKER_HOST': 'tcp://foohost:2345'
         })
         _, self.path = tempfile.mkstemp(dir=self.workdir, suffix='.pdf')
-        self.outpath = self.path.replace('.pdf', '.txt')
-        with open(self.outpath, 'w') as f:
-            f.write('hello world')
-        with open(self.path.replace('.pdf', '.pdf2txt'), 'w') as f:
-            f.write('hello pdf2txt')
 
     @mock.patch(f'{extractor.__name__}.DockerClient')
     def test_extract_successfully(self, mock_DockerClient):
         """Perform a successful extraction."""
         mock_client = mock.MagicMock()
+        mock_client.containers.run.return_value = 'hello wörld'.encode('utf-8')
         mock_DockerClient.return_value = mock_client
 
         with self.app.app_context():
-            self.assertEqual(extractor.do_extraction(self.path), 'hello world')
+            self.assertEqual(extractor.do_extraction(self.path), 'hello wörld')
+
+        _, kwargs = mock_client.containers.run.call_args
+        self.assertEqual(kwargs['environment']['FULLTEXT_OUTPUT'], 'stdout')
+        self.assertEqual(os.listdir(self.workdir),
+                         [os.path.basename(self.path)],
+                         'Nothing else is written to the working volume')
 
     @mock.patch(f'{extractor.__name__}.DockerClient')
     def test_container_error(self, mock_DockerClient):
@@ -72,25 +77,288 @@ class TestExtract(TestCase):
                 extractor.do_extraction(self.path)
 
     @mock.patch(f'{extractor.__name__}.DockerClient')
-    def test_no_output_file(self, mock_DockerClient):
-        """The extractor does not generate an output file."""
-        os.unlink(self.outpath)
+    def test_legacy_output(self, mock_DockerClient):
+        """An old extractor image gives the path of a text file."""
+        name = os.path.basename(self.path).replace('.pdf', '.txt')
+        with open(os.path.join(self.workdir, name), 'w') as f:
+            f.write('hello world')
         mock_client = mock.MagicMock()
+        mock_client.containers.run.return_value = f'/pdfs/{name}'.encode()
         mock_DockerClient.return_value = mock_client
 
         with self.app.app_context():
-            with self.assertRaises(extractor.NoContentError):
+            with self.assertRaises(RuntimeError):
                 extractor.do_extraction(self.path)
+        self.assertEqual(os.listdir(self.workdir),
+                         [os.path.basename(self.path)],
+                         'The text file is removed')
 
     @mock.patch(f'{extractor.__name__}.DockerClient')
-    def test_output_file_is_empty(self, mock_DockerClient):
-        """The extractor generates an empty output file."""
-        with open(self.outpath, 'w') as f:
-            f.write('')
-
+    def test_output_is_empty(self, mock_DockerClient):
+        """The extractor writes nothing to stdout."""
         mock_client = mock.MagicMock()
+        mock_client.containers.run.return_value = b''
         mock_DockerClient.return_value = mock_client
 
         with self.app.app_context():
             with self.assertRaises(extractor.NoContentError):
-                extractor.do_extraction(self.path)
\ No newline at end of file
+                extractor.do_extraction(self.path)
+
+
+class TestImageCache(TestCase):
+    """The extractor image is resolved once per process, and reused."""
+
+    def setUp(self):
+        """Create an app, and a Docker client that knows about our image."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = Flask('foo')
+        self.app.config.update({
+            'WORKDIR': self.workdir,
+            'MOUNTDIR': '/mountdir',
+            'EXTRACTOR_IMAGE': 'arxiv/fooextractor',
+            'EXTRACTOR_VERSION': '5.6.7',
+            'EXTRACTOR_IMAGE_TTL': 3600,
+            'DOCKER_HOST': 'tcp://foohost:2345'
+        })
+        _, self.path = tempfile.mkstemp(dir=self.workdir, suffix='.pdf')
+        self.client = mock.MagicMock()
+        self.client.images.get.return_value = mock.MagicMock(id='sha256:abc')
+        self.client.containers.run.return_value = b'hello world'
+        self.extractor = extractor.Extractor()
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_image_is_pinned(self, mock_DockerClient):
+        """The image is checked once, and run by its ID."""
+        mock_DockerClient.return_value = self.client
+        with self.app.app_context():
+            self.extractor(self.path)
+            self.extractor(self.path)
+        self.assertEqual(self.client.images.get.call_count, 1)
+        self.assertEqual(self.client.images.pull.call_count, 0)
+        self.assertEqual(self.client.containers.run.call_args[0][0],
+                         'sha256:abc')
+        self.assertEqual(
+            self.client.containers.run.call_args[1]['environment'],
+            {'FULLTEXT_MODE': 'sequential', 'FULLTEXT_OUTPUT': 'stdout'}
+        )
+        self.assertEqual(self.extractor.image_digest, 'sha256:abc')
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_ttl_expires(self, mock_DockerClient):
+        """The image is checked again once the TTL has passed."""
+        mock_DockerClient.return_value = self.client
+        self.app.config['EXTRACTOR_IMAGE_TTL'] = 0
+        with self.app.app_context():
+            self.extractor(self.path)
+            self.extractor(self.path)
+        self.assertEqual(self.client.images.get.call_count, 2)
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_image_is_missing(self, mock_DockerClient):
+        """The image is not on the Docker host, so it is pulled."""
+        mock_DockerClient.return_value = self.client
+        self.client.images.get.side_effect = [
+            ImageNotFound('nope'),
+            mock.MagicMock(id='sha256:def')
+        ]
+        with self.app.app_context():
+            self.assertEqual(self.extractor(self.path), 'hello world')
+        self.client.images.pull.assert_called_once_with(
+            'arxiv/fooextractor:5.6.7'
+        )
+        self.assertEqual(self.extractor.image_digest, 'sha256:def')
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_pinned_image_goes_away(self, mock_DockerClient):
+        """The pinned image was removed, so it is checked again."""
+        mock_DockerClient.return_value = self.client
+        with self.app.app_context():
+            self.extractor(self.path)
+            self.client.containers.run.side_effect = [
+                ImageNotFound('nope'),
+                b'hello world'
+            ]
+            self.assertEqual(self.extractor(self.path), 'hello world')
+        self.assertEqual(self.client.images.get.call_count, 2)
+        self.assertEqual(self.client.containers.run.call_count, 3)
+
+
+class FakeExtractorServer(socketserver.ThreadingTCPServer):
+    """Speaks the extractor's server-mode protocol, on a random port."""
+
+    daemon_threads = True
+
+    def __init__(self, error=None):
+        """Respond with some content, or with ``error``."""
+        self.error = error
+        self.jobs = 0
+        super(FakeExtractorServer, self).__init__(('localhost', 0),
+                                                  self.Handler)
+
+    class Handler(socketserver.StreamRequestHandler):
+        """Handle one connection."""
+
+        def handle(self):
+            """Respond to each request line."""
+            server = self.server
+            for raw in self.rfile:
+                line = raw.decode('utf-8').strip()
+                response = {'ok': True}
+                if line != 'PING':
+                    server.jobs += 1
+                    response['content'] = 'hello world'
+                    if server.error:
+                        response = {'ok': False, 'error': server.error}
+                response.update({'jobs': server.jobs, 'maxrss': 1024})
+                self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class TestPooledExtract(TestCase):
+    """The pool backend is configured."""
+
+    def setUp(self):
+        """Create an app, and a Docker client that starts fake servers."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = Flask('foo')
+        self.app.config.update({
+            'WORKDIR': self.workdir,
+            'MOUNTDIR': '/mountdir',
+            'EXTRACTOR_BACKEND': 'pool',
+            'EXTRACTOR_IMAGE': 'arxiv/fooextractor',
+            'EXTRACTOR_VERSION': '5.6.7',
+            'EXTRACTOR_POOL_SIZE': 1,
+            'EXTRACTOR_POOL_MAX_JOBS': 100,
+            'EXTRACTOR_POOL_MAX_RSS': 512,
+            'DOCKER_HOST': 'tcp://localhost:2345'
+        })
+        _, self.path = tempfile.mkstemp(dir=self.workdir, suffix='.pdf')
+        self.servers = []
+        self.client = mock.MagicMock()
+        self.client.containers.run.side_effect = self.start_container
+        self.extractor = extractor.PooledExtractor()
+
+    def tearDown(self):
+        """Stop the fake servers."""
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def start_container(self, *args, error=None, **kwargs):
+        """Start a fake extractor server, as though in a new container."""
+        server = FakeExtractorServer(error=error)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        container = mock.MagicMock()
+        container.ports = {
+            '9876/tcp': [{'HostPort': str(server.server_address[1])}]
+        }
+        return container
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_container_is_reused(self, mock_DockerClient):
+        """Successive extractions are handled by the same container."""
+        mock_DockerClient.return_value = self.client
+        with self.app.app_context():
+            self.assertEqual(self.extractor(self.path), 'hello world')
+            self.assertEqual(self.extractor(self.path), 'hello world')
+            self.extractor.close()
+        self.assertEqual(self.client.containers.run.call_count, 1)
+        _, kwargs = self.client.containers.run.call_args
+        self.assertTrue(kwargs['detach'])
+        self.assertEqual(kwargs['entrypoint'],
+                         ['python', '/scripts/launch_server.py'])
+        self.assertEqual(self.servers[0].jobs, 2)
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_container_is_recycled(self, mock_DockerClient):
+        """Containers are stopped after the maximum number of jobs."""
+        mock_DockerClient.return_value = self.client
+        self.app.config['EXTRACTOR_POOL_MAX_JOBS'] = 1
+        with self.app.app_context():
+            self.extractor(self.path)
+            self.extractor(self.path)
+        self.assertEqual(self.client.containers.run.call_count, 2)
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_container_uses_too_much_memory(self, mock_DockerClient):
+        """Containers are stopped once they use too much memory."""
+        mock_DockerClient.return_value = self.client
+        self.app.config['EXTRACTOR_POOL_MAX_RSS'] = 0
+        with self.app.app_context():
+            self.extractor(self.path)
+            self.extractor(self.path)
+        self.assertEqual(self.client.containers.run.call_count, 2)
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_unhealthy_container_is_replaced(self, mock_DockerClient):
+        """A container that stops responding is replaced."""
+        mock_DockerClient.return_value = self.client
+        with self.app.app_context():
+            self.extractor(self.path)
+            self.servers[0].shutdown()
+            self.servers[0].server_close()
+            self.extractor._idle[0].disconnect()
+            self.assertEqual(self.extractor(self.path), 'hello world')
+        self.assertEqual(self.client.containers.run.call_count, 2)
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_extraction_fails(self, mock_DockerClient):
+        """The extractor server reports a failure."""
+        mock_DockerClient.return_value = self.client
+        self.client.containers.run.side_effect = \
+            lambda *a, **k: self.start_container(error='nope')
+        with self.app.app_context():
+            with self.assertRaises(RuntimeError):
+                self.extractor(self.path)
+
+
+class TestLocalExtract(TestCase):
+    """The local backend is configured."""
+
+    def setUp(self):
+        """Create an app, and some stand-in extractor scripts."""
+        self.workdir = tempfile.mkdtemp()
+        self.scripts = tempfile.mkdtemp()
+        with open(os.path.join(self.scripts, 'fulltext.py'), 'w') as f:
+            f.write(
+                'def fulltext(pdffile, mode=None):\n'
+                '    with open(pdffile) as f:\n'
+                '        return f.read()\n'
+            )
+        self.app = Flask('foo')
+        self.app.config.update({
+            'EXTRACTOR_BACKEND': 'local',
+            'EXTRACTOR_SCRIPTS': self.scripts,
+            'EXTRACTOR_PROCESSES': 1
+        })
+        _, self.path = tempfile.mkstemp(dir=self.workdir, suffix='.pdf')
+
+    @mock.patch(f'{extractor.__name__}.DockerClient')
+    def test_extract_successfully(self, mock_DockerClient):
+        """Perform a successful extraction, without Docker."""
+        with open(self.path, 'w') as f:
+            f.write('hello world')
+
+        with self.app.app_context():
+            self.assertEqual(extractor.do_extraction(self.path), 'hello world')
+        self.assertEqual(mock_DockerClient.call_count, 0)
+
+    def test_output_is_empty(self):
+        """The extractor returns no content."""
+        with self.app.app_context():
+            with self.assertRaises(extractor.NoContentError):
+                extractor.do_extraction(self.path)
+
+    def test_extractor_fails(self):
+        """The extractor raises an exception."""
+        os.unlink(self.path)
+        with self.app.app_context():
+            with self.assertRaises(RuntimeError):
+                extractor.do_extraction(self.path)
+
+    def test_no_such_backend(self):
+        """An unknown backend is configured."""
+        self.app.config['EXTRACTOR_BACKEND'] = 'foo'
+        with self.app.app_context():
+            with self.assertRaises(RuntimeError):
+                extractor.do_extraction(self.path)
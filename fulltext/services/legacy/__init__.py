@@ -1,3 +1,5 @@
 """Integration with the legacy site to retrieve PDFs of announced e-prints."""
 
-from .legacy import InvalidURL, DoesNotExist, CanonicalPDF
\ No newline at end of file
+from .legacy import InvalidURL, DoesNotExist, NotModified, NotReady, \
+    CanonicalPDF
+from .cache import CachedPDF, PDFCache
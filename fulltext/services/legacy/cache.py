@@ -0,0 +1,230 @@
+"""
+Local, content-addressed cache of canonical PDFs.
+
+Re-extracting a paper (e.g. with ``force=True``, or after a bump of
+``EXTRACTOR_VERSION``) would otherwise download its PDF again. The cache keeps
+recently used PDFs on a local volume, so that they only need to be
+revalidated with a conditional request (``If-None-Match``).
+
+Layout of the cache volume:
+
+- ``/{volume}/objects/{checksum}.pdf`` is the content of a PDF, named after
+  the URL-safe base64-encoded MD5 hash of its content. Identical PDFs (e.g.
+  ``1234.56789`` and ``1234.56789v2``) are only stored once.
+- ``/{volume}/index/{identifier}.json`` maps an identifier on to the ETag
+  with which its PDF was served, and the checksum of its content.
+
+The total size of the objects is bounded by ``PDF_CACHE_SIZE``. The least
+recently used objects are evicted first; the modification time of an object is
+updated whenever it is used. Index entries whose objects have been evicted are
+treated as misses.
+
+Finding what to evict means a scan of all of the objects, so each process
+keeps a running total of their size, and only scans the volume when that
+total goes over the limit, or once every :const:`EVICT_INTERVAL` seconds (so
+that the PDFs cached by other processes are counted).
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from base64 import b64encode
+from urllib.parse import quote
+from typing import IO, Dict, NamedTuple, Optional, Tuple
+
+from flask import Flask
+
+from arxiv.integration.meta import MetaIntegration
+from arxiv.base.globals import get_application_global, get_application_config
+from arxiv.base import logging
+
+logger = logging.getLogger(__name__)
+
+EVICT_INTERVAL = 300.
+"""Maximum time (in seconds) between scans of the cache volume."""
+
+
+class CachedPDF(NamedTuple):
+    """A PDF in the cache."""
+
+    etag: str
+    """ETag with which the PDF was served, used to revalidate it."""
+
+    checksum: str
+    """URL-safe base64-encoded MD5 hash of the PDF content."""
+
+
+class PDFCache(metaclass=MetaIntegration):
+    """Provides a size-bounded, least recently used cache of PDFs."""
+
+    _usage: Dict[str, Tuple[int, float]] = {}
+    """Total size of the objects on each volume, and when it was scanned."""
+    _usage_lock = threading.Lock()
+
+    def __init__(self, volume: str, max_size: int,
+                 chunk_size: int = 1024 * 1024) -> None:
+        """Set the cache volume, and create its directories."""
+        self._volume = volume
+        self._max_size = max_size
+        self._chunk_size = chunk_size
+        os.makedirs(self._objects, exist_ok=True)
+        os.makedirs(self._index, exist_ok=True)
+
+    @property
+    def _objects(self) -> str:
+        return os.path.join(self._volume, 'objects')
+
+    @property
+    def _index(self) -> str:
+        return os.path.join(self._volume, 'index')
+
+    def _object_path(self, checksum: str) -> str:
+        return os.path.join(self._objects, f'{checksum}.pdf')
+
+    def _index_path(self, identifier: str) -> str:
+        # Old-style identifiers have a forward slash in them.
+        return os.path.join(self._index, f'{quote(identifier, safe="")}.json')
+
+    def get(self, identifier: str) -> Optional[CachedPDF]:
+        """Get the cached PDF for ``identifier``, if there is one."""
+        try:
+            with open(self._index_path(identifier)) as f:
+                entry = CachedPDF(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        if not os.path.exists(self._object_path(entry.checksum)):
+            logger.debug('Cached PDF for %s was evicted', identifier)
+            return None
+        return entry
+
+    def open(self, entry: CachedPDF) -> IO[bytes]:
+        """Open a cached PDF, and mark it as recently used."""
+        path = self._object_path(entry.checksum)
+        content = open(path, 'rb')
+        try:
+            os.utime(path)
+        except OSError:     # Evicted in the meantime; we have it open anyway.
+            pass
+        return content
+
+    def put(self, identifier: str, etag: str, content: IO[bytes]) \
+            -> IO[bytes]:
+        """
+        Add a PDF to the cache.
+
+        Parameters
+        ----------
+        identifier : str
+        etag : str
+            ETag with which the PDF was served.
+        content : io.BufferedReader
+            Streaming content of the PDF. This is consumed and closed.
+
+        Returns
+        -------
+        io.BufferedReader
+            The content of the PDF, read from the cache.
+
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self._objects, suffix='.tmp')
+        md5 = hashlib.md5()
+        try:
+            with open(fd, 'wb') as f:
+                while True:
+                    chunk = content.read(self._chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    md5.update(chunk)
+            expected: Optional[int] = getattr(content, 'content_length', None)
+            size = os.path.getsize(tmp_path)
+            if expected is not None and size != expected:
+                raise IOError(f'Expected {expected} bytes of PDF, got {size}')
+            checksum = b64encode(md5.digest(), altchars=b'-_').decode('ascii')
+            added = not os.path.exists(self._object_path(checksum))
+            os.replace(tmp_path, self._object_path(checksum))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        finally:
+            content.close()
+
+        entry = CachedPDF(etag=etag, checksum=checksum)
+        self._write_index(identifier, entry)
+        logger.debug('Cached %i bytes of PDF for %s', size, identifier)
+        cached = self.open(entry)
+        if added:
+            self._count(size)
+        return cached
+
+    def _count(self, size: int) -> None:
+        """Add a new object to the running total, and evict if it is due."""
+        with self._usage_lock:
+            total, scanned = self._usage.get(self._volume, (-1, 0.))
+            if 0 <= total and total + size <= self._max_size \
+                    and time.monotonic() - scanned < EVICT_INTERVAL:
+                self._usage[self._volume] = (total + size, scanned)
+                return
+        self.evict()
+
+    def _write_index(self, identifier: str, entry: CachedPDF) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self._index, suffix='.tmp')
+        with open(fd, 'w') as f:
+            json.dump(entry._asdict(), f)
+        os.replace(tmp_path, self._index_path(identifier))
+
+    def evict(self) -> None:
+        """Remove the least recently used PDFs, until the cache fits."""
+        objects = []
+        total = 0
+        with os.scandir(self._objects) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.pdf'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:     # Evicted by someone else.
+                    continue
+                objects.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(objects):
+            if total <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            logger.debug('Evicted %s from PDF cache', path)
+        with self._usage_lock:
+            self._usage[self._volume] = (total, time.monotonic())
+
+    @classmethod
+    def init_app(cls, app: Flask) -> None:
+        """Set defaults for required configuration parameters."""
+        app.config.setdefault('PDF_CACHE_VOLUME', None)
+        app.config.setdefault('PDF_CACHE_SIZE', 10 * 1024 ** 3)
+
+    @classmethod
+    def create_session(cls) -> Optional['PDFCache']:
+        """Create a new :class:`.PDFCache`, if a cache volume is configured."""
+        config = get_application_config()
+        volume: Optional[str] = config.get('PDF_CACHE_VOLUME')
+        if not volume:
+            return None
+        return cls(volume, int(config.get('PDF_CACHE_SIZE', 10 * 1024 ** 3)),
+                   int(config.get('PDF_CHUNK_SIZE', 1024 * 1024)))
+
+    @classmethod
+    def current_session(cls) -> Optional['PDFCache']:
+        """Get the current :class:`.PDFCache` for this application."""
+        g = get_application_global()
+        if g is None:
+            return cls.create_session()
+        if 'pdf_cache' not in g:
+            g.pdf_cache = cls.create_session()
+        instance: Optional['PDFCache'] = g.pdf_cache
+        return instance
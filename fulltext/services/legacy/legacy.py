@@ -2,15 +2,14 @@
 
 import os
 import tempfile
-import time
-from typing import Any, IO
+from typing import Any, IO, Optional
 
 import requests
 
 from arxiv.base import logging
 from arxiv.integration.api import status, service
 
-from ..util import ReadWrapper
+from ..util import PooledIntegration, ReadWrapper, content_length
 
 
 class InvalidURL(ValueError):
@@ -21,10 +20,18 @@ class DoesNotExist(RuntimeError):
     """A request was made for a non-existant PDF."""
 
 
+class NotModified(RuntimeError):
+    """The PDF has not changed since it was last retrieved."""
+
+
+class NotReady(IOError):
+    """The PDF has not been generated yet; try again later."""
+
+
 logger = logging.getLogger(__name__)
 
 
-class CanonicalPDF(service.HTTPIntegration):
+class CanonicalPDF(PooledIntegration):
     """Provides an interface to get PDFs."""
 
     class Meta:
@@ -43,6 +50,8 @@ class CanonicalPDF(service.HTTPIntegration):
         """
         Determine whether or not a target URL is available (HEAD request).
 
+        The result is cached for ``CANONICAL_HEAD_TTL`` seconds.
+
         Parameters
         ----------
         identifier : str
@@ -53,6 +62,10 @@ class CanonicalPDF(service.HTTPIntegration):
         bool
 
         """
+        return self._cached_head(('exists', identifier),
+                                 lambda: self._exists(identifier))
+
+    def _exists(self, identifier: str) -> bool:
         r = self._session.head(self._path(f'/pdf/{identifier}'),
                                allow_redirects=True)
         if r.status_code == status.OK:
@@ -61,19 +74,28 @@ class CanonicalPDF(service.HTTPIntegration):
             return False
         raise IOError(f'Unexpected response status code: {r.status_code}')
 
-    def retrieve(self, identifier: str, sleep: int = 5) -> IO[bytes]:
+    def retrieve(self, identifier: str, chunk_size: int = 4096,
+                 etag: Optional[str] = None) -> IO[bytes]:
         """
         Retrieve PDFs of published papers from the core arXiv document store.
 
+        The response body is streamed, rather than loaded into memory.
+
         Parameters
         ----------
         identifier : str
             arXiv identifier for which a PDF is required.
+        chunk_size : int
+            Size (in bytes) of the chunks in which the PDF is read.
+        etag : str
+            ETag of a copy of the PDF that we already have. If the PDF has
+            not changed, :class:`NotModified` is raised instead of retrieving
+            it again.
 
         Returns
         -------
-        str
-            Path to (temporary) PDF.
+        :class:`.ReadWrapper`
+            Streaming content of the PDF. Closing it releases the connection.
 
         Raises
         ------
@@ -81,10 +103,19 @@ class CanonicalPDF(service.HTTPIntegration):
             If a disallowed or otherwise invalid URL is passed.
         IOError
             When there is a problem retrieving the resource at ``target``.
+        :class:`NotReady`
+            When the PDF has not been generated yet. This does not wait, so
+            that the caller can decide when to try again.
+        :class:`NotModified`
+            When ``etag`` is passed, and still matches the PDF.
 
         """
         target = self._path(f'/pdf/{identifier}')
-        pdf_response = self._session.get(target)
+        headers = {'If-None-Match': etag} if etag is not None else {}
+        pdf_response = self._session.get(target, stream=True, headers=headers)
+        if pdf_response.status_code == status.NOT_MODIFIED:
+            pdf_response.close()
+            raise NotModified(f'{identifier}: PDF has not changed')
         if pdf_response.status_code == status.NOT_FOUND:
             logger.info('Could not retrieve PDF for %s', identifier)
             raise DoesNotExist('No such resource')
@@ -93,20 +124,13 @@ class CanonicalPDF(service.HTTPIntegration):
                           (identifier, pdf_response.status_code))
 
         # Classic PDF route will return 200 even if PDF is not yet generated.
-        # But at least it will be honest about the Content-Type. If we don't
-        # get a PDF back, we should wait and try again.
+        # But at least it will be honest about the Content-Type.
         if pdf_response.headers['Content-Type'] != 'application/pdf':
-            retries = 5
-            while pdf_response.headers['Content-Type'] != 'application/pdf':
-                if retries < 1:
-                    raise IOError('Could not retrieve PDF; giving up')
-                logger.info('Got HTML instead of PDF; retrying (%i remaining)',
-                            retries)
-                time.sleep(sleep)
-                retries -= 1
-                pdf_response = self._session.get(target)
-                if pdf_response.status_code != status.OK:
-                    raise IOError('%s: unexpected status for PDF: %i' %
-                                  (identifier, pdf_response.status_code))
-
-        return ReadWrapper(pdf_response.iter_content)
+            logger.info('Got HTML instead of PDF for %s', identifier)
+            pdf_response.close()    # Release the connection.
+            raise NotReady(f'{identifier}: PDF is not ready')
+
+        return ReadWrapper(pdf_response.iter_content, chunk_size,
+                           content_length(pdf_response.headers),
+                           on_close=pdf_response.close,
+                           etag=pdf_response.headers.get('ETag'))
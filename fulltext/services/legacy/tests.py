@@ -1,7 +1,10 @@
 """Tests for :mod:`fulltext.services.pdf`."""
 
 from unittest import TestCase, mock
+import io
 import os
+import shutil
+import tempfile
 
 from flask import Flask
 
@@ -9,6 +12,8 @@ from arxiv import status
 from arxiv.integration.api import service
 
 from . import legacy
+from . import cache as cache_module
+from .cache import PDFCache
 
 
 class TestExists(TestCase):
@@ -79,34 +84,43 @@ class TestRetrieve(TestCase):
         self.assertEqual(pdf_content.read(), b'foo')
 
     @mock.patch(f'{service.__name__}.requests.Session')
-    def test_pdf_not_ready(self, session):
-        """A PDF still needs to be rendered."""
-        mock_html_response = mock.MagicMock(
-            status_code=status.HTTP_200_OK,
-            content=b'<html>foo</html>',
-            headers={'Content-Type': 'text/html'}
-        )
-        mock_pdf_response = mock.MagicMock(
+    def test_pdf_content_length(self, session):
+        """The PDF response declares its length."""
+        mock_response = mock.MagicMock(
             status_code=status.HTTP_200_OK,
             iter_content=lambda size: iter([b'foo']),
-            headers={'Content-Type': 'application/pdf'}
-        )
-        mock_get = mock.MagicMock(
-            side_effect=[mock_html_response, mock_pdf_response]
+            headers={'Content-Type': 'application/pdf',
+                     'Content-Length': '3'})
+        session.return_value = mock.MagicMock(
+            get=mock.MagicMock(return_value=mock_response)
         )
-        session.return_value = mock.MagicMock(get=mock_get)
-        document_id = '1234.56789'
-
         with self.app.app_context():
             canonical = legacy.CanonicalPDF.current_session()
-            pdf_content = canonical.retrieve(document_id, sleep=0)
+            pdf_content = canonical.retrieve('1234.56789')
+        self.assertEqual(pdf_content.content_length, 3)
 
+    @mock.patch(f'{service.__name__}.requests.Session')
+    def test_pdf_content_encoding(self, session):
+        """The PDF response is compressed in transit."""
+        mock_response = mock.MagicMock(
+            status_code=status.HTTP_200_OK,
+            iter_content=lambda size: iter([b'foo']),     # Decoded.
+            headers={'Content-Type': 'application/pdf',
+                     'Content-Encoding': 'gzip',
+                     'Content-Length': '2'})
+        session.return_value = mock.MagicMock(
+            get=mock.MagicMock(return_value=mock_response)
+        )
+        with self.app.app_context():
+            canonical = legacy.CanonicalPDF.current_session()
+            pdf_content = canonical.retrieve('1234.56789')
+        self.assertIsNone(pdf_content.content_length,
+                          'Length of the encoded body is not used')
         self.assertEqual(pdf_content.read(), b'foo')
-        self.assertEqual(mock_get.call_count, 2)
 
     @mock.patch(f'{service.__name__}.requests.Session')
-    def test_pdf_never_ready(self, session):
-        """A PDF cannot be rendered."""
+    def test_pdf_not_ready(self, session):
+        """A PDF still needs to be rendered."""
         mock_html_response = mock.MagicMock(
             status_code=status.HTTP_200_OK,
             content=b'<html>foo</html>',
@@ -116,9 +130,10 @@ class TestRetrieve(TestCase):
         session.return_value = mock.MagicMock(get=mock_get)
         with self.app.app_context():
             canonical = legacy.CanonicalPDF.current_session()
-            with self.assertRaises(IOError):
-                canonical.retrieve('1234.56789', sleep=0)
-        self.assertGreater(mock_get.call_count, 2)
+            with self.assertRaises(legacy.NotReady):
+                canonical.retrieve('1234.56789')
+        self.assertEqual(mock_get.call_count, 1, 'Does not wait and retry')
+        self.assertEqual(mock_html_response.close.call_count, 1)
 
     @mock.patch(f'{service.__name__}.requests.Session')
     def test_pdf_does_not_exist(self, session):
@@ -143,3 +158,88 @@ class TestRetrieve(TestCase):
             with self.assertRaises(IOError):
                 canonical = legacy.CanonicalPDF.current_session()
                 canonical.retrieve('1234.56789')
+
+    @mock.patch(f'{service.__name__}.requests.Session')
+    def test_pdf_not_modified(self, session):
+        """The PDF has not changed since we retrieved it."""
+        mock_response = mock.MagicMock(status_code=status.HTTP_304_NOT_MODIFIED)
+        mock_get = mock.MagicMock(return_value=mock_response)
+        session.return_value = mock.MagicMock(get=mock_get)
+        with self.app.app_context():
+            canonical = legacy.CanonicalPDF.current_session()
+            with self.assertRaises(legacy.NotModified):
+                canonical.retrieve('1234.56789', etag='"fooetag"')
+        self.assertEqual(mock_get.call_args[1]['headers'],
+                         {'If-None-Match': '"fooetag"'})
+
+
+class TestPDFCache(TestCase):
+    """Tests for :class:`fulltext.services.legacy.cache.PDFCache`."""
+
+    def setUp(self):
+        """Make a cache volume."""
+        self.volume = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the cache volume."""
+        shutil.rmtree(self.volume)
+
+    def test_put_and_get(self):
+        """A PDF is cached, and can be read back."""
+        cache = PDFCache(self.volume, 1024)
+        self.assertIsNone(cache.get('alg-geom/9204001'))
+        with cache.put('alg-geom/9204001', '"foo"',
+                       io.BytesIO(b'foocontent')) as content:
+            self.assertEqual(content.read(), b'foocontent')
+        entry = cache.get('alg-geom/9204001')
+        self.assertEqual(entry.etag, '"foo"')
+        self.assertEqual(entry.checksum, 'ewrggAHdCT55M1uUfwKLEA==')
+        with cache.open(entry) as content:
+            self.assertEqual(content.read(), b'foocontent')
+
+    def test_content_addressed(self):
+        """Identical PDFs are only stored once."""
+        cache = PDFCache(self.volume, 1024)
+        cache.put('1234.56789', '"foo"', io.BytesIO(b'foocontent')).close()
+        cache.put('1234.56789v1', '"foo"', io.BytesIO(b'foocontent')).close()
+        self.assertEqual(len(os.listdir(os.path.join(self.volume,
+                                                     'objects'))), 1)
+
+    def test_truncated(self):
+        """A PDF that is shorter than its declared length is not cached."""
+        cache = PDFCache(self.volume, 1024)
+        content = io.BytesIO(b'foocontent')
+        content.content_length = 20
+        with self.assertRaises(IOError):
+            cache.put('1234.56789', '"foo"', content)
+        self.assertIsNone(cache.get('1234.56789'))
+        self.assertEqual(os.listdir(os.path.join(self.volume, 'objects')), [])
+
+    def test_least_recently_used_are_evicted(self):
+        """The cache is kept within its maximum size."""
+        cache = PDFCache(self.volume, 25)
+        for i, identifier in enumerate(['1234.00001', '1234.00002']):
+            cache.put(identifier, f'"{i}"', io.BytesIO(b'%i' % i * 10)).close()
+            path = os.path.join(self.volume, 'objects',
+                                f'{cache.get(identifier).checksum}.pdf')
+            os.utime(path, (i, i))
+        cache.open(cache.get('1234.00001')).close()   # Now the most recent.
+        cache.put('1234.00003', '"2"', io.BytesIO(b'2' * 10)).close()
+        self.assertIsNotNone(cache.get('1234.00001'))
+        self.assertIsNone(cache.get('1234.00002'), 'Was least recently used')
+        self.assertIsNotNone(cache.get('1234.00003'))
+
+    def test_scanned_only_when_full(self):
+        """The cache volume is not scanned while the cache fits."""
+        cache = PDFCache(self.volume, 25)
+        cache.put('1234.00001', '"1"', io.BytesIO(b'1' * 10)).close()
+        with mock.patch.object(cache, 'evict') as evict:
+            cache.put('1234.00002', '"2"', io.BytesIO(b'2' * 10)).close()
+            cache.put('1234.00022', '"2"', io.BytesIO(b'2' * 10)).close()
+            evict.assert_not_called()
+            cache.put('1234.00003', '"3"', io.BytesIO(b'3' * 10)).close()
+            evict.assert_called_once_with()
+        with mock.patch.object(cache_module, 'EVICT_INTERVAL', 0), \
+                mock.patch.object(cache, 'evict') as evict:
+            cache.put('1234.00004', '"4"', io.BytesIO(b'4')).close()
+            evict.assert_called_once_with()
@@ -13,7 +13,7 @@ from backports.datetime_fromisoformat import MonkeyPatch
 from arxiv.base import logging
 from arxiv.integration.api import service, exceptions
 
-from ..util import ReadWrapper
+from ..util import PooledIntegration, ReadWrapper, content_length
 
 MonkeyPatch.patch_fromisoformat()
 logger = logging.getLogger(__name__)
@@ -31,7 +31,7 @@ class PreviewMeta(TypedDict):
     checksum: str
 
 
-class PreviewService(service.HTTPIntegration):
+class PreviewService(PooledIntegration):
     """Represents an interface to the submission preview."""
 
     SERVICE = 'preview'
@@ -53,12 +53,23 @@ class PreviewService(service.HTTPIntegration):
         return bool(response.status_code == status.OK)
 
     def get_owner(self, identifier: str, token: str) -> Optional[str]:
-        """Get the owner of a compilation product."""
+        """
+        Get the owner of a compilation product.
+
+        The result is cached for ``PREVIEW_HEAD_TTL`` seconds, separately for
+        each ``token``.
+        """
+        return self._cached_head(('owner', identifier, token),
+                                 lambda: self._get_owner(identifier, token))
+
+    def _get_owner(self, identifier: str, token: str) -> Optional[str]:
         response = self.request('head', f'/{identifier}', token, stream=True)
         owner: Optional[str] = response.headers.get('ARXIV-OWNER', None)
+        response.close()
         return owner
 
-    def get(self, identifier: str, token: str) -> Tuple[IO[bytes], str]:
+    def get(self, identifier: str, token: str, chunk_size: int = 4096) \
+            -> Tuple[IO[bytes], str]:
         """
         Retrieve the content of the PDF preview for a submission.
 
@@ -72,18 +83,25 @@ class PreviewService(service.HTTPIntegration):
             of the source package content.
         token : str
             Authnz token for the request.
+        chunk_size : int
+            Size (in bytes) of the chunks in which the preview is read.
 
         Returns
         -------
-        :class:`io.BytesIO`
-            Streaming content of the preview.
+        :class:`.ReadWrapper`
+            Streaming content of the preview. Closing it releases the
+            connection.
         str
             URL-safe base64-encoded MD5 hash of the preview content.
 
         """
-        response = self.request('get', f'/{identifier}/content', token)
+        response = self.request('get', f'/{identifier}/content', token,
+                                stream=True)
         preview_checksum = str(response.headers['ETag'])
-        return ReadWrapper(response.iter_content), preview_checksum
+        content = ReadWrapper(response.iter_content, chunk_size,
+                              content_length(response.headers),
+                              on_close=response.close)
+        return content, preview_checksum
 
     def does_exist(self, identifier: str, token: str) \
             -> Tuple[bool, Optional[str]]:
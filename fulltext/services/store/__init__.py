@@ -1,3 +1,6 @@
 """Filesystem-based storage for plain text extraction."""
 
-from .store import ConfigurationError, DoesNotExist, StorageFailed, Storage
\ No newline at end of file
+from .store import ConfigurationError, DoesNotExist, StorageFailed, Storage, \
+    PackStorage, StoredExtraction
+from .index import IndexEntry, MetadataIndex
+from .pack import PackFile
@@ -0,0 +1,68 @@
+"""
+Maintain the storage volume.
+
+``index`` (the default) rebuilds the index of latest extractions. With the
+``pack`` backend, ``migrate`` copies extractions from the filesystem layout
+in to the pack, ``compact`` rewrites segments that are mostly dead records,
+and ``reindex`` recovers the pack's index from its segments.
+"""
+
+import argparse
+
+from arxiv.base import logging
+from .store import PackStorage, Storage
+from ...factory import create_web_app
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_index() -> None:
+    """Rebuild the index that is set by ``STORAGE_INDEX``."""
+    app = create_web_app()
+    with app.app_context():
+        indexed = Storage.current_session().rebuild_index()
+    logger.info('Indexed the latest extractions of %i identifiers', indexed)
+
+
+def _pack_storage() -> PackStorage:
+    storage = Storage.current_session()
+    if not isinstance(storage, PackStorage):
+        raise SystemExit('STORAGE_BACKEND is not "pack"')
+    return storage
+
+
+def migrate() -> None:
+    """Copy extractions from the filesystem layout to the pack."""
+    app = create_web_app()
+    with app.app_context():
+        storage = _pack_storage()
+        copied = storage.migrate()
+        indexed = storage.rebuild_index()
+    logger.info('Copied %i files; indexed %i identifiers', copied, indexed)
+
+
+def compact() -> None:
+    """Compact the pack."""
+    app = create_web_app()
+    with app.app_context():
+        reclaimed = _pack_storage().compact()
+    logger.info('Reclaimed %i bytes', reclaimed)
+
+
+def reindex() -> None:
+    """Recover the index of the pack from its segments."""
+    app = create_web_app()
+    with app.app_context():
+        indexed = _pack_storage().reindex()
+    logger.info('Indexed %i records', indexed)
+
+
+COMMANDS = {'index': rebuild_index, 'migrate': migrate, 'compact': compact,
+            'reindex': reindex}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m fulltext.services.store',
+                                     description=__doc__)
+    parser.add_argument('command', nargs='?', default='index',
+                        choices=sorted(COMMANDS))
+    COMMANDS[parser.parse_args().command]()
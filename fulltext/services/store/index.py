@@ -0,0 +1,198 @@
+"""
+Local index of the latest extraction for each e-print or submission.
+
+Resolving the latest extraction from the storage volume means listing the
+paper directory and then opening its metadata record, which is slow on a
+network filesystem. The index is a SQLite database on a local disk (see
+``STORAGE_INDEX``) that maps ``(bucket, identifier)`` on to the latest
+version, its status, the formats that are present, and their total size and
+modification time.
+
+The index is updated by :meth:`.Storage.store` in the processes that use it,
+but extractions are also stored by other containers, which have their own
+index (SQLite must not be shared over a network filesystem). So an entry is
+only a hint: it records the modification time of the paper directory, which
+changes when a version directory is added to it, and :class:`.Storage` lists
+the directory if that time has changed since. The index is a cache of the
+volume, and can be recovered from it with :meth:`MetadataIndex.rebuild` (i.e.
+``python -m fulltext.services.store``).
+"""
+
+import os
+import re
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from arxiv.base import logging
+
+logger = logging.getLogger(__name__)
+
+VERSION = re.compile(r'^v?(\d+(?:\.\d+)*)(.*)$')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS latest (
+    bucket TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    version TEXT NOT NULL,
+    status TEXT NOT NULL,
+    formats TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    root_mtime REAL,
+    PRIMARY KEY (bucket, identifier)
+)
+'''
+
+
+def version_key(version: str) -> Tuple[Tuple[int, ...], int, str]:
+    """
+    Get a key with which to sort extractor versions.
+
+    Versions are compared by their numeric parts, so ``0.10`` is later than
+    ``0.9``, and ``1.0`` is later than ``1.0rc1``. Versions that are not
+    numeric sort before all others.
+    """
+    match = VERSION.match(version)
+    if match is None:
+        return (), 0, version
+    release, suffix = match.groups()
+    return tuple(int(part) for part in release.split('.')), int(not suffix), \
+        suffix
+
+
+class IndexEntry(NamedTuple):
+    """The latest extraction for an e-print or submission."""
+
+    version: str
+    status: str
+    formats: List[str]
+    """Content formats that are present, e.g. ``plain`` and ``psv``."""
+    size: int
+    """Total size (in bytes) of the content files."""
+    mtime: float
+    """Modification time of the metadata record."""
+    root_mtime: Optional[float] = None
+    """
+    Modification time of the paper directory when this was indexed, if it
+    has one; the entry is current only while that is unchanged.
+    """
+
+
+class MetadataIndex:
+    """Provides the index of latest extractions, in a SQLite database."""
+
+    _local = threading.local()
+    """Connections for each thread, by database path and PID."""
+
+    def __init__(self, path: str) -> None:
+        """Set the path to the database."""
+        self._path = path
+
+    @property
+    def path(self) -> str:
+        """Path to the database."""
+        return self._path
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        """Get the connection for this thread (and process)."""
+        connections: Dict[Tuple[str, int], sqlite3.Connection] = \
+            self._local.__dict__.setdefault('connections', {})
+        key = (self._path, os.getpid())     # Do not share after fork.
+        if key not in connections:
+            db = sqlite3.connect(self._path, timeout=30,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(SCHEMA)
+            connections[key] = db
+        return connections[key]
+
+    def get(self, bucket: str, identifier: str) -> Optional[IndexEntry]:
+        """Get the latest extraction for an identifier, if it is indexed."""
+        row = self._db.execute(
+            'SELECT version, status, formats, size, mtime, root_mtime '
+            'FROM latest WHERE bucket = ? AND identifier = ?',
+            (bucket, identifier)
+        ).fetchone()
+        if row is None:
+            return None
+        version, status, formats, size, mtime, root_mtime = row
+        return IndexEntry(version, status, json.loads(formats), size, mtime,
+                          root_mtime)
+
+    def update(self, bucket: str, identifier: str, entry: IndexEntry) -> None:
+        """
+        Index an extraction, if it is at least as late as the indexed one.
+
+        The comparison and the update are done in one transaction, so that
+        concurrent updates cannot replace a later version with an earlier one.
+        """
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT version FROM latest WHERE bucket = ? AND '
+                'identifier = ?', (bucket, identifier)
+            ).fetchone()
+            if row is None \
+                    or version_key(entry.version) >= version_key(row[0]):
+                db.execute('INSERT OR REPLACE INTO latest '
+                           'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                           (bucket, identifier, entry.version, entry.status,
+                            json.dumps(entry.formats), entry.size,
+                            entry.mtime, entry.root_mtime))
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def touch(self, bucket: str, identifier: str, version: str,
+              root_mtime: Optional[float]) -> None:
+        """Update the directory time of the entry, if it is for ``version``."""
+        self._db.execute(
+            'UPDATE latest SET root_mtime = ? WHERE bucket = ? AND '
+            'identifier = ? AND version = ?',
+            (root_mtime, bucket, identifier, version)
+        )
+
+    def rebuild(self, entries: Iterable[Tuple[str, str, IndexEntry]]) -> int:
+        """
+        Replace the contents of the index.
+
+        Parameters
+        ----------
+        entries : iterable
+            ``(bucket, identifier, entry)`` for each extraction, in any order;
+            only the latest for each identifier is kept.
+
+        Returns
+        -------
+        int
+            The number of identifiers that were indexed.
+
+        """
+        latest: Dict[Tuple[str, str], IndexEntry] = {}
+        for bucket, identifier, entry in entries:
+            current = latest.get((bucket, identifier))
+            if current is None or \
+                    version_key(entry.version) >= version_key(current.version):
+                latest[(bucket, identifier)] = entry
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM latest')
+            db.executemany(
+                'INSERT INTO latest VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((bucket, identifier, entry.version, entry.status,
+                  json.dumps(entry.formats), entry.size, entry.mtime,
+                  entry.root_mtime)
+                 for (bucket, identifier), entry in latest.items())
+            )
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        logger.info('Rebuilt index of %i extractions', len(latest))
+        return len(latest)
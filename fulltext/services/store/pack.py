@@ -0,0 +1,560 @@
+"""
+Append-only pack files, for storing extractions without a file for each.
+
+The filesystem layout (see :mod:`.store`) needs about three small files for
+each e-print and extractor version, so a whole corpus takes tens of millions
+of inodes, and traversing it (e.g. for a backup) is very slow. A
+:class:`PackFile` instead appends records to a few large segment files, and
+keeps the offset of the current record for each key in a SQLite index.
+
+Layout of a pack:
+
+- ``/{root}/{NNNNNNNN}.pack`` are the segments. A new segment is started once
+  the latest one reaches the segment size. Each record is a header
+  (:const:`RECORD`), the key (UTF-8), and the data. Deleting a key appends a
+  tombstone record.
+- ``/{root}/index.sqlite`` maps each key on to the segment, offset and size of
+  its data. As the records are self-describing, it can be recovered from the
+  segments with :meth:`PackFile.reindex`.
+
+Records that are replaced or deleted are garbage until their segment is
+compacted: :meth:`PackFile.compact` copies the live records of mostly-garbage
+segments to the latest segment, and then removes them. This runs in the
+background of the writing process when a segment is sealed, in one process
+at a time (see ``compact.lock``).
+
+Writers are serialized by the write lock of the index, so a pack can be shared
+by any number of processes on the same host. It must be on a local filesystem,
+though: the index uses SQLite's WAL mode, which needs memory shared by its
+users, and its locks are not reliable over NFS. See
+:func:`network_filesystem`.
+
+Each process keeps the segments that it reads from open, and checks every
+:const:`FD_CHECK_INTERVAL` seconds for segments that were compacted away (by
+any process), so that their space is freed.
+"""
+
+import io
+import os
+import fcntl
+import zlib
+import time
+import struct
+import sqlite3
+import threading
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Optional, \
+    Tuple
+
+from arxiv.base import logging
+
+logger = logging.getLogger(__name__)
+
+RECORD = struct.Struct('>4sBHIIQ')
+"""Header of a record: magic, flags, key size, data size, CRC-32, mtime."""
+
+MAGIC = b'FTPK'
+TOMBSTONE = 1
+
+FD_CHECK_INTERVAL = 60.
+"""Seconds between checks for open segments that were compacted away."""
+
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ceph',
+                       'glusterfs', 'afs', '9p', 'fuse.sshfs'}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS records (
+    key TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    crc INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+)
+'''
+
+
+def network_filesystem(path: str) -> Optional[str]:
+    """
+    Get the type of the network filesystem that ``path`` is on, if any.
+
+    Mounts are read from ``/proc/mounts``, so this is always ``None`` where
+    that does not exist.
+    """
+    path = os.path.realpath(path)
+    try:
+        with open('/proc/mounts') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return None
+    found, fstype = '', None
+    for mountpoint, kind in mounts:
+        mountpoint = mountpoint.replace('\\040', ' ')
+        if (path == mountpoint
+                or path.startswith(mountpoint.rstrip('/') + '/')) \
+                and len(mountpoint) >= len(found):
+            found, fstype = mountpoint, kind
+    return fstype if fstype in NETWORK_FILESYSTEMS else None
+
+
+class PackStat(NamedTuple):
+    """Size and modification time of a record, like :func:`os.stat`."""
+
+    st_size: int
+    st_mtime_ns: int
+
+    @property
+    def st_mtime(self) -> float:
+        """Modification time, in seconds."""
+        return self.st_mtime_ns / 1e9
+
+
+class _Record(io.RawIOBase):
+    """Reads the data of a record, from a segment that it owns."""
+
+    def __init__(self, fd: int, offset: int, size: int) -> None:
+        """Read ``size`` bytes from ``offset`` in the segment at ``fd``."""
+        self._fd = fd
+        self._offset = offset
+        self._end = offset + size
+
+    def readable(self) -> bool:
+        """The record can be read."""
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        """Read the next part of the record into ``buffer``."""
+        wanted = min(len(buffer), self._end - self._offset)
+        if wanted <= 0:
+            return 0
+        data = os.pread(self._fd, wanted, self._offset)
+        buffer[:len(data)] = data
+        self._offset += len(data)
+        return len(data)
+
+    def close(self) -> None:
+        """Close the segment."""
+        if not self.closed:
+            os.close(self._fd)
+        super(_Record, self).close()
+
+
+class PackFile:
+    """Provides a key-value store in append-only segment files."""
+
+    _shared: Dict[Tuple[str, int], 'PackFile'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, root: str, segment_size: int = 1024 ** 3,
+                 compact_ratio: float = 0.5) -> None:
+        """
+        Set the directory of the pack, and create it if necessary.
+
+        Parameters
+        ----------
+        root : str
+        segment_size : int
+            Size (in bytes) after which a segment is sealed, and a new one is
+            started.
+        compact_ratio : float
+            Sealed segments in which less than this fraction of the bytes are
+            live are compacted.
+
+        """
+        self._root = root
+        self._segment_size = segment_size
+        self._compact_ratio = compact_ratio
+        os.makedirs(root, exist_ok=True)
+        self._local = threading.local()
+        self._fds: Dict[int, int] = {}
+        self._fds_lock = threading.Lock()
+        self._fds_checked = time.monotonic()
+        self._unlinked: List[int] = []
+        """Descriptors of removed segments, to be closed at the next check."""
+        self._compacting = threading.Lock()
+
+    @classmethod
+    def shared(cls, root: str, **kwargs: Any) -> 'PackFile':
+        """Get the instance for the pack at ``root`` in this process."""
+        key = (os.path.abspath(root), os.getpid())  # Do not share after fork.
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(root, **kwargs)
+            return cls._shared[key]
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        """Get the connection to the index for this thread."""
+        db: Optional[sqlite3.Connection] = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(os.path.join(self._root, 'index.sqlite'),
+                                 timeout=60, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(SCHEMA)
+            self._local.db = db
+        return db
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self._root, f'{segment:08d}.pack')
+
+    def _segments(self) -> List[int]:
+        return sorted(int(name[:-5]) for name in os.listdir(self._root)
+                      if name.endswith('.pack'))
+
+    def _read_fd(self, segment: int) -> int:
+        """Get a file descriptor with which to read a segment."""
+        with self._fds_lock:
+            now = time.monotonic()
+            if now - self._fds_checked >= FD_CHECK_INTERVAL:
+                self._check_fds()
+                self._fds_checked = now
+            if segment not in self._fds:
+                self._fds[segment] = os.open(self._segment_path(segment),
+                                             os.O_RDONLY)
+            return self._fds[segment]
+
+    def _check_fds(self) -> None:
+        """
+        Close the descriptors of segments that have been removed.
+
+        A reader may have looked up a record in a segment just before it was
+        compacted, and still be using the descriptor, so a descriptor is only
+        closed at the check after the one at which its segment was found to
+        be gone. Must be called with ``_fds_lock`` held.
+        """
+        for fd in self._unlinked:
+            os.close(fd)
+        self._unlinked = []
+        for segment, fd in list(self._fds.items()):
+            try:
+                current = os.stat(self._segment_path(segment)).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(fd).st_ino:
+                self._unlinked.append(self._fds.pop(segment))
+
+    def _append(self, key: str, data: bytes, flags: int = 0,
+                mtime_ns: Optional[int] = None) -> Tuple[int, int, int, int]:
+        """
+        Append a record to the latest segment.
+
+        Must be called in a write transaction, which keeps other writers out.
+
+        Returns
+        -------
+        tuple
+            The segment, the offset of the data, its CRC-32, and its mtime.
+
+        """
+        segments = self._segments()
+        segment = segments[-1] if segments else 0
+        sealed = False
+        if segments and \
+                os.path.getsize(self._segment_path(segment)) \
+                >= self._segment_size:
+            segment += 1
+            sealed = True
+        encoded = key.encode('utf-8')
+        crc = zlib.crc32(data)
+        if mtime_ns is None:
+            mtime_ns = int(time.time() * 1e9)
+        record = RECORD.pack(MAGIC, flags, len(encoded), len(data), crc,
+                             mtime_ns) + encoded + data
+        fd = os.open(self._segment_path(segment),
+                     os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            offset = os.fstat(fd).st_size
+            view = memoryview(record)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        if sealed:
+            self._compact_in_background()
+        return segment, offset + RECORD.size + len(encoded), crc, mtime_ns
+
+    def put(self, key: str, data: bytes,
+            mtime_ns: Optional[int] = None) -> None:
+        """
+        Store ``data`` at ``key``, replacing any previous data.
+
+        The modification time is now, unless ``mtime_ns`` is given.
+        """
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            segment, offset, crc, mtime_ns = \
+                self._append(key, data, mtime_ns=mtime_ns)
+            db.execute('INSERT OR REPLACE INTO records VALUES '
+                       '(?, ?, ?, ?, ?, ?)',
+                       (key, segment, offset, len(data), crc, mtime_ns))
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def delete(self, key: str) -> None:
+        """Delete the data at ``key``, if there is any."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if db.execute('SELECT 1 FROM records WHERE key = ?',
+                          (key,)).fetchone():
+                self._append(key, b'', flags=TOMBSTONE)
+                db.execute('DELETE FROM records WHERE key = ?', (key,))
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _locate(self, key: str) -> Tuple[int, int, int, int, int]:
+        row = self._db.execute(
+            'SELECT segment, offset, size, crc, mtime_ns FROM records '
+            'WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            raise FileNotFoundError(f'No such record: {key}')
+        return row     # type: ignore
+
+    def get(self, key: str) -> bytes:
+        """
+        Get the data at ``key``.
+
+        Raises
+        ------
+        :class:`FileNotFoundError`
+            If there is no data at ``key``.
+
+        """
+        for attempt in range(2):
+            segment, offset, size, crc, _ = self._locate(key)
+            try:
+                data = os.pread(self._read_fd(segment), size, offset)
+                break
+            except FileNotFoundError:   # Compacted after we looked it up.
+                if attempt:
+                    raise
+        if len(data) != size or zlib.crc32(data) != crc:
+            raise IOError(f'Corrupt record in segment {segment}: {key}')
+        return data
+
+    def open(self, key: str) -> IO[bytes]:
+        """
+        Open the data at ``key``, to read it in parts.
+
+        The segment is opened for this reader alone, so it can still be read
+        if the record is replaced or compacted in the meantime. Unlike
+        :meth:`get`, the CRC of the data is not checked.
+
+        Raises
+        ------
+        :class:`FileNotFoundError`
+            If there is no data at ``key``.
+
+        """
+        for attempt in range(2):
+            segment, offset, size, _, _ = self._locate(key)
+            try:
+                fd = os.open(self._segment_path(segment), os.O_RDONLY)
+                break
+            except FileNotFoundError:   # Compacted after we looked it up.
+                if attempt:
+                    raise
+        return io.BufferedReader(_Record(fd, offset, size))
+
+    def stat(self, key: str) -> PackStat:
+        """Get the size and modification time of the data at ``key``."""
+        _, _, size, _, mtime_ns = self._locate(key)
+        return PackStat(size, mtime_ns)
+
+    def exists(self, key: str) -> bool:
+        """Determine whether there is data at ``key``."""
+        return self._db.execute('SELECT 1 FROM records WHERE key = ?',
+                                (key,)).fetchone() is not None
+
+    def listdir(self, prefix: str) -> List[str]:
+        """
+        List the names below ``prefix``, as if keys were paths.
+
+        Raises
+        ------
+        :class:`FileNotFoundError`
+            If there are no keys below ``prefix``.
+
+        """
+        prefix = prefix.rstrip('/') + '/'
+        # Keys that start with "{prefix}" sort before "{prefix[:-1]}0".
+        rows = self._db.execute(
+            'SELECT key FROM records WHERE key >= ? AND key < ?',
+            (prefix, prefix[:-1] + '0')
+        )
+        names = sorted({key[len(prefix):].split('/', 1)[0]
+                        for key, in rows})
+        if not names:
+            raise FileNotFoundError(f'Nothing below {prefix}')
+        return names
+
+    def keys(self, suffix: str = '', prefix: str = '') -> Iterator[str]:
+        """Generate the keys with ``prefix`` and ``suffix``, in order."""
+        if prefix:
+            # Keys that start with the prefix sort before the prefix with its
+            # last character incremented.
+            end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            rows = self._db.execute(
+                'SELECT key FROM records WHERE key >= ? AND key < ? '
+                'ORDER BY key', (prefix, end)
+            )
+        else:
+            rows = self._db.execute('SELECT key FROM records ORDER BY key')
+        for key, in rows:
+            if key.endswith(suffix):
+                yield key
+
+    def _compact_in_background(self) -> None:
+        if self._compacting.locked():
+            return
+        thread = threading.Thread(target=self.compact, daemon=True,
+                                  name='pack-compaction')
+        thread.start()
+
+    def compact(self) -> int:
+        """
+        Compact the sealed segments that are mostly garbage.
+
+        Returns
+        -------
+        int
+            The number of bytes that were reclaimed.
+
+        """
+        if not self._compacting.acquire(blocking=False):
+            return 0    # Already in progress in this process.
+        lock = open(os.path.join(self._root, 'compact.lock'), 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            self._compacting.release()
+            return 0    # Already in progress in another process.
+        try:
+            reclaimed = 0
+            for segment in self._segments()[:-1]:   # The last is not sealed.
+                path = self._segment_path(segment)
+                live, = self._db.execute(
+                    'SELECT COALESCE(SUM(size), 0) FROM records '
+                    'WHERE segment = ?', (segment,)
+                ).fetchone()
+                size = os.path.getsize(path)
+                if live >= self._compact_ratio * size:
+                    continue
+                self._relocate(segment)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:   # By another compaction.
+                    pass
+                # Descriptors of the segment are closed by _check_fds.
+                reclaimed += size - live
+                logger.info('Compacted segment %i (%i bytes reclaimed)',
+                            segment, size - live)
+            return reclaimed
+        finally:
+            lock.close()    # Releases the lock.
+            self._compacting.release()
+
+    def _relocate(self, segment: int) -> None:
+        """
+        Copy the live records in ``segment`` to the latest segment.
+
+        Tombstones are copied too, while there are older segments, as these
+        may hold records of the deleted keys that :meth:`reindex` would
+        otherwise bring back.
+        """
+        db = self._db
+        rows = db.execute('SELECT key, offset, size, crc, mtime_ns '
+                          'FROM records WHERE segment = ?',
+                          (segment,)).fetchall()
+        for key, offset, size, crc, mtime_ns in rows:
+            data = os.pread(self._read_fd(segment), size, offset)
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                # Only if the record was not replaced in the meantime.
+                if db.execute('SELECT 1 FROM records WHERE key = ? AND '
+                              'segment = ? AND offset = ?',
+                              (key, segment, offset)).fetchone():
+                    new_segment, new_offset, _, _ = \
+                        self._append(key, data, mtime_ns=mtime_ns)
+                    db.execute('UPDATE records SET segment = ?, offset = ? '
+                               'WHERE key = ?',
+                               (new_segment, new_offset, key))
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+        if not any(older < segment for older in self._segments()):
+            return
+        deleted = {key for key, flags, *_ in self._scan(segment)
+                   if flags & TOMBSTONE}
+        for key in sorted(deleted):
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                # Unless the key was stored again since.
+                if not db.execute('SELECT 1 FROM records WHERE key = ?',
+                                  (key,)).fetchone():
+                    self._append(key, b'', flags=TOMBSTONE)
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+    def reindex(self) -> int:
+        """
+        Rebuild the index from the records in the segments.
+
+        Returns
+        -------
+        int
+            The number of keys that were indexed.
+
+        """
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM records')
+            for segment in self._segments():
+                for key, flags, offset, size, crc, mtime_ns \
+                        in self._scan(segment):
+                    if flags & TOMBSTONE:
+                        db.execute('DELETE FROM records WHERE key = ?',
+                                   (key,))
+                    else:
+                        db.execute('INSERT OR REPLACE INTO records VALUES '
+                                   '(?, ?, ?, ?, ?, ?)',
+                                   (key, segment, offset, size, crc,
+                                    mtime_ns))
+            count, = db.execute('SELECT COUNT(*) FROM records').fetchone()
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return int(count)
+
+    def _scan(self, segment: int) \
+            -> Iterator[Tuple[str, int, int, int, int, int]]:
+        """Generate the records in a segment, up to any incomplete record."""
+        with open(self._segment_path(segment), 'rb') as f:
+            while True:
+                header = f.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    return
+                magic, flags, key_size, size, crc, mtime_ns = \
+                    RECORD.unpack(header)
+                if magic != MAGIC:
+                    logger.error('Bad record in segment %i at %i', segment,
+                                 f.tell() - RECORD.size)
+                    return
+                key = f.read(key_size).decode('utf-8')
+                offset = f.tell()
+                f.seek(size, os.SEEK_CUR)
+                if f.tell() > os.fstat(f.fileno()).st_size:
+                    return      # Truncated, e.g. by a crash.
+                yield key, flags, offset, size, crc, mtime_ns
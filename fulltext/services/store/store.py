@@ -47,12 +47,40 @@ Therefore, a metadata record may exist well before an actual extraction.
 For extractions that were **not** generated with this software (i.e. brought
 forward from the legacy system), a metadata record **may not** exist. See
 comments in code, below.
+
+Compression
+===========
+Content may be stored compressed, with gzip or (if :mod:`zstandard` is
+installed) zstd, as set for each format by ``STORAGE_COMPRESSION``. The file
+name then has a suffix for the encoding, e.g.
+``/{volume}/arxiv/2003/00012v4/0.3/plain.gz``, and the metadata record maps
+each compressed format on to its encoding (``encodings``). Content is
+decompressed transparently by :meth:`Storage.retrieve`; content without a
+marker (e.g. stored before compression was enabled) is uncompressed.
+
+Streaming
+=========
+:meth:`Storage.retrieve` loads the content in to a :class:`str`, which for a
+large extraction means holding both it and its encoded bytes in memory.
+:meth:`Storage.retrieve_chunks` instead gets the content as an iterator of
+chunks of UTF-8 (of at most :const:`CHUNK_SIZE` bytes), read from the file as
+they are consumed, so that a response can be streamed in bounded memory.
 """
 
-from typing import Optional, Any
+from typing import IO, Optional, Any, Deque, Dict, Iterable, Iterator, List, \
+    NamedTuple, Tuple
 import os
+import re
+import io
+import posixpath
+import gzip
 import shutil
+import sqlite3
 import json
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import groupby, islice
 from datetime import datetime
 from pytz import UTC
 from backports.datetime_fromisoformat import MonkeyPatch
@@ -65,10 +93,26 @@ from arxiv.base.globals import get_application_global, get_application_config
 from arxiv.base import logging
 
 from ...domain import Extraction, SupportedFormats, SupportedBuckets
+from .index import IndexEntry, MetadataIndex, version_key
+from .pack import PackFile, PackStat, network_filesystem
+
+try:
+    import zstandard
+except ImportError:     # Only needed if zstd is used for STORAGE_COMPRESSION.
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 MonkeyPatch.patch_fromisoformat()
 
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+"""File name suffixes of content that is stored with each encoding."""
+
+CHUNK_SIZE = 64 * 1024
+"""Size (in bytes) of the chunks in which content is streamed."""
+
+PREFIX = re.compile(r'^([a-z\-]+(\.[A-Z]{2})?/)?[0-9]{4}$')
+"""Month (``YYMM``) of new-style e-prints, or archive and month (old-style)."""
+
 
 class ConfigurationError(RuntimeError):
     """A config parameter is missing or invalid."""
@@ -82,12 +126,199 @@ class StorageFailed(RuntimeError):
     """Could not store content."""
 
 
+class StoredExtraction(NamedTuple):
+    """An extraction on the storage volume, as found by a traversal."""
+
+    bucket: str
+    identifier: str
+    version: str
+    formats: Dict[str, Optional[str]]
+    """Content formats that are present, and their encodings (if any)."""
+    extraction: Optional[Extraction] = None
+    """The metadata record, if it was requested."""
+
+
+def parse_compression(value: str) -> Dict[str, str]:
+    """
+    Parse the ``STORAGE_COMPRESSION`` setting.
+
+    This is either an encoding for all formats (e.g. ``gzip``), or
+    comma-separated formats and encodings (e.g. ``plain:gzip,psv:zstd``).
+    """
+    value = value.strip()
+    if not value:
+        return {}
+    if ':' not in value:
+        return {SupportedFormats.PLAIN: value, SupportedFormats.PSV: value}
+    compression = {}
+    for item in value.split(','):
+        content_fmt, _, encoding = item.partition(':')
+        compression[content_fmt.strip()] = encoding.strip()
+    return compression
+
+
+def _identifier(paper_path: str) -> str:
+    """Get the identifier of the paper at a path in a bucket."""
+    parts = paper_path.split(os.sep)
+    if len(parts) == 3 and OLD_STYLE.match(f'{parts[0]}/{parts[2]}'):
+        return f'{parts[0]}/{parts[2]}'
+    if len(parts) == 2 and STANDARD.match(parts[1]):
+        return parts[1]
+    return '/'.join(parts)
+
+
+def _is_within(path: str, directory: str) -> bool:
+    """Determine whether ``path`` is in ``directory`` (or a subdirectory)."""
+    path, directory = os.path.realpath(path), os.path.realpath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+def pack_path(volume: str) -> str:
+    """Get the path to the pack of :class:`.PackStorage` on a volume."""
+    return os.path.join(volume, '.pack')
+
+
+class _GzipFile(gzip.GzipFile):
+    """A :class:`gzip.GzipFile` that also closes the file that it reads."""
+
+    def close(self) -> None:
+        """Close the file that is read, too."""
+        fileobj = self.fileobj
+        try:
+            super(_GzipFile, self).close()
+        finally:
+            if fileobj is not None:
+                fileobj.close()
+
+
+class _ZstdReader(io.RawIOBase):
+    """Decompresses zstd from a file that it reads, and then closes."""
+
+    def __init__(self, fileobj: IO[bytes]) -> None:
+        """Start decompressing ``fileobj``."""
+        self._fileobj = fileobj
+        self._reader = zstandard.ZstdDecompressor().stream_reader(fileobj)
+
+    def readable(self) -> bool:
+        """Content can be read."""
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        """Read decompressed content into ``buffer``."""
+        data = self._reader.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        """Close the file."""
+        if not self.closed:
+            self._fileobj.close()
+        super(_ZstdReader, self).close()
+
+
+class MetadataCache:
+    """
+    Bounded, least recently used cache of parsed metadata records.
+
+    Clients poll the status of an extraction while it is in progress, so the
+    same record is read over and over. Entries are keyed on the path of the
+    record, and are only used while its size and modification time match
+    those of the file, so updates by other processes are picked up with a
+    single ``stat()``.
+    """
+
+    _shared: Dict[int, 'MetadataCache'] = {}
+
+    def __init__(self, max_size: int = 10000) -> None:
+        """Set the maximum number of records to keep."""
+        self._max_size = max_size
+        self._entries: 'OrderedDict[str, Tuple[Tuple[int, int], Any]]' = \
+            OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        """Number of records that were served from the cache."""
+        self.misses = 0
+        """Number of records that had to be read."""
+
+    @classmethod
+    def shared(cls, max_size: int) -> 'MetadataCache':
+        """Get the cache of this size for this process."""
+        if max_size not in cls._shared:
+            cls._shared[max_size] = cls(max_size)
+        return cls._shared[max_size]
+
+    def get(self, path: str, stat: Any) -> Any:
+        """Get the parsed record at ``path``, if it is cached and fresh."""
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None \
+                    and cached[0] == (stat.st_mtime_ns, stat.st_size):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            return None
+
+    def put(self, path: str, stat: Any, value: Any) -> None:
+        """Cache the parsed record at ``path``."""
+        with self._lock:
+            self._entries[path] = ((stat.st_mtime_ns, stat.st_size), value)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, path: str) -> None:
+        """Forget the record at ``path``, e.g. because it was replaced."""
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of hits, misses, and cached records."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._entries)}
+
+
 class Storage(metaclass=MetaIntegration):
     """Provides storage integration."""
 
-    def __init__(self, volume: str) -> None:
-        """Check and set the storage volume."""
+    serves_files = True
+    """Whether :meth:`content_path` is a file that can be sent as it is."""
+
+    def __init__(self, volume: str,
+                 compression: Optional[Dict[str, str]] = None,
+                 index: Optional[MetadataIndex] = None,
+                 meta_cache: Optional['MetadataCache'] = None) -> None:
+        """
+        Check and set the storage volume.
+
+        Parameters
+        ----------
+        volume : str
+        compression : dict
+            Encoding (``gzip`` or ``zstd``) with which to store the content
+            of each format. Formats that are not included are not compressed.
+        index : :class:`.MetadataIndex`
+            If provided, used to find the latest extraction for an identifier
+            without listing its directory. It must not be on ``volume``.
+        meta_cache : :class:`.MetadataCache`
+            If provided, used to cache parsed metadata records.
+
+        """
         self._volume = volume
+        self._index = index
+        self._meta_cache = meta_cache
+        self._compression = compression or {}
+        for content_fmt, encoding in self._compression.items():
+            if content_fmt not in SupportedFormats:
+                raise ConfigurationError(f'No such format: {content_fmt}')
+            if encoding not in SUFFIXES:
+                raise ConfigurationError(f'Unsupported encoding: {encoding}')
+            if encoding == 'zstd' and zstandard is None:
+                raise ConfigurationError('zstandard is required for zstd')
+        if index is not None and _is_within(index.path, volume):
+            # SQLite locking (and WAL) does not work on a network filesystem.
+            raise ConfigurationError(f'Index {index.path} must be on a local '
+                                     f'disk, not on the storage volume')
 
         if not os.path.exists(self._volume):
             try:
@@ -105,9 +336,77 @@ class Storage(metaclass=MetaIntegration):
         except StorageFailed as e:
             logger.error('Could not write: %s', e)
             return False
-        shutil.rmtree(test_paper_path)
+        self._remove(test_path)
+        shutil.rmtree(test_paper_path, ignore_errors=True)
         return True
 
+    # These primitives are all of the I/O that is done on the volume, so that
+    # a subclass can keep the same layout somewhere other than in files.
+
+    def _write(self, path: str, data: bytes) -> None:
+        """Write ``data`` to the file at ``path``, replacing it."""
+        self.make_paths(path)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def _read(self, path: str) -> bytes:
+        """Read the file at ``path``."""
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _open(self, path: str) -> IO[bytes]:
+        """Open the file at ``path`` for reading."""
+        return open(path, 'rb')
+
+    def _stat(self, path: str) -> Any:
+        """Get the size and modification time of the file at ``path``."""
+        return os.stat(path)
+
+    def _isfile(self, path: str) -> bool:
+        """Determine whether there is a file at ``path``."""
+        return os.path.isfile(path)
+
+    def _remove(self, path: str) -> None:
+        """Remove the file at ``path``, if it exists."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _listdir(self, path: str) -> List[str]:
+        """List the names in the directory at ``path``."""
+        return [name for name in os.listdir(path) if not name.startswith('.')]
+
+    def _dir_mtime(self, path: str) -> Optional[float]:
+        """Get the modification time of the directory at ``path``, if any."""
+        try:
+            return os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _version_dirs(self, path: str) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Generate the directories below ``path`` with metadata records.
+
+        Yields the path to each directory, in order, and the names of the
+        files in it. Entries are typed by :func:`os.scandir`, so nothing is
+        opened or stat-ed.
+        """
+        try:
+            with os.scandir(path) as scan:
+                entries = sorted((entry for entry in scan
+                                  if not entry.name.startswith('.')),
+                                 key=lambda entry: entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        names = [entry.name for entry in entries if entry.is_file()]
+        if 'meta.json' in names:
+            yield path, names
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._version_dirs(entry.path)
+
     def _paper_path(self, identifier: str, bucket: str) -> str:
         """
         Generate a base path for extraction from a particular resource.
@@ -136,33 +435,150 @@ class Storage(metaclass=MetaIntegration):
         return os.path.join(self._paper_path(identifier, bucket),
                             version, 'meta.json')
 
+    def _contents(self, identifier: str, version: str,
+                  bucket: str) -> Dict[str, Tuple[Optional[str], int]]:
+        """Get the encoding and size of each format that is present."""
+        contents = {}
+        root = os.path.dirname(self._meta_path(identifier, version, bucket))
+        try:
+            for name in self._listdir(root):
+                content_fmt = os.path.splitext(name)[0]
+                if content_fmt in SupportedFormats:
+                    contents[content_fmt] = (
+                        self.content_encoding(name),
+                        self._stat(os.path.join(root, name)).st_size
+                    )
+        except FileNotFoundError:
+            pass
+        return contents
+
+    def _update_index(self, extraction: Extraction,
+                      contents: Dict[str, Tuple[Optional[str], int]]) -> None:
+        """Index an extraction, if it is the latest for its identifier."""
+        if self._index is None:
+            return
+        root = self._paper_path(extraction.identifier, extraction.bucket)
+        # Read before listing, so that a version added afterwards changes it.
+        root_mtime = self._dir_mtime(root)
+        latest = self._listed_version(root)
+        if latest != extraction.version:
+            # Adding this version changed the directory, but the indexed one
+            # may still be the latest.
+            if latest is not None:
+                self._index.touch(extraction.bucket, extraction.identifier,
+                                  latest, root_mtime)
+            return
+        meta_path = self._meta_path(extraction.identifier, extraction.version,
+                                    extraction.bucket)
+        self._index.update(extraction.bucket, extraction.identifier,
+                           IndexEntry(
+                               version=extraction.version,
+                               status=extraction.status.value,
+                               formats=sorted(contents),
+                               size=sum(size for _, size in contents.values()),
+                               mtime=self._stat(meta_path).st_mtime,
+                               root_mtime=root_mtime
+                           ))
+
+    def _listed_version(self, root: str) -> Optional[str]:
+        """Get the latest version in the paper directory ``root``, if any."""
+        try:
+            versions = self._listdir(root)
+        except FileNotFoundError:
+            return None
+        return max(versions, key=version_key) if versions else None
+
+    @staticmethod
+    def content_encoding(path: str) -> Optional[str]:
+        """Get the encoding of a content file (``None`` if uncompressed)."""
+        for encoding, suffix in SUFFIXES.items():
+            if path.endswith(suffix):
+                return encoding
+        return None
+
+    def open_content(self, path: str, decode: bool = True) -> IO[bytes]:
+        """
+        Open a content file, decompressing it unless ``decode`` is ``False``.
+
+        ``path`` is as returned by :meth:`content_path`.
+        """
+        encoding = self.content_encoding(path) if decode else None
+        if encoding == 'zstd' and zstandard is None:
+            raise StorageFailed('zstandard is required to read zstd')
+        f = self._open(path)
+        if encoding == 'gzip':
+            return _GzipFile(fileobj=f, mode='rb')    # type: ignore
+        if encoding == 'zstd':
+            return io.BufferedReader(_ZstdReader(f))
+        return f
+
+    def iter_content(self, path: str, chunk_size: int = CHUNK_SIZE,
+                     decode: bool = True) -> Iterator[bytes]:
+        """
+        Read a content file in chunks, as they are consumed.
+
+        As :meth:`open_content`, but the file is closed once the iterator is
+        exhausted or closed. The file is opened before this returns, so that
+        :class:`FileNotFoundError` is raised here rather than by the iterator.
+        """
+        f = self.open_content(path, decode=decode)
+
+        def _chunks() -> Iterator[bytes]:
+            with f:
+                chunk = f.read(chunk_size)
+                while chunk:
+                    yield chunk
+                    chunk = f.read(chunk_size)
+        return _chunks()
+
+    def content_stat(self, path: str) -> Any:
+        """
+        Get the size and modification time of a content file.
+
+        ``path`` is as returned by :meth:`content_path`. The result has the
+        ``st_size``, ``st_mtime`` and ``st_mtime_ns`` of :func:`os.stat`.
+        """
+        return self._stat(path)
+
+    @staticmethod
+    def _compress(data: bytes, encoding: str) -> bytes:
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor().compress(data)    # type: ignore
+        # The modification time in the header would change the bytes, and so
+        # the ETag, of identical content.
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as f:
+            f.write(data)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _decompress(data: bytes, encoding: str) -> bytes:
+        if encoding == 'zstd':
+            if zstandard is None:
+                raise StorageFailed('zstandard is required to read zstd')
+            return zstandard.ZstdDecompressor().decompressobj() \
+                .decompress(data)   # type: ignore
+        return gzip.decompress(data)
+
     def _creation_time(self, path: str) -> datetime:
-        return datetime.fromtimestamp(os.path.getmtime(path), tz=UTC)
+        return datetime.fromtimestamp(self._stat(path).st_mtime, tz=UTC)
 
-    # TODO: consider refactoring this to support full semantic versions, rather
-    # than only major.minor that can be expressed as a float. This package
-    # has decent support: https://pypi.org/project/semver/
     def _latest_version(self, identifier: str,
                         bucket: str = SupportedBuckets.ARXIV) -> str:
-        def _try_float(value: str) -> float:
-            try:
-                return float(value)
-            except ValueError:
-                logger.debug(f"non-float version {value}")
-                return 0.0
-        try:
-            root_path = self._paper_path(identifier, bucket)
-            paths = os.listdir(root_path)
-        except FileNotFoundError as e:
-            logger.debug('Extraction root path does not exist: %s', root_path)
-            raise DoesNotExist("No extractions found") from e
-        versions = sorted([p for p in paths if not p.startswith('.')],
-                          key=_try_float)
-        if not versions:
+        root_path = self._paper_path(identifier, bucket)
+        if self._index is not None:
+            # The entry is current unless a version directory has been added
+            # (or removed) since, e.g. by another container.
+            entry = self._index.get(bucket, identifier)
+            if entry is not None and entry.root_mtime is not None \
+                    and entry.root_mtime == self._dir_mtime(root_path):
+                return entry.version
+        latest = self._listed_version(root_path)
+        if latest is None:
             logger.debug('Cannot find any versions for %s in %s',
                          identifier, bucket)
             raise DoesNotExist(f'No versions for {identifier} in {bucket}')
-        return versions[-1]
+        return latest
 
     @staticmethod
     def make_paths(path: str) -> None:
@@ -182,23 +598,48 @@ class Storage(metaclass=MetaIntegration):
             content_path = self._path(extraction.identifier,
                                       extraction.version,
                                       content_fmt, extraction.bucket)
-            self._store(content_path, extraction.content)
+            encoding = self._compression.get(content_fmt)
+            if encoding is None:
+                stored = content_path
+                self._store(stored, extraction.content)
+            else:
+                stored = content_path + SUFFIXES[encoding]
+                self._store_compressed(stored, extraction.content, encoding)
+            # Remove content that was stored with a different encoding.
+            for suffix in [''] + list(SUFFIXES.values()):
+                if content_path + suffix != stored:
+                    self._remove(content_path + suffix)
 
         # Store metadata separately.
         meta = extraction.to_dict()
         meta.pop('content')
+        contents = self._contents(extraction.identifier, extraction.version,
+                                  extraction.bucket)
+        meta['encodings'] = {fmt: encoding for fmt, (encoding, _)
+                             in contents.items() if encoding is not None}
         meta_path = self._meta_path(extraction.identifier, extraction.version,
                                     extraction.bucket)
         logger.debug('Store metadata for %s at %s',
                      extraction.identifier, meta_path)
         self._store(meta_path, json.dumps(meta))
+        if self._meta_cache is not None:
+            self._meta_cache.discard(meta_path)
+        self._update_index(extraction, contents)
 
     def _store(self, path: str, content: str) -> None:
         logger.debug('store %i bytes at %s', len(content), path)
         try:    # Write metadata record.
-            self.make_paths(path)
-            with open(path, 'w') as f:
-                f.write(content)
+            self._write(path, content.encode('utf-8'))
+        except (IOError, PermissionError) as e:
+            logger.error('Encountered error when writing: %s', e)
+            raise StorageFailed("Could not store content") from e
+
+    def _store_compressed(self, path: str, content: str,
+                          encoding: str) -> None:
+        logger.debug('store %i characters at %s', len(content), path)
+        try:
+            self._write(path, self._compress(content.encode('utf-8'),
+                                             encoding))
         except (IOError, PermissionError) as e:
             logger.error('Encountered error when writing: %s', e)
             raise StorageFailed("Could not store content") from e
@@ -221,24 +662,22 @@ class Storage(metaclass=MetaIntegration):
         # We should generate fallback metadata that can be used to instantiate
         # ``Extraction``, below.
         try:
-            with open(self._meta_path(identifier, version, bucket)) as meta_fp:
-                meta = json.load(meta_fp)
-
-            # mypy does not know about fromisoformat yet, apparently.
-            if 'started' in meta and meta['started']:
-                meta['started'] = datetime.fromisoformat(meta['started'])   # type: ignore
-            if 'ended' in meta and meta['ended']:
-                meta['ended'] = datetime.fromisoformat(meta['ended'])   # type: ignore
-            meta['status'] = Extraction.Status(meta['status'])
+            extraction, encodings = \
+                self._read_meta(self._meta_path(identifier, version, bucket))
         except FileNotFoundError as e:
             logger.debug('File does not exist: %s', content_path)
             raise DoesNotExist("No such resource") from e
+        encoding = encodings.get(content_fmt)
 
         # Get the extraction content.
         if not meta_only:
+            if encoding is not None:
+                content_path += SUFFIXES[encoding]
             try:
-                with open(content_path, 'rb') as content_fp:
-                    content = content_fp.read().decode('utf-8')
+                data = self._read(content_path)
+                if encoding is not None:
+                    data = self._decompress(data, encoding)
+                content = data.decode('utf-8')
 
             except FileNotFoundError:
                 # If the content is not here, it is likely because the
@@ -246,21 +685,333 @@ class Storage(metaclass=MetaIntegration):
                 logger.info('No %s content found for %s (extractor version '
                             '%s) in bucket %s', content_fmt, identifier,
                             version, bucket)
-        assert meta['bucket'] == bucket
+        assert extraction.bucket == bucket
         logger.debug('Finished loading extraction')
-        return Extraction(content=content, **meta)
+        return extraction._replace(content=content)
+
+    def retrieve_chunks(self, identifier: str, version: Optional[str] = None,
+                        content_fmt: str = SupportedFormats.PLAIN,
+                        bucket: str = SupportedBuckets.ARXIV,
+                        chunk_size: int = CHUNK_SIZE) \
+            -> Tuple[Extraction, Optional[Iterator[bytes]]]:
+        """
+        Retrieve an :class:`.Extraction`, with its content in chunks.
+
+        As :meth:`retrieve`, but the content of the extraction is not loaded.
+        Instead, it is read in chunks of UTF-8 (see :meth:`iter_content`) as
+        they are consumed, so that it need not be held in memory all at once.
+
+        Returns
+        -------
+        :class:`.Extraction`
+            Without content.
+        iterator or None
+            Chunks of the content, or ``None`` if there is none (e.g. the
+            extraction is in progress).
+
+        """
+        extraction = self.retrieve(identifier, version, content_fmt, bucket,
+                                   meta_only=True)
+        try:
+            path = self.content_path(identifier, extraction.version,
+                                     content_fmt, bucket)
+            return extraction, self.iter_content(path, chunk_size)
+        except (DoesNotExist, FileNotFoundError):
+            return extraction, None
+
+    def _read_meta(self, meta_path: str) \
+            -> Tuple[Extraction, Dict[str, str]]:
+        """
+        Read a metadata record, and the encodings of the content formats.
+
+        Parsed records are cached, and reused for as long as the size and
+        modification time of the file are unchanged.
+        """
+        if self._meta_cache is not None:
+            stat = self._stat(meta_path)
+            cached = self._meta_cache.get(meta_path, stat)
+            if cached is not None:
+                return cached
+        meta = json.loads(self._read(meta_path))
+
+        # mypy does not know about fromisoformat yet, apparently.
+        if 'started' in meta and meta['started']:
+            meta['started'] = datetime.fromisoformat(meta['started'])   # type: ignore
+        if 'ended' in meta and meta['ended']:
+            meta['ended'] = datetime.fromisoformat(meta['ended'])   # type: ignore
+        meta['status'] = Extraction.Status(meta['status'])
+        encodings: Dict[str, str] = meta.pop('encodings', {})
+        parsed = (Extraction(**meta), encodings)
+        if self._meta_cache is not None:
+            # If the file was replaced after the stat, this is only a miss
+            # next time.
+            self._meta_cache.put(meta_path, stat, parsed)
+        return parsed
+
+    def content_path(self, identifier: str, version: str,
+                     content_fmt: str = SupportedFormats.PLAIN,
+                     bucket: str = SupportedBuckets.ARXIV) -> str:
+        """
+        Get the path to the content of an extraction.
+
+        This allows the content to be served straight from the file, rather
+        than loading it with :meth:`retrieve`. The file may be compressed; see
+        :meth:`content_encoding` and :meth:`open_content`.
+
+        Raises
+        ------
+        :class:`DoesNotExist`
+            If there is no content (e.g. the extraction is in progress).
+
+        """
+        path = self._path(identifier, version, content_fmt, bucket)
+        # Look for the encoding that is used now first, then any other.
+        preferred = self._compression.get(content_fmt)
+        suffixes = [SUFFIXES[preferred]] if preferred else []
+        suffixes += [s for s in [''] + list(SUFFIXES.values())
+                     if s not in suffixes]
+        for suffix in suffixes:
+            if self._isfile(path + suffix):
+                return path + suffix
+        raise DoesNotExist(f'No {content_fmt} content for {identifier}')
+
+    def retrieve_many(self, identifiers: Iterable[str],
+                      bucket: str = SupportedBuckets.ARXIV,
+                      version: Optional[str] = None,
+                      workers: int = 8) -> Dict[str, Optional[Extraction]]:
+        """
+        Retrieve the metadata of the extractions for many identifiers.
+
+        This reads only the metadata records (as with ``meta_only=True``). On
+        a network filesystem each read is mostly spent waiting on the server,
+        so the reads are done in a pool of ``workers`` threads.
+
+        Returns
+        -------
+        dict
+            The :class:`.Extraction` for each identifier, or ``None`` if there
+            is no extraction.
+
+        """
+        def _retrieve(identifier: str) -> Optional[Extraction]:
+            try:
+                return self.retrieve(identifier, version, bucket=bucket,
+                                     meta_only=True)
+            except DoesNotExist:
+                return None
+
+        identifiers = list(identifiers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(identifiers, pool.map(_retrieve, identifiers)))
+
+    def list_identifiers(self, prefix: str,
+                         bucket: str = SupportedBuckets.ARXIV) -> List[str]:
+        """
+        List the identifiers of the e-prints that have extractions.
+
+        Parameters
+        ----------
+        prefix : str
+            A month of announcements, e.g. ``1901`` for new-style e-prints,
+            or an archive and month, e.g. ``hep-th/9901``, for old-style
+            e-prints.
+        bucket : str
+
+        Returns
+        -------
+        list
+            Identifiers in order, e.g. ``1901.00123`` or ``hep-th/9901001``.
+
+        """
+        if not PREFIX.match(prefix):
+            raise ValueError(f'Not a month or archive and month: {prefix}')
+        try:
+            names = sorted(self._listdir(os.path.join(self._volume, bucket,
+                                                      prefix)))
+        except FileNotFoundError:
+            return []
+        if '/' in prefix:
+            archive, _ = prefix.split('/', 1)
+            return [f'{archive}/{name}' for name in names]
+        return names
+
+    def iter_extractions(self, bucket: str = SupportedBuckets.ARXIV,
+                         prefix: Optional[str] = None,
+                         version: Optional[str] = None,
+                         formats: Iterable[str] = (), meta: bool = False,
+                         workers: int = 8) -> Iterator[StoredExtraction]:
+        """
+        Generate the extractions on the storage volume.
+
+        The top-level directories of the bucket (months of new-style e-prints,
+        and archives of old-style e-prints) are traversed in parallel, in a
+        pool of ``workers`` threads, and a few ahead of the consumer. Records
+        are yielded in order of their paths. Only directories are listed:
+        neither content nor (unless ``meta`` is set) metadata records are
+        opened.
+
+        Parameters
+        ----------
+        bucket : str
+        prefix : str or None
+            Traverse only the directory of this month (e.g. ``1901``) or
+            archive and month (e.g. ``hep-th/9901``), not the whole bucket.
+        version : str or None
+            Only extractions by this extractor version. By default, all
+            versions are included.
+        formats : iterable
+            Only extractions with content in all of these formats.
+        meta : bool
+            If ``True``, read the metadata record of each extraction (as with
+            ``meta_only=True``), in the pool.
+        workers : int
+
+        Raises
+        ------
+        :class:`ValueError`
+            If ``prefix`` is not a month, or an archive and month.
+
+        """
+        if prefix is not None and not PREFIX.match(prefix):
+            raise ValueError(f'Not a month or archive and month: {prefix}')
+        root = os.path.join(self._volume, bucket)
+        if prefix is not None:
+            tops: Iterator[str] = iter([prefix])
+        else:
+            try:
+                tops = iter(sorted(self._listdir(root)))
+            except FileNotFoundError:
+                return
+        required = set(formats)
+
+        def _scan(top: str) -> List[StoredExtraction]:
+            found = []
+            for directory, names in \
+                    self._version_dirs(os.path.join(root, top)):
+                paper_path, found_version = os.path.split(directory)
+                if version is not None and found_version != version:
+                    continue
+                contents = {os.path.splitext(name)[0]:
+                            self.content_encoding(name) for name in names}
+                contents = {content_fmt: encoding for content_fmt, encoding
+                            in contents.items()
+                            if content_fmt in SupportedFormats}
+                if not required.issubset(contents):
+                    continue
+                extraction: Optional[Extraction] = None
+                if meta:
+                    try:
+                        extraction, _ = self._read_meta(
+                            os.path.join(directory, 'meta.json')
+                        )
+                    except (OSError, ValueError, KeyError) as e:
+                        logger.error('Could not read %s: %s', directory, e)
+                        continue
+                found.append(StoredExtraction(
+                    bucket=bucket,
+                    identifier=_identifier(os.path.relpath(paper_path, root)),
+                    version=found_version,
+                    formats=contents,
+                    extraction=extraction
+                ))
+            return found
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending: Deque[Future] = deque(
+                pool.submit(_scan, top) for top in islice(tops, 2 * workers)
+            )
+            try:
+                while pending:
+                    found = pending.popleft().result()
+                    for top in islice(tops, 1):
+                        pending.append(pool.submit(_scan, top))
+                    yield from found
+            finally:    # E.g. the consumer stopped early.
+                for future in pending:
+                    future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get metrics about the metadata cache of this process."""
+        if self._meta_cache is None:
+            return {}
+        return {'metadata_cache': self._meta_cache.stats()}
+
+    def _iter_latest(self) -> Iterator[Tuple[str, str, IndexEntry]]:
+        """Generate index entries for all of the extractions on the volume."""
+        for directory, _ in self._version_dirs(self._volume):
+            meta_path = os.path.join(directory, 'meta.json')
+            try:
+                meta = json.loads(self._read(meta_path))
+                bucket, identifier = meta['bucket'], meta['identifier']
+                version = meta['version']
+                root = self._paper_path(identifier, bucket)
+                root_mtime = self._dir_mtime(root)
+                if self._listed_version(root) != version:
+                    continue
+                contents = self._contents(identifier, version, bucket)
+                yield bucket, identifier, IndexEntry(
+                    version=version,
+                    status=meta['status'],
+                    formats=sorted(contents),
+                    size=sum(size for _, size in contents.values()),
+                    mtime=self._stat(meta_path).st_mtime,
+                    root_mtime=root_mtime
+                )
+            except (OSError, ValueError, KeyError) as e:
+                logger.error('Could not index %s: %s', meta_path, e)
+
+    def rebuild_index(self) -> int:
+        """
+        Rebuild the index of latest extractions from the storage volume.
+
+        Returns
+        -------
+        int
+            The number of identifiers that were indexed.
+
+        """
+        if self._index is None:
+            raise ConfigurationError('STORAGE_INDEX is not set')
+        return self._index.rebuild(self._iter_latest())
 
     @classmethod
     def init_app(cls, app: Flask) -> None:
         """Set defaults for required configuration parameters."""
         app.config.setdefault('STORAGE_VOLUME', '/tmp/storage')
+        app.config.setdefault('STORAGE_BACKEND', 'files')
+        app.config.setdefault('STORAGE_PACK_SEGMENT_SIZE', 1024 ** 3)
+        app.config.setdefault('STORAGE_PACK_COMPACT_RATIO', 0.5)
+        app.config.setdefault('STORAGE_COMPRESSION', '')
+        app.config.setdefault('STORAGE_INDEX', None)
+        app.config.setdefault('STORAGE_META_CACHE_SIZE', 10000)
 
     @classmethod
     def create_session(cls) -> 'Storage':
         """Create a new :class:`.Storage` instance."""
         config = get_application_config()
         volume = config.get('STORAGE_VOLUME', '/tmp/storage')
-        return cls(volume)
+        index_path = config.get('STORAGE_INDEX')
+        cache_size = int(config.get('STORAGE_META_CACHE_SIZE', 10000))
+        kwargs: Dict[str, Any] = dict(
+            compression=parse_compression(
+                config.get('STORAGE_COMPRESSION', '')
+            ),
+            index=MetadataIndex(index_path) if index_path else None,
+            meta_cache=MetadataCache.shared(cache_size) if cache_size > 0
+            else None
+        )
+        backend = config.get('STORAGE_BACKEND', 'files')
+        if backend == 'pack':
+            return PackStorage(volume, PackFile.shared(
+                pack_path(volume),
+                segment_size=int(config.get('STORAGE_PACK_SEGMENT_SIZE',
+                                            1024 ** 3)),
+                compact_ratio=float(config.get('STORAGE_PACK_COMPACT_RATIO',
+                                               0.5))
+            ), **kwargs)
+        if backend != 'files':
+            raise ConfigurationError(f'No such storage backend: {backend}')
+        return cls(volume, **kwargs)
 
     @classmethod
     def current_session(cls) -> 'Storage':
@@ -272,3 +1023,105 @@ class Storage(metaclass=MetaIntegration):
             g.store = cls.create_session()
         instance: 'Storage' = g.store
         return instance
+
+
+class PackStorage(Storage):
+    """
+    Provides storage integration, with the volume kept in pack files.
+
+    The layout is the same as for :class:`Storage`, but each path is a key in
+    a :class:`.PackFile` (at ``/{volume}/.pack``) rather than a file, so the
+    semantics of :meth:`store` and :meth:`retrieve` are unchanged.
+    """
+
+    serves_files = False
+
+    def __init__(self, volume: str, pack: PackFile, **kwargs: Any) -> None:
+        """Set the storage volume and the pack; see :class:`Storage`."""
+        super(PackStorage, self).__init__(volume, **kwargs)
+        fstype = network_filesystem(volume)
+        if fstype is not None:
+            raise ConfigurationError(f'Pack storage needs a local volume, '
+                                     f'but {volume} is on {fstype}')
+        self._pack = pack
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self._volume)
+
+    def is_available(self, **kwargs: Any) -> bool:
+        """Determine whether storage is available."""
+        try:
+            self._pack.put('.test', b'test')
+            self._pack.delete('.test')
+        except (OSError, sqlite3.Error) as e:
+            logger.error('Could not write: %s', e)
+            return False
+        return True
+
+    def _write(self, path: str, data: bytes) -> None:
+        try:
+            self._pack.put(self._key(path), data)
+        except sqlite3.Error as e:
+            raise IOError(f'Could not index {path}') from e
+
+    def _read(self, path: str) -> bytes:
+        return self._pack.get(self._key(path))
+
+    def _stat(self, path: str) -> PackStat:
+        return self._pack.stat(self._key(path))
+
+    def _isfile(self, path: str) -> bool:
+        return self._pack.exists(self._key(path))
+
+    def _remove(self, path: str) -> None:
+        self._pack.delete(self._key(path))
+
+    def _listdir(self, path: str) -> List[str]:
+        return self._pack.listdir(self._key(path))
+
+    def _dir_mtime(self, path: str) -> Optional[float]:
+        return None     # Listing a "directory" is a query of the pack index.
+
+    def _version_dirs(self, path: str) -> Iterator[Tuple[str, List[str]]]:
+        key = self._key(path)
+        keys = self._pack.keys(prefix='' if key == '.' else f'{key}/')
+        for directory, group in groupby(keys, posixpath.dirname):
+            names = [posixpath.basename(key) for key in group]
+            if 'meta.json' in names:
+                yield os.path.join(self._volume, directory), names
+
+    def _open(self, path: str) -> IO[bytes]:
+        return self._pack.open(self._key(path))
+
+    def compact(self) -> int:
+        """Compact the pack now; see :meth:`.PackFile.compact`."""
+        return self._pack.compact()
+
+    def reindex(self) -> int:
+        """Recover the pack's index; see :meth:`.PackFile.reindex`."""
+        return self._pack.reindex()
+
+    def migrate(self) -> int:
+        """
+        Copy extractions from the filesystem layout on the volume to the pack.
+
+        Modification times are kept, so that cached metadata and ETags stay
+        valid. The files are left in place, to be removed once the pack has
+        been checked.
+
+        Returns
+        -------
+        int
+            The number of files that were copied.
+
+        """
+        files = Storage(self._volume)
+        copied = 0
+        for directory, names in files._version_dirs(self._volume):
+            for name in names:
+                path = os.path.join(directory, name)
+                self._pack.put(self._key(path), files._read(path),
+                               mtime_ns=files._stat(path).st_mtime_ns)
+                copied += 1
+        logger.info('Copied %i files to the pack', copied)
+        return copied
@@ -3,12 +3,18 @@
 import tempfile
 import shutil
 import os
+import gzip
+import fcntl
 import stat
 import json
+import time
 from datetime import datetime
 from pytz import UTC
 from unittest import TestCase, mock
 from . import store
+from .index import MetadataIndex, version_key
+from . import pack
+from .pack import PackFile
 from ...domain import Extraction, SupportedFormats, SupportedBuckets
 
 
@@ -219,6 +225,46 @@ class TestRetrieveExtraction(TestCase):
         self.assertEqual(extraction.status, Extraction.Status.SUCCEEDED)
         self.assertIsNone(extraction.content)
 
+    def test_retrieve_many(self):
+        """Retrieve the metadata for several e-prints at once."""
+        self.create_meta('cs/0001982', '1', SupportedBuckets.ARXIV)
+        self.create_meta('1901.00123', '1', SupportedBuckets.ARXIV,
+                         status='in_progress')
+        extractions = self.storage.retrieve_many(
+            ['cs/0001982', '1901.00123', '1901.00124']
+        )
+        self.assertEqual(extractions['cs/0001982'].status,
+                         Extraction.Status.SUCCEEDED)
+        self.assertEqual(extractions['1901.00123'].status,
+                         Extraction.Status.IN_PROGRESS)
+        self.assertIsNone(extractions['1901.00123'].content)
+        self.assertIsNone(extractions['1901.00124'])
+
+    def test_content_path(self):
+        """Get the path to the content of an extraction."""
+        self.create_meta('1901.00123', '1', SupportedBuckets.ARXIV)
+        self.create_content('1901.00123', '1', SupportedFormats.PLAIN,
+                            SupportedBuckets.ARXIV, 'foöcontent')
+        path = self.storage.content_path('1901.00123', '1')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), 'foöcontent'.encode('utf-8'))
+        with self.assertRaises(store.DoesNotExist):
+            self.storage.content_path('1901.00123', '1', SupportedFormats.PSV)
+
+    def test_list_identifiers(self):
+        """List the e-prints from a month that have extractions."""
+        self.create_meta('hep-th/9901002', '1', SupportedBuckets.ARXIV)
+        self.create_meta('hep-th/9901001', '1', SupportedBuckets.ARXIV)
+        self.create_meta('1901.00124', '1', SupportedBuckets.ARXIV)
+        self.create_meta('1901.00123', '1', SupportedBuckets.ARXIV)
+        self.assertEqual(self.storage.list_identifiers('hep-th/9901'),
+                         ['hep-th/9901001', 'hep-th/9901002'])
+        self.assertEqual(self.storage.list_identifiers('1901'),
+                         ['1901.00123', '1901.00124'])
+        self.assertEqual(self.storage.list_identifiers('1902'), [])
+        with self.assertRaises(ValueError):
+            self.storage.list_identifiers('../1901')
+
     def test_retrieve_newstyle(self):
         """Retrieve extraction for a newstyle e-print."""
         self.create_meta('1901.00123', '1', SupportedBuckets.ARXIV)
@@ -336,3 +382,480 @@ class TestStoreExtraction(TestCase):
 
         extraction = self.storage.retrieve(identifier, version)
         self.assertEqual(extraction.content, "föcontent")
+
+
+class TestCompressedStorage(TestCase):
+    """Content is stored compressed."""
+
+    def setUp(self):
+        """We have a :class:`.Storage` integration that uses gzip."""
+        self.volume = tempfile.mkdtemp()
+        self.storage = store.Storage(self.volume, {'plain': 'gzip'})
+        self.extraction = Extraction(
+            identifier='1901.00123',
+            version='2',
+            bucket=SupportedBuckets.ARXIV,
+            started=datetime.now(UTC),
+            status=Extraction.Status.SUCCEEDED,
+            content='föcontent'
+        )
+
+    def tearDown(self):
+        """Remove the volume."""
+        shutil.rmtree(self.volume)
+
+    def test_store(self):
+        """Content is compressed, and decompressed when it is retrieved."""
+        self.storage.store(self.extraction, SupportedFormats.PLAIN)
+        self.storage.store(self.extraction, SupportedFormats.PSV)
+        path = self.storage._path('1901.00123', '2', 'plain', 'arxiv')
+        self.assertFalse(os.path.exists(path))
+        with gzip.open(f'{path}.gz') as f:
+            self.assertEqual(f.read().decode('utf-8'), 'föcontent')
+        with open(self.storage._meta_path('1901.00123', '2', 'arxiv')) as f:
+            self.assertEqual(json.load(f)['encodings'], {'plain': 'gzip'})
+
+        extraction = self.storage.retrieve('1901.00123', '2')
+        self.assertEqual(extraction.content, 'föcontent')
+        extraction = self.storage.retrieve('1901.00123', '2', 'psv')
+        self.assertEqual(extraction.content, 'föcontent')
+
+        found = self.storage.content_path('1901.00123', '2')
+        self.assertEqual(found, f'{path}.gz')
+        self.assertEqual(self.storage.content_encoding(found), 'gzip')
+        with self.storage.open_content(found) as f:
+            self.assertEqual(f.read().decode('utf-8'), 'föcontent')
+
+    def test_retrieve_chunks(self):
+        """Content is decompressed a chunk at a time."""
+        self.storage.store(self.extraction._replace(content='fö' * 1000),
+                           SupportedFormats.PLAIN)
+        extraction, chunks = self.storage.retrieve_chunks(
+            '1901.00123', chunk_size=256
+        )
+        self.assertIsNone(extraction.content)
+        chunks = list(chunks)
+        self.assertTrue(all(len(chunk) <= 256 for chunk in chunks))
+        self.assertEqual(b''.join(chunks).decode('utf-8'), 'fö' * 1000)
+
+        self.storage.store(self.extraction._replace(
+            status=Extraction.Status.IN_PROGRESS, version='3'
+        ))
+        extraction, chunks = self.storage.retrieve_chunks('1901.00123')
+        self.assertEqual(extraction.version, '3')
+        self.assertIsNone(chunks)
+
+    def test_compression_is_disabled(self):
+        """Content that was stored compressed is replaced."""
+        self.storage.store(self.extraction, SupportedFormats.PLAIN)
+        storage = store.Storage(self.volume)
+        storage.store(self.extraction, SupportedFormats.PLAIN)
+        path = self.storage._path('1901.00123', '2', 'plain', 'arxiv')
+        self.assertEqual(sorted(os.listdir(os.path.dirname(path))),
+                         ['meta.json', 'plain'])
+        self.assertFalse(os.path.exists(f'{path}.gz'))
+        self.assertEqual(storage.content_path('1901.00123', '2'), path)
+        self.assertEqual(self.storage.retrieve('1901.00123', '2').content,
+                         'föcontent')
+
+    def test_parse_compression(self):
+        """Compression is set for all formats, or for each format."""
+        self.assertEqual(store.parse_compression(''), {})
+        self.assertEqual(store.parse_compression('gzip'),
+                         {'plain': 'gzip', 'psv': 'gzip'})
+        self.assertEqual(store.parse_compression('plain:gzip, psv:zstd'),
+                         {'plain': 'gzip', 'psv': 'zstd'})
+
+    def test_bad_compression(self):
+        """Unsupported formats and encodings are rejected."""
+        with self.assertRaises(store.ConfigurationError):
+            store.Storage(self.volume, {'plain': 'lzma'})
+        with self.assertRaises(store.ConfigurationError):
+            store.Storage(self.volume, {'pdf': 'gzip'})
+
+
+class TestMetadataIndex(TestCase):
+    """The latest extraction for each identifier is indexed."""
+
+    def setUp(self):
+        """We have a :class:`.Storage` integration with an index."""
+        self.volume = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        self.index = MetadataIndex(os.path.join(self.local, 'index.db'))
+        self.storage = store.Storage(self.volume, index=self.index)
+
+    def tearDown(self):
+        """Remove the volume and the index."""
+        shutil.rmtree(self.volume)
+        shutil.rmtree(self.local)
+
+    def extraction(self, version, status=Extraction.Status.SUCCEEDED):
+        """Make an extraction for a version."""
+        return Extraction(identifier='1901.00123', version=version,
+                          bucket=SupportedBuckets.ARXIV, status=status,
+                          started=datetime.now(UTC), content='föcontent')
+
+    def test_version_key(self):
+        """Versions are ordered by their numeric parts."""
+        self.assertEqual(sorted(['0.10', 'foo', '1.0', '0.3.1', '0.9',
+                                 '1.0rc1', '0.3'], key=version_key),
+                         ['foo', '0.3', '0.3.1', '0.9', '0.10', '1.0rc1',
+                          '1.0'])
+
+    def test_store(self):
+        """The latest version is found without listing its directory."""
+        self.storage.store(self.extraction('0.10'), SupportedFormats.PLAIN)
+        self.storage.store(self.extraction('0.9'), SupportedFormats.PLAIN)
+        entry = self.index.get('arxiv', '1901.00123')
+        self.assertEqual(entry.version, '0.10')
+        self.assertEqual(entry.status, 'succeeded')
+        self.assertEqual(entry.formats, ['plain'])
+        self.assertEqual(entry.size, len('föcontent'.encode('utf-8')))
+
+        with mock.patch.object(store.os, 'listdir') as mock_listdir:
+            extraction = self.storage.retrieve('1901.00123')
+        self.assertEqual(extraction.version, '0.10')
+        self.assertEqual(mock_listdir.call_count, 0)
+
+    def test_status_is_updated(self):
+        """The status of the latest version is kept up to date."""
+        self.storage.store(self.extraction(
+            '0.3', status=Extraction.Status.IN_PROGRESS
+        ))
+        self.assertEqual(self.index.get('arxiv', '1901.00123').formats, [])
+        self.storage.store(self.extraction('0.3'), SupportedFormats.PLAIN)
+        self.storage.store(self.extraction('0.3'), SupportedFormats.PSV)
+        entry = self.index.get('arxiv', '1901.00123')
+        self.assertEqual(entry.status, 'succeeded')
+        self.assertEqual(entry.formats, ['plain', 'psv'])
+
+    def test_stored_elsewhere(self):
+        """A later version stored by another container is found."""
+        self.storage.store(self.extraction('0.9'), SupportedFormats.PLAIN)
+        other = store.Storage(self.volume, index=MetadataIndex(
+            os.path.join(self.local, 'other.db')
+        ))
+        time.sleep(0.01)    # The directory time must be seen to change.
+        other.store(self.extraction('0.10'), SupportedFormats.PLAIN)
+        self.assertEqual(self.index.get('arxiv', '1901.00123').version, '0.9')
+        self.assertEqual(self.storage.retrieve('1901.00123').version, '0.10')
+
+    def test_on_volume(self):
+        """An index on the storage volume is rejected."""
+        with self.assertRaises(store.ConfigurationError):
+            store.Storage(self.volume, index=MetadataIndex(
+                os.path.join(self.volume, '.index.db')
+            ))
+
+    def test_not_indexed(self):
+        """Extractions that are not indexed are still found."""
+        store.Storage(self.volume).store(self.extraction('0.10'),
+                                         SupportedFormats.PLAIN)
+        self.assertIsNone(self.index.get('arxiv', '1901.00123'))
+        self.assertEqual(self.storage.retrieve('1901.00123').version, '0.10')
+
+    def test_rebuild(self):
+        """The index is recovered from the storage volume."""
+        unindexed = store.Storage(self.volume)
+        unindexed.store(self.extraction('0.9'), SupportedFormats.PLAIN)
+        unindexed.store(self.extraction('0.10'), SupportedFormats.PLAIN)
+        unindexed.store(Extraction(identifier='hep-th/9901001', version='0.3',
+                                   bucket=SupportedBuckets.ARXIV,
+                                   status=Extraction.Status.FAILED))
+        self.assertEqual(self.storage.rebuild_index(), 2)
+        self.assertEqual(self.index.get('arxiv', '1901.00123').version, '0.10')
+        self.assertEqual(self.index.get('arxiv', 'hep-th/9901001').status,
+                         'failed')
+
+
+class TestMetadataCache(TestCase):
+    """Parsed metadata records are reused."""
+
+    def setUp(self):
+        """We have a :class:`.Storage` integration with a cache."""
+        self.volume = tempfile.mkdtemp()
+        self.cache = store.MetadataCache(2)
+        self.storage = store.Storage(self.volume, meta_cache=self.cache)
+        self.storage.store(Extraction(identifier='1901.00123', version='0.3',
+                                      started=datetime.now(UTC)))
+
+    def tearDown(self):
+        """Remove the volume."""
+        shutil.rmtree(self.volume)
+
+    def test_hit(self):
+        """The record is not read again while it is unchanged."""
+        first = self.storage.retrieve('1901.00123', '0.3', meta_only=True)
+        with mock.patch.object(store, 'open') as mock_open:
+            second = self.storage.retrieve('1901.00123', '0.3',
+                                           meta_only=True)
+        self.assertEqual(mock_open.call_count, 0)
+        self.assertEqual(first, second)
+        self.assertEqual(self.storage.stats()['metadata_cache'],
+                         {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_store(self):
+        """Storing an extraction replaces its cached record."""
+        self.storage.retrieve('1901.00123', '0.3', meta_only=True)
+        self.storage.store(Extraction(identifier='1901.00123', version='0.3',
+                                      status=Extraction.Status.FAILED))
+        extraction = self.storage.retrieve('1901.00123', '0.3',
+                                           meta_only=True)
+        self.assertEqual(extraction.status, Extraction.Status.FAILED)
+
+    def test_changed_by_another_process(self):
+        """A record that was replaced on disk is read again."""
+        self.storage.retrieve('1901.00123', '0.3', meta_only=True)
+        store.Storage(self.volume).store(Extraction(
+            identifier='1901.00123', version='0.3',
+            status=Extraction.Status.SUCCEEDED
+        ))
+        meta_path = self.storage._meta_path('1901.00123', '0.3', 'arxiv')
+        os.utime(meta_path, ns=(0, 0))
+        extraction = self.storage.retrieve('1901.00123', '0.3',
+                                           meta_only=True)
+        self.assertEqual(extraction.status, Extraction.Status.SUCCEEDED)
+
+    def test_bounded(self):
+        """The least recently used records are evicted."""
+        for identifier in ['1901.00124', '1901.00125']:
+            self.storage.store(Extraction(identifier=identifier,
+                                          version='0.3'))
+        for identifier in ['1901.00123', '1901.00124', '1901.00125']:
+            self.storage.retrieve(identifier, '0.3', meta_only=True)
+        self.assertEqual(self.cache.stats()['size'], 2)
+        self.storage.retrieve('1901.00123', '0.3', meta_only=True)
+        self.assertEqual(self.cache.stats()['misses'], 4)
+
+
+class TestPackStorage(TestCase):
+    """Extractions are kept in a pack, rather than a file per format."""
+
+    def setUp(self):
+        """We have a :class:`.PackStorage` integration with small segments."""
+        self.volume = tempfile.mkdtemp()
+        self.pack = PackFile(store.pack_path(self.volume),
+                             segment_size=256, compact_ratio=0)
+        self.storage = store.PackStorage(self.volume, self.pack)
+
+    def tearDown(self):
+        """Remove the volume, once any background compaction is done."""
+        with self.pack._compacting:
+            shutil.rmtree(self.volume)
+
+    def compact(self, pack=None):
+        """Compact the pack, once any background compaction is done."""
+        pack = pack or PackFile(store.pack_path(self.volume),
+                                segment_size=256)
+        with self.pack._compacting:
+            return pack.compact()
+
+    def extraction(self, version, identifier='1901.00123'):
+        """Make an extraction for a version."""
+        return Extraction(identifier=identifier, version=version,
+                          bucket=SupportedBuckets.ARXIV,
+                          status=Extraction.Status.SUCCEEDED,
+                          started=datetime.now(UTC), content='föcontent')
+
+    def test_store(self):
+        """The extraction is stored and retrieved without any files."""
+        self.assertTrue(self.storage.is_available())
+        self.storage.store(self.extraction('0.9'), SupportedFormats.PLAIN)
+        self.storage.store(self.extraction('0.10'), SupportedFormats.PLAIN)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.volume, 'arxiv', '1901', '00123')
+        ))
+        extraction = self.storage.retrieve('1901.00123')
+        self.assertEqual(extraction.version, '0.10')
+        self.assertEqual(extraction.content, 'föcontent')
+        self.assertEqual(self.storage.list_identifiers('1901'),
+                         ['1901.00123'])
+
+        path = self.storage.content_path('1901.00123', '0.10')
+        self.assertEqual(self.storage.content_stat(path).st_size,
+                         len('föcontent'.encode('utf-8')))
+        with self.storage.open_content(path) as f:
+            self.assertEqual(f.read().decode('utf-8'), 'föcontent')
+
+    def test_retrieve_chunks(self):
+        """Content is read from its segment a chunk at a time."""
+        self.storage.store(self.extraction('0.3')._replace(content='x' * 500),
+                           SupportedFormats.PLAIN)
+        self.storage.store(self.extraction('0.3', '1901.00124'),
+                           SupportedFormats.PLAIN)
+        _, chunks = self.storage.retrieve_chunks('1901.00123', chunk_size=64)
+        first = next(chunks)
+        self.assertEqual(first, b'x' * 64)
+        # Still readable once the record is replaced, and compacted away.
+        self.storage.store(self.extraction('0.3'), SupportedFormats.PLAIN)
+        self.compact()
+        self.assertEqual(first + b''.join(chunks), b'x' * 500)
+
+    def test_replaced(self):
+        """Stored content replaces the previous content."""
+        self.storage.store(self.extraction('0.3'), SupportedFormats.PLAIN)
+        self.storage.store(self.extraction('0.3')._replace(content='bar'),
+                           SupportedFormats.PLAIN)
+        self.assertEqual(self.storage.retrieve('1901.00123').content, 'bar')
+        self.assertIsNone(self.storage.retrieve('1901.00123', '0.3',
+                                                'psv').content)
+
+    def test_compact(self):
+        """Segments that are mostly dead records are rewritten."""
+        for i in range(10):
+            self.storage.store(self.extraction('0.3')._replace(
+                content=f'content {i}' * 10
+            ), SupportedFormats.PLAIN)
+        segments = len(self.pack._segments())
+        self.assertGreater(segments, 2)
+        pack = PackFile(store.pack_path(self.volume), segment_size=256)
+        self.assertGreater(self.compact(pack), 0)
+        self.assertLess(len(pack._segments()), segments)
+        self.assertEqual(self.storage.retrieve('1901.00123').content,
+                         'content 9' * 10)
+
+    def test_reindex(self):
+        """The index of the pack is recovered from its segments."""
+        self.storage.store(self.extraction('0.3'), SupportedFormats.PLAIN)
+        self.storage.store(self.extraction('0.3', '1901.00124'),
+                           SupportedFormats.PLAIN)
+        self.pack.delete('arxiv/1901/1901.00124/0.3/plain')
+        self.pack._db.execute('DELETE FROM records')
+        self.assertEqual(self.storage.reindex(), 3)
+        self.assertEqual(self.storage.retrieve('1901.00123').content,
+                         'föcontent')
+        self.assertIsNone(self.storage.retrieve('1901.00124').content)
+
+    def test_compacted_tombstone(self):
+        """A deleted key stays deleted once its tombstone is compacted."""
+        self.pack.put('deleted', b'x' * 10)
+        self.pack.put('kept', b'k' * 300)       # Segment 0 stays.
+        self.pack.delete('deleted')
+        self.pack.put('replaced', b'r' * 300)
+        self.pack.put('replaced', b'r' * 300)   # Segment 1 is garbage.
+        pack = PackFile(store.pack_path(self.volume), segment_size=256)
+        self.assertGreater(self.compact(pack), 0)
+        self.assertNotIn(1, pack._segments())
+        self.assertIn(0, pack._segments())
+        self.assertEqual(pack.reindex(), 2)
+        self.assertFalse(pack.exists('deleted'))
+        self.assertEqual(pack.get('kept'), b'k' * 300)
+
+    def test_compacted_in_another_process(self):
+        """Segments compacted by another process are closed when gone."""
+        self.pack.put('kept', b'k' * 300)
+        self.pack.put('replaced', b'r' * 300)
+        self.assertEqual(self.pack.get('replaced'), b'r' * 300)
+        fd = self.pack._fds[1]
+        self.pack.put('replaced', b'R' * 300)   # Segment 1 is garbage.
+        other = PackFile(store.pack_path(self.volume), segment_size=256)
+        self.assertGreater(self.compact(other), 0)
+        with mock.patch.object(pack, 'FD_CHECK_INTERVAL', 0), \
+                mock.patch.object(pack.os, 'close', wraps=os.close) as close:
+            self.assertEqual(self.pack.get('replaced'), b'R' * 300)
+            self.assertNotIn(1, self.pack._fds)
+            close.assert_not_called()   # In case it is still being read.
+            self.assertEqual(self.pack.get('kept'), b'k' * 300)
+            close.assert_called_once_with(fd)
+
+    def test_network_volume(self):
+        """Pack storage is not used on a network filesystem."""
+        mounts = f'/dev/sda1 / ext4 rw 0 0\n' \
+            f'server:/export {self.volume} nfs4 rw 0 0\n'
+        with mock.patch.object(pack, 'open', mock.mock_open(read_data=mounts),
+                               create=True):
+            self.assertEqual(pack.network_filesystem(self.volume), 'nfs4')
+            with self.assertRaises(store.ConfigurationError):
+                store.PackStorage(self.volume, self.pack)
+
+    def test_concurrent_compaction(self):
+        """Only one process compacts a pack at a time."""
+        with open(os.path.join(store.pack_path(self.volume),
+                               'compact.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.assertEqual(self.pack.compact(), 0)
+
+    def test_migrate(self):
+        """Extractions on the filesystem are copied to the pack."""
+        files = store.Storage(self.volume)
+        files.store(self.extraction('0.3'), SupportedFormats.PLAIN)
+        meta_path = os.path.join(self.volume, 'arxiv', '1901', '1901.00123',
+                                 '0.3', 'meta.json')
+        self.assertEqual(self.storage.migrate(), 2)
+        self.assertEqual(self.storage.retrieve('1901.00123').content,
+                         'föcontent')
+        self.assertEqual(self.storage._stat(meta_path).st_mtime_ns,
+                         os.stat(meta_path).st_mtime_ns)
+
+
+class TestIterExtractions(TestCase):
+    """The extractions on the storage volume are enumerated."""
+
+    def setUp(self):
+        """We have some extractions, of new- and old-style e-prints."""
+        self.volume = tempfile.mkdtemp()
+        self.storage = store.Storage(self.volume)
+        for identifier, version in [('1901.00123', '0.3'),
+                                    ('1901.00123', '0.4'),
+                                    ('1902.00001', '0.3'),
+                                    ('hep-th/9901001', '0.3')]:
+            self.storage.store(Extraction(
+                identifier=identifier, version=version,
+                bucket=SupportedBuckets.ARXIV, started=datetime.now(UTC),
+                status=Extraction.Status.SUCCEEDED, content='föcontent'
+            ), SupportedFormats.PLAIN)
+        self.storage.store(Extraction(
+            identifier='1902.00002', version='0.4',
+            bucket=SupportedBuckets.ARXIV,
+            status=Extraction.Status.IN_PROGRESS
+        ))
+
+    def tearDown(self):
+        """Remove the volume."""
+        shutil.rmtree(self.volume)
+
+    def test_iter_extractions(self):
+        """All of the extractions in the bucket are found, in order."""
+        found = list(self.storage.iter_extractions(workers=2))
+        self.assertEqual([(e.identifier, e.version) for e in found],
+                         [('1901.00123', '0.3'), ('1901.00123', '0.4'),
+                          ('1902.00001', '0.3'), ('1902.00002', '0.4'),
+                          ('hep-th/9901001', '0.3')])
+        self.assertEqual(found[0].formats, {'plain': None})
+        self.assertEqual(found[3].formats, {})
+        self.assertIsNone(found[0].extraction)
+        self.assertEqual(list(self.storage.iter_extractions('submission')),
+                         [])
+
+    def test_filtered(self):
+        """Extractions are found by prefix, version and format."""
+        found = self.storage.iter_extractions(prefix='1902', version='0.4')
+        self.assertEqual([e.identifier for e in found], ['1902.00002'])
+        found = self.storage.iter_extractions(version='0.4',
+                                              formats=['plain'])
+        self.assertEqual([e.identifier for e in found], ['1901.00123'])
+        found = self.storage.iter_extractions(prefix='hep-th/9901')
+        self.assertEqual([e.identifier for e in found], ['hep-th/9901001'])
+        with self.assertRaises(ValueError):
+            list(self.storage.iter_extractions(prefix='../foo'))
+
+    def test_meta(self):
+        """The metadata records are read if requested, but not content."""
+        with mock.patch.object(self.storage, '_read',
+                               wraps=self.storage._read) as mock_read:
+            found = list(self.storage.iter_extractions(prefix='1902',
+                                                       meta=True))
+        self.assertEqual([e.extraction.status for e in found],
+                         [Extraction.Status.SUCCEEDED,
+                          Extraction.Status.IN_PROGRESS])
+        self.assertTrue(all(call[0][0].endswith('meta.json')
+                            for call in mock_read.call_args_list))
+
+    def test_pack(self):
+        """Extractions are found in a pack in the same way."""
+        pack = store.PackStorage(
+            self.volume, PackFile(store.pack_path(self.volume))
+        )
+        pack.migrate()
+        self.assertEqual(list(pack.iter_extractions(meta=True)),
+                         list(self.storage.iter_extractions(meta=True)))
@@ -0,0 +1,142 @@
+"""Tests for :mod:`fulltext.services.util`."""
+
+import io
+import shutil
+import hashlib
+from unittest import TestCase, mock
+
+from flask import Flask
+
+from .util import PooledIntegration, ReadWrapper, content_length
+
+
+def chunks(*content):
+    """Make an ``iter_content`` that yields ``content`` in chunks."""
+    def iter_content(size):
+        return iter(content)
+    return iter_content
+
+
+class TestReadWrapper(TestCase):
+    """A response body is read as a buffered file."""
+
+    def test_read_size(self):
+        """``read(n)`` returns ``n`` bytes, regardless of the chunk size."""
+        stream = ReadWrapper(chunks(b'foo', b'', b'barbaz', b'qux'), 4)
+        self.assertEqual(stream.read(5), b'fooba')
+        self.assertEqual(stream.read(2), b'rb')
+        self.assertEqual(stream.read(), b'azqux')
+        self.assertEqual(stream.read(), b'')
+
+    def test_readinto(self):
+        """Content is read into a preallocated buffer."""
+        stream = ReadWrapper(chunks(b'foo', b'barbaz'), 4)
+        buffer = bytearray(16)
+        received = b''
+        while True:
+            read = stream.readinto(buffer)
+            if not read:
+                break
+            received += bytes(buffer[:read])
+        self.assertEqual(received, b'foobarbaz')
+
+    def test_readline(self):
+        """Lines can span chunks."""
+        stream = ReadWrapper(chunks(b'%PDF-1.4\n%', b'\xe2\xe3\n', b'1 0 obj'))
+        self.assertEqual(list(stream),
+                         [b'%PDF-1.4\n', b'%\xe2\xe3\n', b'1 0 obj'])
+
+    def test_file_semantics(self):
+        """The stream can be used like any other binary file."""
+        stream = ReadWrapper(chunks(b'foo', b'content'), 4)
+        target = io.BytesIO()
+        shutil.copyfileobj(stream, target, 3)
+        self.assertEqual(target.getvalue(), b'foocontent')
+
+        stream = ReadWrapper(chunks(b'foo', b'content'), 4)
+        self.assertEqual(hashlib.md5(stream.read()).hexdigest(),
+                         hashlib.md5(b'foocontent').hexdigest())
+
+    def test_counters(self):
+        """Bytes read and time spent waiting are counted."""
+        stream = ReadWrapper(chunks(b'foo', b'content'), 4, 10)
+        stream.read()
+        self.assertEqual(stream.bytes_read, 10)
+        self.assertEqual(stream.content_length, 10)
+        self.assertGreaterEqual(stream.elapsed, 0.)
+
+    def test_close(self):
+        """Closing the stream releases the response."""
+        on_close = mock.MagicMock()
+        with ReadWrapper(chunks(b'foo'), on_close=on_close) as stream:
+            self.assertFalse(stream.seekable())
+        self.assertEqual(on_close.call_count, 1)
+
+
+class TestContentLength(TestCase):
+    """The length of a response body is taken from its headers."""
+
+    def test_declared(self):
+        """The response declares its length."""
+        self.assertEqual(content_length({'Content-Length': '3'}), 3)
+        self.assertEqual(content_length({'Content-Length': '3',
+                                         'Content-Encoding': 'identity'}), 3)
+
+    def test_not_declared(self):
+        """The response does not declare a (valid) length."""
+        self.assertIsNone(content_length({}))
+        self.assertIsNone(content_length({'Content-Length': 'foo'}))
+
+    def test_encoded(self):
+        """The declared length is of the encoded body."""
+        self.assertIsNone(content_length({'Content-Length': '3',
+                                          'Content-Encoding': 'gzip'}))
+
+
+class FooIntegration(PooledIntegration):
+    """An integration with a fake service."""
+
+    class Meta:
+        """Configuration for :class:`FooIntegration`."""
+
+        service_name = 'foo'
+
+
+class TestPooledIntegration(TestCase):
+    """Connections and ``HEAD`` results are reused."""
+
+    def setUp(self):
+        """Create an app."""
+        self.app = Flask('foo')
+        FooIntegration.init_app(self.app)
+        self.app.config.update({'FOO_ENDPOINT': 'https://foo.org/',
+                                'FOO_POOL_SIZE': 3, 'FOO_HEAD_TTL': 60})
+
+    def test_reused_across_contexts(self):
+        """The same instance is used for each application context."""
+        with self.app.app_context():
+            first = FooIntegration.current_session()
+        with self.app.app_context():
+            self.assertIs(FooIntegration.current_session(), first)
+        self.assertEqual(first._adapter._pool_maxsize, 3)
+
+    def test_not_reused_after_fork(self):
+        """A child process gets its own instance."""
+        with self.app.app_context():
+            first = FooIntegration.current_session()
+            with mock.patch('os.getpid', return_value=-1):
+                self.assertIsNot(FooIntegration.current_session(), first)
+
+    def test_cached_head(self):
+        """Results are cached until they expire."""
+        request = mock.MagicMock(side_effect=[True, False])
+        with self.app.app_context():
+            foo = FooIntegration.current_session()
+            self.assertTrue(foo._cached_head('bar', request))
+            self.assertTrue(foo._cached_head('bar', request))
+            with mock.patch('time.monotonic', return_value=1e12):
+                self.assertFalse(foo._cached_head('bar', request))
+            stats = foo.stats()
+        self.assertEqual(stats['head_hits'], 1)
+        self.assertEqual(stats['head_misses'], 2)
+        self.assertEqual(stats['pools'], {})
@@ -1,30 +1,242 @@
 """Helpers for service modules."""
 
 import io
-from typing import Callable, Iterator, Any
+import os
+import time
+import socket
+import weakref
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Mapping, \
+    Optional, Tuple, TypeVar, Union
 from typing_extensions import Literal
+from urllib.parse import urlparse
 
+from flask import Flask, current_app
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
 
-class ReadWrapper(io.BytesIO):
-    """Wraps a response body streaming iterator to provide ``read()``."""
+from arxiv.integration.api import service
+
+Buffer = Union[bytearray, memoryview]
+T = TypeVar('T')
+
+
+def content_length(headers: Mapping[str, str]) -> Optional[int]:
+    """
+    Get the declared length of a response body, if any.
+
+    If the body has a ``Content-Encoding`` (e.g. gzip), ``Content-Length`` is
+    the length of the encoded body, whereas ``iter_content`` yields the
+    decoded body; in that case the length of the content is not known.
+    """
+    if headers.get('Content-Encoding', 'identity') != 'identity':
+        return None
+    try:
+        return int(headers['Content-Length'])
+    except (KeyError, ValueError):
+        return None
+
+
+class ResponseStream(io.RawIOBase):
+    """
+    Raw, non-seekable stream over the chunks of a response body.
+
+    Chunks are copied straight into the caller's buffer by :meth:`readinto`,
+    without being sliced or joined. The stream also counts what it reads, and
+    how long it spends waiting for the next chunk.
+    """
 
     def __init__(self, iter_content: Callable[[int], Iterator[bytes]],
-                 size: int = 4096) -> None:
+                 size: int = 4096,
+                 on_close: Optional[Callable[[], None]] = None) -> None:
         """Initialize the streaming iterator."""
-        self._iter_content = iter_content(size)
-
-    def seekable(self) -> Literal[False]:
-        """Indicate that this is a non-seekable stream."""
-        return False
+        super(ResponseStream, self).__init__()
+        self._chunks = iter_content(size)
+        self._pending = memoryview(b'')
+        self._on_close = on_close
+        self.bytes_read = 0
+        """Number of bytes read from the response so far."""
+        self.chunks_read = 0
+        """Number of chunks read from the response so far."""
+        self.elapsed = 0.
+        """Time (in seconds) spent waiting for chunks to arrive."""
 
     def readable(self) -> Literal[True]:
         """Indicate that it *is* a readable stream."""
         return True
 
-    def read(self, *args: Any, **kwargs: Any) -> bytes:
+    def readinto(self, buffer: Buffer) -> int:
+        """
+        Read at most ``len(buffer)`` bytes into ``buffer``.
+
+        Returns the number of bytes read, which is 0 at the end of the stream.
+        """
+        while not self._pending:
+            start = time.monotonic()
+            chunk = next(self._chunks, None)
+            self.elapsed += time.monotonic() - start
+            if chunk is None:
+                return 0
+            self.chunks_read += 1
+            self._pending = memoryview(chunk)
+        target = memoryview(buffer).cast('B')
+        size = min(len(target), len(self._pending))
+        target[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self.bytes_read += size
+        return size
+
+    def close(self) -> None:
+        """Close the stream, and release the underlying response."""
+        if not self.closed and self._on_close is not None:
+            self._on_close()
+        super(ResponseStream, self).close()
+
+
+class ReadWrapper(io.BufferedReader):
+    """
+    Wraps a response body streaming iterator to provide a readable file.
+
+    Supports the usual buffered file semantics, e.g. ``read(n)``,
+    ``readinto()`` and ``readline()``, so the content can be handed to
+    anything that expects a binary file (e.g. :func:`shutil.copyfileobj` or
+    :mod:`hashlib`).
+    """
+
+    def __init__(self, iter_content: Callable[[int], Iterator[bytes]],
+                 size: int = 4096,
+                 content_length: Optional[int] = None,
+                 on_close: Optional[Callable[[], None]] = None,
+                 etag: Optional[str] = None) -> None:
+        """Initialize the streaming iterator."""
+        super(ReadWrapper, self).__init__(
+            ResponseStream(iter_content, size, on_close),
+            buffer_size=size
+        )
+        self.content_length = content_length
+        """Length of the content, if the response declared it."""
+        self.etag = etag
+        """ETag of the content, if the response declared it."""
+
+    @property
+    def bytes_read(self) -> int:
+        """Number of bytes read from the response so far."""
+        return self.raw.bytes_read      # type: ignore
+
+    @property
+    def elapsed(self) -> float:
+        """Time (in seconds) spent waiting for the response."""
+        return self.raw.elapsed     # type: ignore
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """Transport adapter that sets options on the sockets that it opens."""
+
+    def __init__(self, socket_options: List[Tuple[int, int, int]],
+                 **kwargs: Any) -> None:
+        """Set the socket options; ``kwargs`` are passed to the adapter."""
+        self._socket_options = socket_options
+        super(KeepAliveAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize the pool manager with our socket options."""
+        kwargs['socket_options'] = self._socket_options
+        super(KeepAliveAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+class PooledIntegration(service.HTTPIntegration):
+    """
+    HTTP integration that reuses its connections for the life of the process.
+
+    :class:`.HTTPIntegration` keeps its session on the application context,
+    which in the web app only lasts for a single request, so every request
+    opened new connections (and did a new TLS handshake). Here one instance
+    is kept per application and process, and its connection pool is sized by
+    ``{SERVICE}_POOL_SIZE``.
+
+    Results of ``HEAD`` requests made with :meth:`_cached_head` are kept for
+    ``{SERVICE}_HEAD_TTL`` seconds, so that repeated checks (e.g. whether a
+    PDF exists) do not go back to the service every time.
+    """
+
+    HEAD_CACHE_SIZE = 4096
+    """Maximum number of ``HEAD`` results to keep."""
+
+    _instances: 'weakref.WeakKeyDictionary[Flask, Dict[type, Any]]' = \
+        weakref.WeakKeyDictionary()
+    """Instances for each application, by class, with the owning PID."""
+
+    def __init__(self, endpoint: str, verify: bool = True,
+                 headers: dict = {}, pool_size: int = 10,
+                 keepalive: bool = True, head_ttl: float = 30.,
+                 **extra: Any) -> None:
+        """Initialize an HTTP session with a pool of persistent connections."""
+        super(PooledIntegration, self).__init__(endpoint, verify=verify,
+                                                headers=headers, **extra)
+        options = list(HTTPConnection.default_socket_options)
+        if keepalive:   # Detect dead connections while they are idle.
+            options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        self._adapter = KeepAliveAdapter(options, pool_connections=4,
+                                         pool_maxsize=int(pool_size),
+                                         max_retries=self._retry)
+        self._session.mount(f'{urlparse(endpoint).scheme}://', self._adapter)
+        self._head_ttl = float(head_ttl)
+        self._heads: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._heads_lock = threading.Lock()
+        self.head_hits = 0
+        """Number of ``HEAD`` results that were served from the cache."""
+        self.head_misses = 0
+        """Number of ``HEAD`` results that had to be requested."""
+
+    def _cached_head(self, key: Hashable, request: Callable[[], T]) -> T:
+        """Get the result of a ``HEAD`` request, from the cache if fresh."""
+        now = time.monotonic()
+        with self._heads_lock:
+            cached = self._heads.get(key)
+            if cached is not None and cached[0] > now:
+                self.head_hits += 1
+                return cached[1]    # type: ignore
+            self.head_misses += 1
+        result = request()
+        with self._heads_lock:
+            self._heads[key] = (now + self._head_ttl, result)
+            self._heads.move_to_end(key)
+            while len(self._heads) > self.HEAD_CACHE_SIZE:
+                self._heads.popitem(last=False)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
         """
-        Read the next chunk of the content stream.
+        Get metrics about the reuse of connections and ``HEAD`` results.
 
-        Arguments are ignored, since the chunk size must be set at the start.
+        For each connection pool (i.e. host), ``requests`` is the number of
+        requests made and ``connections`` the number of connections opened,
+        so any difference between them is requests that reused a connection.
         """
-        return next(self._iter_content, b'')
\ No newline at end of file
+        pools = {}
+        for key in self._adapter.poolmanager.pools.keys():
+            pool = self._adapter.poolmanager.pools[key]
+            requests = pool.num_requests
+            connections = pool.num_connections
+            pools[f'{key.key_scheme}://{key.key_host}:{key.key_port}'] = {
+                'requests': requests,
+                'connections': connections,
+                'reused': max(requests - connections, 0)
+            }
+        return {
+            'pools': pools,
+            'head_hits': self.head_hits,
+            'head_misses': self.head_misses
+        }
+
+    @classmethod
+    def current_session(cls) -> 'PooledIntegration':
+        """Get or create the instance for this application and process."""
+        app = current_app._get_current_object()   # type: ignore
+        instances = cls._instances.setdefault(app, {})
+        pid, instance = instances.get(cls, (None, None))
+        if instance is None or pid != os.getpid():  # Do not share after fork.
+            instance = cls.get_session(app)     # type: ignore
+            instances[cls] = (os.getpid(), instance)
+        return instance
@@ -1,11 +1,22 @@
 """Tests for :mod:`fulltext.controllers`."""
 
+import io
+import os
+import gzip
+import json
+import shutil
+import tarfile
+import tempfile
 from http import HTTPStatus as status
 from unittest import TestCase, mock
 
-from werkzeug.exceptions import InternalServerError
+from flask import Flask
+from werkzeug.exceptions import InternalServerError, BadRequest, NotFound
 
-from .. import controllers
+from .. import controllers, extract
+from ..domain import Extraction
+from ..services import store
+from ..services.store import Storage
 
 
 class TestStatusEndpoint(TestCase):
@@ -50,3 +61,398 @@ class TestStatusEndpoint(TestCase):
 
         with self.assertRaises(InternalServerError):
             controllers.service_status()
+
+
+@mock.patch(f'{controllers.__name__}.url_for',
+            lambda endpoint, **kwargs: f'/{kwargs["identifier"]}/status')
+@mock.patch(f'{controllers.__name__}.extract')
+@mock.patch(f'{controllers.__name__}.store.Storage')
+@mock.patch(f'{controllers.__name__}.legacy.CanonicalPDF')
+class TestStartExtractions(TestCase):
+    """Tests for :func:`.controllers.start_extractions`."""
+
+    def setUp(self):
+        """Create an app."""
+        self.app = Flask('foo')
+        self.app.config['BATCH_MAX_SIZE'] = 5
+
+    def test_batch(self, mock_CanonicalPDF, mock_Storage, mock_extract):
+        """Each identifier gets its own outcome."""
+        mock_canonical = mock_CanonicalPDF.current_session.return_value
+        mock_canonical.exists.side_effect = \
+            lambda identifier: identifier != '1234.00002'
+        mock_storage = mock_Storage.current_session.return_value
+        mock_storage.retrieve_many.side_effect = lambda ids, bucket, workers: {
+            i: Extraction(identifier=i, version='0.3',
+                          status=Extraction.Status.SUCCEEDED)
+            if i == '1234.00003' else None
+            for i in ids
+        }
+        with self.app.app_context():
+            data, code, _ = controllers.start_extractions(
+                ['1234.00001', '1234.00002', '1234.00003', 'foo',
+                 '1234.00001'],
+                'footoken'
+            )
+        self.assertEqual(code, status.OK)
+        results = data['results']
+        self.assertEqual(results['1234.00001']['status'], status.ACCEPTED)
+        self.assertEqual(results['1234.00001']['location'],
+                         '/1234.00001/status')
+        self.assertEqual(results['1234.00002']['status'], status.NOT_FOUND)
+        self.assertEqual(results['1234.00003']['status'], status.SEE_OTHER)
+        self.assertEqual(results['foo']['status'], status.BAD_REQUEST)
+
+        # Only the new extraction is created, and only once.
+        mock_extract.create_tasks.assert_called_once_with(
+            ['1234.00001'], 'arxiv', None, 'footoken'
+        )
+        self.assertEqual(mock_storage.retrieve_many.call_count, 1)
+
+    def test_force(self, mock_CanonicalPDF, mock_Storage, mock_extract):
+        """Existing extractions are not checked."""
+        mock_canonical = mock_CanonicalPDF.current_session.return_value
+        mock_canonical.exists.return_value = True
+        with self.app.app_context():
+            data, _, _ = controllers.start_extractions(['1234.00001'],
+                                                       'footoken', force=True)
+        self.assertEqual(data['results']['1234.00001']['status'],
+                         status.ACCEPTED)
+        mock_Storage.current_session.return_value.retrieve_many \
+            .assert_not_called()
+
+    def test_broker_fails(self, mock_CanonicalPDF, mock_Storage,
+                          mock_extract):
+        """The tasks that were published before a failure are accepted."""
+        mock_canonical = mock_CanonicalPDF.current_session.return_value
+        mock_canonical.exists.return_value = True
+        mock_extract.TaskCreationFailed = extract.TaskCreationFailed
+        mock_extract.create_tasks.side_effect = \
+            extract.TaskCreationFailed('nope', created=['1234.00001'])
+        with self.app.app_context():
+            data, code, _ = controllers.start_extractions(
+                ['1234.00001', '1234.00002'], 'footoken', force=True
+            )
+        self.assertEqual(code, status.OK)
+        results = data['results']
+        self.assertEqual(results['1234.00001']['status'], status.ACCEPTED)
+        self.assertEqual(results['1234.00002']['status'],
+                         status.INTERNAL_SERVER_ERROR)
+
+    def test_nothing_to_start(self, mock_CanonicalPDF, mock_Storage,
+                              mock_extract):
+        """No tasks are created if there are no new extractions."""
+        mock_canonical = mock_CanonicalPDF.current_session.return_value
+        mock_canonical.exists.return_value = False
+        with self.app.app_context():
+            data, _, _ = controllers.start_extractions(['1234.00001'],
+                                                       'footoken')
+        self.assertEqual(data['results']['1234.00001']['status'],
+                         status.NOT_FOUND)
+        mock_extract.create_tasks.assert_not_called()
+
+    def test_too_many(self, mock_CanonicalPDF, mock_Storage, mock_extract):
+        """The batch is too large."""
+        with self.app.app_context():
+            with self.assertRaises(BadRequest):
+                controllers.start_extractions(['1234.00001'] * 6, 'footoken')
+
+    def test_not_a_list(self, mock_CanonicalPDF, mock_Storage, mock_extract):
+        """The identifiers are not a list."""
+        with self.app.app_context():
+            with self.assertRaises(BadRequest):
+                controllers.start_extractions('1234.00001', 'footoken')
+
+
+@mock.patch(f'{controllers.__name__}.store.Storage')
+class TestRetrieveMany(TestCase):
+    """Tests for :func:`.controllers.retrieve_many`."""
+
+    def setUp(self):
+        """Create an app, and some extractions in storage."""
+        self.app = Flask('foo')
+        self.volume = tempfile.mkdtemp()
+        self.storage = Storage(self.volume, compression={'psv': 'gzip'})
+        for identifier in ['1901.00001', 'hep-th/9901001']:
+            extraction = Extraction(identifier=identifier, version='0.3',
+                                    content=f'{identifier} tëxt',
+                                    status=Extraction.Status.SUCCEEDED)
+            self.storage.store(extraction, 'plain')
+            self.storage.store(extraction, 'psv')
+
+    def tearDown(self):
+        """Remove the storage volume."""
+        shutil.rmtree(self.volume)
+
+    def test_ndjson(self, mock_Storage):
+        """Extractions are streamed as JSON lines."""
+        mock_Storage.current_session.return_value = self.storage
+        with self.app.app_context():
+            data, code, headers = controllers.retrieve_many(
+                ['1901.00001', '1901.00002', 'hep-th/9901001']
+            )
+            lines = [json.loads(line) for line in b''.join(data).splitlines()]
+        self.assertEqual(code, status.OK)
+        self.assertEqual(headers['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(lines[0]['content'], '1901.00001 tëxt')
+        self.assertEqual(lines[0]['status'], 'succeeded')
+        self.assertEqual(lines[1], {'identifier': '1901.00002',
+                                    'error': 'No such extraction'})
+        self.assertEqual(lines[2]['identifier'], 'hep-th/9901001')
+
+    def test_tar(self, mock_Storage):
+        """Extractions are streamed as a tar archive."""
+        mock_Storage.current_session.return_value = self.storage
+        for content_fmt in ['plain', 'psv']:      # psv is compressed.
+            with self.app.app_context():
+                data, _, headers = controllers.retrieve_many(
+                    prefix='1901', content_fmt=content_fmt, archive=True
+                )
+                content = b''.join(data)
+            self.assertEqual(headers['Content-Type'], 'application/x-tar')
+            self.assertEqual(len(content) % tarfile.RECORDSIZE, 0)
+            name = f'1901.00001.{content_fmt}'
+            with tarfile.open(fileobj=io.BytesIO(content)) as archive:
+                self.assertEqual(archive.getnames(), [name])
+                self.assertEqual(archive.extractfile(name).read(),
+                                 '1901.00001 tëxt'.encode('utf-8'))
+
+    def test_streamed(self, mock_Storage):
+        """Extractions are not retrieved until they are needed."""
+        mock_store = mock.MagicMock(wraps=self.storage)
+        mock_Storage.current_session.return_value = mock_store
+        with self.app.app_context():
+            data, _, _ = controllers.retrieve_many(['1901.00001'] * 10)
+            next(data)
+        self.assertEqual(mock_store.retrieve_chunks.call_count, 1)
+
+    def test_bad_identifier(self, mock_Storage):
+        """Identifiers that are not arXiv identifiers are rejected."""
+        mock_store = mock.MagicMock(wraps=self.storage)
+        mock_Storage.current_session.return_value = mock_store
+        for bad in ['../submission/1234/abcd',
+                    'hep-th/9901001/../../../submission/1234/abcd']:
+            with self.app.app_context():
+                with self.assertRaises(BadRequest):
+                    controllers.retrieve_many(['1901.00001', bad])
+        self.assertEqual(mock_store.retrieve_chunks.call_count, 0)
+
+    def test_bad_prefix(self, mock_Storage):
+        """The prefix is not a month."""
+        mock_store = mock_Storage.current_session.return_value
+        mock_store.list_identifiers.side_effect = ValueError
+        with self.app.app_context():
+            with self.assertRaises(BadRequest):
+                controllers.retrieve_many(prefix='foo')
+
+
+def serve_files(mock_store):
+    """Serve content from the filesystem, as :class:`.Storage` does."""
+    files = Storage(tempfile.gettempdir())
+    mock_store.serves_files = True
+    mock_store.content_stat.side_effect = files.content_stat
+    mock_store.content_encoding.side_effect = files.content_encoding
+    mock_store.open_content.side_effect = files.open_content
+
+
+@mock.patch(f'{controllers.__name__}.url_for',
+            lambda endpoint, **kwargs: f'/{kwargs["identifier"]}/status')
+@mock.patch(f'{controllers.__name__}.store.Storage')
+class TestRetrieveFile(TestCase):
+    """Tests for :func:`.controllers.retrieve_file`."""
+
+    def setUp(self):
+        """Create an app, and some content."""
+        self.app = Flask('foo')
+        fd, self.path = tempfile.mkstemp()
+        with open(fd, 'w') as f:
+            f.write('foo content')
+
+    def tearDown(self):
+        """Remove the content."""
+        os.remove(self.path)
+
+    def extraction(self, mock_Storage, status):
+        """Make an extraction with this status."""
+        mock_store = mock_Storage.current_session.return_value
+        serve_files(mock_store)
+        mock_store.retrieve.return_value = Extraction(
+            identifier='1901.00001', version='0.3', status=status
+        )
+        return mock_store
+
+    def test_content_exists(self, mock_Storage):
+        """The path to the content is returned, without loading it."""
+        mock_store = self.extraction(mock_Storage,
+                                     Extraction.Status.SUCCEEDED)
+        mock_store.content_path.return_value = self.path
+        with self.app.app_context():
+            path, code, headers = controllers.retrieve_file('1901.00001')
+        self.assertEqual(code, status.OK)
+        self.assertEqual(path, self.path)
+        self.assertTrue(headers['ETag'].startswith('"0.3-'))
+        self.assertIn('Last-Modified', headers)
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=60')
+        self.assertTrue(mock_store.retrieve.call_args[1]['meta_only'])
+        mock_store.content_path.assert_called_once_with(
+            '1901.00001', '0.3', 'plain', 'arxiv'
+        )
+
+    def test_compressed(self, mock_Storage):
+        """Compressed content is sent as-is if the client accepts it."""
+        mock_store = self.extraction(mock_Storage,
+                                     Extraction.Status.SUCCEEDED)
+        mock_store.content_path.return_value = f'{self.path}.gz'
+        with gzip.open(f'{self.path}.gz', 'wb') as f:
+            f.write(b'foo content')
+        self.addCleanup(os.remove, f'{self.path}.gz')
+
+        with self.app.app_context():
+            path, code, headers = controllers.retrieve_file(
+                '1901.00001', accept_encodings={'gzip', 'br'}
+            )
+        self.assertEqual(path, f'{self.path}.gz')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertTrue(headers['ETag'].endswith('-gzip"'))
+
+        with self.app.app_context():
+            content, code, headers = controllers.retrieve_file('1901.00001')
+        with content:
+            self.assertEqual(content.read(), b'foo content')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertFalse(headers['ETag'].endswith('-gzip"'))
+
+    def test_in_progress(self, mock_Storage):
+        """The client is redirected to the task status."""
+        mock_store = self.extraction(mock_Storage,
+                                     Extraction.Status.IN_PROGRESS)
+        mock_store.content_path.side_effect = store.DoesNotExist
+        with self.app.app_context():
+            data, code, headers = controllers.retrieve_file('1901.00001')
+        self.assertEqual(code, status.SEE_OTHER)
+        self.assertEqual(headers['Location'], '/1901.00001/status')
+
+    def test_no_content(self, mock_Storage):
+        """The extraction failed, so there is no content."""
+        mock_store = self.extraction(mock_Storage, Extraction.Status.FAILED)
+        mock_store.content_path.side_effect = store.DoesNotExist
+        with self.app.app_context():
+            with self.assertRaises(NotFound):
+                controllers.retrieve_file('1901.00001')
+
+
+@mock.patch(f'{controllers.__name__}.url_for',
+            lambda endpoint, **kwargs: f'/{kwargs["identifier"]}/status')
+@mock.patch(f'{controllers.__name__}.store.Storage')
+class TestRetrieve(TestCase):
+    """Tests for :func:`.controllers.retrieve`."""
+
+    def setUp(self):
+        """Create an app, and some content."""
+        self.app = Flask('foo')
+        fd, self.path = tempfile.mkstemp()
+        with open(fd, 'w') as f:
+            f.write('foo content')
+
+    def tearDown(self):
+        """Remove the content."""
+        os.remove(self.path)
+
+    def extraction(self, mock_Storage, status, bucket='arxiv'):
+        """Make an extraction with this status, and content."""
+        mock_store = mock_Storage.current_session.return_value
+        mock_store.retrieve.side_effect = \
+            lambda *args, meta_only=False: Extraction(
+                identifier='1901.00001', version='0.3', status=status,
+                bucket=bucket, content=None if meta_only else 'foo content'
+            )
+        mock_store.content_path.return_value = self.path
+        serve_files(mock_store)
+        return mock_store
+
+    def test_validators(self, mock_Storage):
+        """The content has a strong ETag, that differs from the file's."""
+        self.extraction(mock_Storage, Extraction.Status.SUCCEEDED)
+        with self.app.app_context():
+            data, code, headers = controllers.retrieve('1901.00001')
+            _, _, file_headers = controllers.retrieve_file('1901.00001')
+        self.assertEqual(code, status.OK)
+        self.assertEqual(data['content'], 'foo content')
+        self.assertTrue(headers['ETag'].startswith('"0.3-'))
+        self.assertNotEqual(headers['ETag'], file_headers['ETag'])
+        self.assertEqual(headers['Last-Modified'],
+                         file_headers['Last-Modified'])
+        self.assertEqual(headers['Vary'], 'Accept, Accept-Encoding')
+
+        os.utime(self.path, (0, 0))
+        with self.app.app_context():
+            _, _, changed = controllers.retrieve('1901.00001')
+        self.assertNotEqual(changed['ETag'], headers['ETag'])
+
+    def test_versioned(self, mock_Storage):
+        """A version of a successful extraction never changes."""
+        self.extraction(mock_Storage, Extraction.Status.SUCCEEDED)
+        with self.app.app_context():
+            _, _, headers = controllers.retrieve('1901.00001', version='0.3')
+        self.assertEqual(headers['Cache-Control'],
+                         'public, max-age=31536000, immutable')
+
+    def test_submission(self, mock_Storage):
+        """The content of submissions is only cached by the client."""
+        self.extraction(mock_Storage, Extraction.Status.SUCCEEDED,
+                        bucket='submission')
+        with self.app.app_context():
+            _, _, headers = controllers.retrieve('1234/foohash',
+                                                 id_type='submission')
+        self.assertTrue(headers['Cache-Control'].startswith('private'))
+
+    def test_not_modified(self, mock_Storage):
+        """The client has the content already, so it is not loaded."""
+        mock_store = self.extraction(mock_Storage,
+                                     Extraction.Status.SUCCEEDED)
+        is_modified = mock.MagicMock(return_value=False)
+        with self.app.app_context():
+            data, code, headers = controllers.retrieve(
+                '1901.00001', is_modified=is_modified
+            )
+        self.assertEqual(code, status.NOT_MODIFIED)
+        self.assertEqual(is_modified.call_args[0][0], headers)
+        self.assertEqual(mock_store.retrieve.call_count, 1)
+        self.assertTrue(mock_store.retrieve.call_args[1]['meta_only'])
+
+    def test_modified(self, mock_Storage):
+        """The client's copy is out of date, so the content is loaded."""
+        self.extraction(mock_Storage, Extraction.Status.SUCCEEDED)
+        with self.app.app_context():
+            data, code, _ = controllers.retrieve(
+                '1901.00001', is_modified=lambda headers: True
+            )
+        self.assertEqual(code, status.OK)
+        self.assertEqual(data['content'], 'foo content')
+
+    def test_streamed(self, mock_Storage):
+        """The JSON document is streamed, without loading the content."""
+        mock_store = self.extraction(mock_Storage,
+                                     Extraction.Status.SUCCEEDED)
+        content = 'fö "content"\n'.encode('utf-8')
+        mock_store.retrieve_chunks.return_value = (
+            mock_store.retrieve('1901.00001', meta_only=True),
+            iter([content[:2], content[2:]])     # Splits the ö.
+        )
+        with self.app.app_context():
+            data, code, _ = controllers.retrieve('1901.00001', stream=True)
+            streamed = json.loads(b''.join(data))
+        self.assertEqual(code, status.OK)
+        self.assertEqual(streamed['content'], 'fö "content"\n')
+        self.assertEqual(streamed['status'], 'succeeded')
+        self.assertEqual(mock_store.retrieve.call_count, 2)   # Both meta_only.
+
+    def test_no_content(self, mock_Storage):
+        """The extraction failed; there is nothing to validate or cache."""
+        mock_store = self.extraction(mock_Storage, Extraction.Status.FAILED)
+        mock_store.content_path.side_effect = store.DoesNotExist
+        with self.app.app_context():
+            data, code, headers = controllers.retrieve('1901.00001')
+        self.assertEqual(code, status.OK)
+        self.assertEqual(data['status'], 'failed')
+        self.assertEqual(headers, {})
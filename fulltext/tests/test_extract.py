@@ -6,10 +6,12 @@ import tempfile
 from unittest import TestCase, mock
 
 from flask import Flask
+from celery.exceptions import Retry
 
 from arxiv.integration.api.exceptions import NotFound
 
-from ..services import extractor
+from ..domain import Extraction
+from ..services import extractor, legacy
 from .. import extract
 
 
@@ -127,3 +129,174 @@ class TestExtract(TestCase):
 
 
 
+
+
+class ChunkedStream(io.BytesIO):
+    """A stream that records the size of each read."""
+
+    def __init__(self, content, content_length=None):
+        """Initialize with some content, and perhaps its declared length."""
+        super(ChunkedStream, self).__init__(content)
+        self.content_length = content_length
+        self.reads = []
+
+    def readinto(self, buffer):
+        """Read at most ``len(buffer)`` bytes into ``buffer``."""
+        self.reads.append(len(buffer))
+        return super(ChunkedStream, self).readinto(buffer)
+
+
+class TestCreateTasks(TestCase):
+    """Extraction tasks are created for many papers at once."""
+
+    def setUp(self):
+        """Create an app."""
+        self.app = Flask('foo')
+        self.app.config['EXTRACTOR_VERSION'] = '5.6.7'
+
+    @mock.patch(f'{extract.__name__}.store.Storage', mock.MagicMock())
+    @mock.patch(f'{extract.__name__}.get_or_create_worker_app')
+    def test_broker_fails(self, mock_get_app):
+        """The broker fails after some of the tasks are published."""
+        mock_app = mock_get_app.return_value
+        mock_app.send_task.side_effect = [None, ConnectionError('nope')]
+        with self.app.app_context():
+            with self.assertRaises(extract.TaskCreationFailed) as e:
+                extract.create_tasks(['1234.00001', '1234.00002',
+                                      '1234.00003'], 'arxiv')
+        self.assertEqual(e.exception.created, ['1234.00001'])
+
+    @mock.patch(f'{extract.__name__}.store.Storage', mock.MagicMock())
+    @mock.patch(f'{extract.__name__}.get_or_create_worker_app')
+    def test_nothing_to_do(self, mock_get_app):
+        """No connection to the broker is made if there are no papers."""
+        with self.app.app_context():
+            self.assertEqual(extract.create_tasks([], 'arxiv'), [])
+        mock_get_app.return_value.producer_or_acquire.assert_not_called()
+
+
+class TestStorePDF(TestCase):
+    """The PDF is streamed into the working volume."""
+
+    def setUp(self):
+        """Create an app."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = Flask('foo')
+        self.app.config.update({'WORKDIR': self.workdir, 'PDF_CHUNK_SIZE': 4})
+        self.checksum = 'ewrggAHdCT55M1uUfwKLEA=='    # MD5 of b'foocontent'
+
+    def test_stored_in_chunks(self):
+        """The content is read in chunks, rather than all at once."""
+        content = ChunkedStream(b'foocontent', content_length=10)
+        with self.app.app_context():
+            path = extract._store_pdf_in_workdir('1234.56789', 'arxiv',
+                                                 content, self.checksum)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'foocontent')
+        self.assertEqual(content.reads, [4, 4, 4, 4])
+
+    def test_truncated(self):
+        """The content is shorter than its declared length."""
+        content = ChunkedStream(b'foocontent', content_length=20)
+        with self.app.app_context():
+            with self.assertRaises(IOError):
+                extract._store_pdf_in_workdir('1234.56789', 'arxiv', content)
+        self.assertEqual(os.listdir(self.workdir), [],
+                         'The partial PDF is removed')
+
+    def test_checksum_does_not_match(self):
+        """The content does not match the expected checksum."""
+        content = ChunkedStream(b'barcontent')
+        with self.app.app_context():
+            with self.assertRaises(IOError):
+                extract._store_pdf_in_workdir('1234.56789', 'arxiv', content,
+                                              self.checksum)
+        self.assertEqual(os.listdir(self.workdir), [],
+                         'The PDF is removed')
+
+
+class TestRetrieveCanonicalPDF(TestCase):
+    """Canonical PDFs are cached on a local volume."""
+
+    def setUp(self):
+        """Create an app with a PDF cache."""
+        self.app = Flask('foo')
+        self.app.config.update({'PDF_CACHE_VOLUME': tempfile.mkdtemp(),
+                                'PDF_CACHE_SIZE': 1024})
+        self.canonical = mock.MagicMock()
+
+    def retrieve(self):
+        """Retrieve a PDF, and read its content."""
+        with self.app.app_context():
+            content = extract._retrieve_canonical_pdf(self.canonical,
+                                                      '1234.56789', 4)
+            with content:
+                return content.read()
+
+    def test_revalidated(self):
+        """A cached PDF is revalidated rather than downloaded again."""
+        content = io.BytesIO(b'foocontent')
+        content.etag = '"fooetag"'
+        self.canonical.retrieve.return_value = content
+        self.assertEqual(self.retrieve(), b'foocontent')
+        self.assertIsNone(self.canonical.retrieve.call_args[1]['etag'])
+
+        self.canonical.retrieve.side_effect = legacy.NotModified
+        self.assertEqual(self.retrieve(), b'foocontent')
+        self.assertEqual(self.canonical.retrieve.call_args[1]['etag'],
+                         '"fooetag"')
+
+    def test_no_etag(self):
+        """A PDF without an ETag cannot be revalidated, so is not cached."""
+        self.canonical.retrieve.side_effect = \
+            lambda *args, **kwargs: io.BytesIO(b'foocontent')
+        self.assertEqual(self.retrieve(), b'foocontent')
+        self.assertEqual(self.retrieve(), b'foocontent')
+        self.assertIsNone(self.canonical.retrieve.call_args[1]['etag'])
+
+
+@mock.patch(f'{extract.__name__}.preview.PreviewService', mock.MagicMock())
+@mock.patch(f'{extract.__name__}.store.Storage')
+@mock.patch(f'{extract.__name__}.legacy.CanonicalPDF')
+class TestPDFNotReady(TestCase):
+    """The canonical PDF has not been generated yet."""
+
+    def setUp(self):
+        """Create an app."""
+        self.app = Flask('foo')
+        self.app.config.update({'PDF_NOT_READY_ATTEMPTS': 3,
+                                'PDF_NOT_READY_BACKOFF': 5})
+        self.task = mock.MagicMock()
+        self.task.retry.side_effect = Retry
+
+    def extract(self, mock_CanonicalPDF, mock_Storage, attempts, waited):
+        """Attempt an extraction that has already been tried."""
+        mock_store = mock_Storage.current_session.return_value
+        mock_store.retrieve.return_value = Extraction(
+            identifier='1234.56789', version='3.4.5', attempts=attempts,
+            waited=waited
+        )
+        mock_canonical = mock_CanonicalPDF.current_session.return_value
+        mock_canonical.retrieve.side_effect = legacy.NotReady
+        with self.app.app_context():
+            with mock.patch(f'{extract.__name__}.current_task', self.task):
+                extract.extract('1234.56789', 'arxiv', '3.4.5')
+
+    def test_rescheduled(self, mock_CanonicalPDF, mock_Storage):
+        """The task is retried later, with exponential backoff."""
+        with self.assertRaises(Retry):
+            self.extract(mock_CanonicalPDF, mock_Storage, 1, 5.)
+        self.assertEqual(self.task.retry.call_args[1]['countdown'], 10.)
+        stored = mock_Storage.current_session.return_value.store.call_args
+        self.assertEqual(stored[0][0].attempts, 2)
+        self.assertEqual(stored[0][0].waited, 15.)
+        self.assertEqual(stored[0][0].status, Extraction.Status.IN_PROGRESS)
+
+    def test_gives_up(self, mock_CanonicalPDF, mock_Storage):
+        """The extraction fails once we run out of attempts."""
+        with self.assertRaises(IOError):
+            self.extract(mock_CanonicalPDF, mock_Storage, 2, 15.)
+        self.assertEqual(self.task.retry.call_count, 0)
+        stored = mock_Storage.current_session.return_value.store.call_args
+        self.assertEqual(stored[0][0].attempts, 3)
+        self.assertEqual(stored[0][0].status, Extraction.Status.FAILED)
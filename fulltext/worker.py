@@ -1,7 +1,8 @@
 """Initialize the Celery application."""
 import json
 from typing import Any, Optional
-from celery.signals import task_prerun, celeryd_init, worker_init
+from celery.signals import task_prerun, celeryd_init, worker_init, \
+    worker_process_init
 
 import docker
 from docker.errors import ImageNotFound, APIError
@@ -10,6 +11,7 @@ from arxiv.base import logging
 from arxiv.vault.manager import ConfigManager
 
 from fulltext.factory import create_web_app
+from fulltext.services import extractor
 from fulltext.extract import create_worker_app
 
 logger = logging.getLogger(__name__)
@@ -37,6 +39,8 @@ def get_secrets(*args: Any, **kwargs: Any) -> None:
 @celeryd_init.connect
 def pull_image(*args: Any, **kwargs: Any) -> None:
     """Make the dind host pull the fulltext extractor image."""
+    if app.config['EXTRACTOR_BACKEND'] not in ['docker', 'pool']:
+        return
     client = docker.DockerClient(app.config['DOCKER_HOST'])
     image_name = app.config['EXTRACTOR_IMAGE']
     image_tag = app.config['EXTRACTOR_VERSION']
@@ -47,6 +51,15 @@ def pull_image(*args: Any, **kwargs: Any) -> None:
     logger.info('Finished pulling %s', f'{image_name}:{image_tag}')
 
 
+@worker_process_init.connect   # Runs in each worker process when it starts.
+def warm_extractor_pool(*args: Any, **kwargs: Any) -> None:
+    """Start the warm extractor containers for this worker process."""
+    if app.config['EXTRACTOR_BACKEND'] != 'pool':
+        return
+    with app.app_context():
+        extractor.do_extraction.backend.warm()   # type: ignore
+
+
 @task_prerun.connect    # Runs in the worker before start a task.
 def verify_secrets_up_to_date(*args: Any, **kwargs: Any) -> None:
     """Verify that any required secrets from Vault are up to date."""
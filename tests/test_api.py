@@ -41,7 +41,7 @@ class TestApplication(TestCase):
     def setUpClass(cls):
         """Start redis and a worker."""
         cls.extractor_image = 'arxiv/fulltext-extractor'
-        cls.extractor_version = '0.3'
+        cls.extractor_version = '0.4'
         cls.volume = tempfile.mkdtemp()
         cls.work_dir = tempfile.mkdtemp()
         cls.jwt_secret = 'thesecret'
@@ -149,6 +149,17 @@ class TestApplication(TestCase):
         self.assertEqual(response.status_code, status.NOT_FOUND,
                          "Returns 404 Not Found")
 
+    def test_get_unsupported_content_type(self):
+        """Request for an extraction in a format that is not supported."""
+        token = generate_token('1234', 'foo@user.com', 'foouser',
+                               scope=[scopes.READ_FULLTEXT])
+        with self.app.app_context():
+            response = self.client.get('/arxiv/2102.00123',
+                                       headers={'Authorization': token,
+                                                'Accept': 'image/png'})
+        self.assertEqual(response.status_code, status.NOT_ACCEPTABLE,
+                         "Returns 406 Not Acceptable")
+
     def test_extraction_fails(self):
         """Extraction of an e-print fails."""
         # Mock the responses to HEAD and GET requests for the e-print PDF.